@@ -1,5 +1,6 @@
 from typing import List
 
+from .async_element_supply import *
 from .attributed_lines import *
 from .attributed_lines_widget import *
 from .attributed_text_widget import *
@@ -8,13 +9,19 @@ from .cursor_rendering import *
 from .cursor_tree_widget import *
 from .element import *
 from .element_supply import *
+from .log_file_supply import *
 from .exceptions import *
 from .markup import *
 from .rendered_element_cache import *
+from .rendering_pool import *
+from .sqlite_supply import *
 from .utils import *
+from .worker_thread import *
+from .write_behind_queue import *
 
 __all__: List[str] = []
 
+__all__ += async_element_supply.__all__
 __all__ += attributed_lines.__all__
 __all__ += attributed_lines_widget.__all__
 __all__ += attributed_text_widget.__all__
@@ -23,7 +30,12 @@ __all__ += cursor_rendering.__all__
 __all__ += cursor_tree_widget.__all__
 __all__ += element.__all__
 __all__ += element_supply.__all__
+__all__ += log_file_supply.__all__
 __all__ += exceptions.__all__
 __all__ += markup.__all__
 __all__ += rendered_element_cache.__all__
+__all__ += rendering_pool.__all__
+__all__ += sqlite_supply.__all__
 __all__ += utils.__all__
+__all__ += worker_thread.__all__
+__all__ += write_behind_queue.__all__
@@ -0,0 +1,303 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Generic, Iterable, List, Optional, Set, TypeVar
+
+from .element import Element, Id
+from .element_supply import ElementSupply, InMemorySupply
+from .worker_thread import WorkerThread
+
+__all__ = ["AsyncElementSupply", "ThreadedSupply", "PrefetchingSupply"]
+
+E = TypeVar("E", bound=Element)
+
+class AsyncElementSupply(ABC, Generic[E]):
+    """
+    The asynchronous counterpart of an ElementSupply, for supplies that might
+    take a while to answer, like those reading from a disk or a database.
+
+    Renderers can't wait for an AsyncElementSupply. Instead, the parts of it
+    that are about to be displayed are loaded into a PrefetchingSupply, which
+    is then rendered.
+
+    The naming conventions of ElementSupply apply here too.
+    """
+
+    @abstractmethod
+    async def get(self, elem_id: Id) -> E:
+        pass
+
+    @abstractmethod
+    async def parent_id(self, elem_id: Id) -> Optional[Id]:
+        pass
+
+    @abstractmethod
+    async def child_ids(self, elem_id: Id) -> List[Id]:
+        pass
+
+    @abstractmethod
+    async def previous_id(self, elem_id: Id) -> Optional[Id]:
+        pass
+
+    @abstractmethod
+    async def next_id(self, elem_id: Id) -> Optional[Id]:
+        pass
+
+    @abstractmethod
+    async def lowest_root_id(self) -> Optional[Id]:
+        pass
+
+    async def root_id(self, elem_id: Id) -> Id:
+        while True:
+            parent_id = await self.parent_id(elem_id)
+            if parent_id is None:
+                return elem_id
+            elem_id = parent_id
+
+    async def thread(self, root_id: Id) -> List[E]:
+        """
+        Retrieve all elements of a thread, parents before their children.
+
+        Supplies that can retrieve a thread in one go should override this.
+        """
+
+        elems = []
+
+        stack = [root_id]
+        while stack:
+            elem_id = stack.pop()
+            elems.append(await self.get(elem_id))
+            stack.extend(reversed(await self.child_ids(elem_id)))
+
+        return elems
+
+class ThreadedSupply(AsyncElementSupply[E]):
+    """
+    Makes an ElementSupply asynchronous by querying it in another thread.
+
+    All queries run one after another in the same thread, so the supply
+    doesn't need to be thread safe. It does need to allow being used from a
+    different thread than the one it was created in.
+    """
+
+    def __init__(self, supply: ElementSupply[E]) -> None:
+        self._supply = supply
+        self._worker = WorkerThread()
+
+    @property
+    def supply(self) -> ElementSupply[E]:
+        return self._supply
+
+    def close(self) -> None:
+        """
+        Stop the thread, after all running queries are finished.
+        """
+
+        self._worker.close()
+
+    async def get(self, elem_id: Id) -> E:
+        return await self._worker.run(self._supply.get, elem_id)
+
+    async def parent_id(self, elem_id: Id) -> Optional[Id]:
+        return await self._worker.run(self._supply.parent_id, elem_id)
+
+    async def child_ids(self, elem_id: Id) -> List[Id]:
+        return await self._worker.run(self._supply.child_ids, elem_id)
+
+    async def previous_id(self, elem_id: Id) -> Optional[Id]:
+        return await self._worker.run(self._supply.previous_id, elem_id)
+
+    async def next_id(self, elem_id: Id) -> Optional[Id]:
+        return await self._worker.run(self._supply.next_id, elem_id)
+
+    async def lowest_root_id(self) -> Optional[Id]:
+        return await self._worker.run(self._supply.lowest_root_id)
+
+    async def root_id(self, elem_id: Id) -> Id:
+        return await self._worker.run(self._supply.root_id, elem_id)
+
+    async def thread(self, root_id: Id) -> List[E]:
+        return await self._worker.run(self._thread, root_id)
+
+    def _thread(self, root_id: Id) -> List[E]:
+        last_id = self._supply.last_descendant_id(root_id)
+        return [self._supply.get(elem_id)
+                for elem_id in self._supply.iter_between(root_id, last_id)]
+
+class PrefetchingSupply(InMemorySupply[E]):
+    """
+    This supply holds the parts of an AsyncElementSupply that were loaded so
+    far. It answers all queries from memory, so rendering it never has to wait
+    for the AsyncElementSupply.
+
+    Threads are always loaded completely. Call prefetch() with the element
+    that is being displayed to load the threads around it before they are
+    needed, and forget_far_threads() to forget the threads that have been
+    scrolled far away from, so browsing a huge supply doesn't end up holding
+    all of it in memory.
+
+    The order of the roots around the loaded threads is remembered, so the
+    AsyncElementSupply's roots are not expected to change.
+    """
+
+    def __init__(self, supply: AsyncElementSupply[E]) -> None:
+        super().__init__()
+
+        self._async_supply = supply
+        self._loaded_root_ids: Set[Id] = set()
+
+        # The neighbours of loaded roots in the AsyncElementSupply, as far as
+        # they are known. None if a root has no neighbour in that direction.
+        self._previous_root_ids: Dict[Id, Optional[Id]] = {}
+        self._next_root_ids: Dict[Id, Optional[Id]] = {}
+
+    @property
+    def async_supply(self) -> AsyncElementSupply[E]:
+        return self._async_supply
+
+    def is_loaded(self, root_id: Id) -> bool:
+        return root_id in self._loaded_root_ids
+
+    async def load_thread(self, root_id: Id) -> bool:
+        """
+        Load a thread, unless it was already loaded.
+
+        Returns whether the thread was loaded.
+        """
+
+        if root_id in self._loaded_root_ids:
+            return False
+
+        # Marked as loaded right away so the thread isn't loaded twice by
+        # prefetches running at the same time
+        self._loaded_root_ids.add(root_id)
+        try:
+            elems = await self._async_supply.thread(root_id)
+        except BaseException:
+            self._loaded_root_ids.discard(root_id)
+            raise
+
+        for elem in elems:
+            self.add(elem)
+
+        return True
+
+    async def prefetch(self, elem_id: Optional[Id], threads: int = 10) -> bool:
+        """
+        Load the thread containing an element and the threads around it, up to
+        a certain amount of threads in each direction. If elem_id is None, the
+        lowest thread and the threads above it are loaded.
+
+        Returns whether any threads were loaded, in which case the supply
+        should be rendered again.
+        """
+
+        root_id: Optional[Id]
+        if elem_id is None:
+            root_id = await self._async_supply.lowest_root_id()
+        elif elem_id in self._elements:
+            root_id = self.root_id(elem_id)
+        else:
+            root_id = await self._async_supply.root_id(elem_id)
+
+        if root_id is None:
+            return False
+
+        root_ids = [root_id]
+
+        above_id: Optional[Id] = root_id
+        below_id: Optional[Id] = root_id
+        for _ in range(threads):
+            if above_id is not None:
+                above_id = await self._neighbour_root_id(above_id, below=False)
+                if above_id is not None:
+                    root_ids.append(above_id)
+
+            if below_id is not None:
+                below_id = await self._neighbour_root_id(below_id, below=True)
+                if below_id is not None:
+                    root_ids.append(below_id)
+
+        loaded = False
+        for root_id in root_ids:
+            if await self.load_thread(root_id):
+                loaded = True
+
+        return loaded
+
+    async def _neighbour_root_id(self,
+            root_id: Id,
+            below: bool,
+            ) -> Optional[Id]:
+
+        if below:
+            links, back_links = self._next_root_ids, self._previous_root_ids
+        else:
+            links, back_links = self._previous_root_ids, self._next_root_ids
+
+        if root_id in links:
+            return links[root_id]
+
+        if below:
+            neighbour_id = await self._async_supply.next_id(root_id)
+        else:
+            neighbour_id = await self._async_supply.previous_id(root_id)
+
+        links[root_id] = neighbour_id
+        if neighbour_id is not None:
+            back_links[neighbour_id] = root_id
+
+        return neighbour_id
+
+    def _forget_thread(self, root_id: Id) -> None:
+        # Leaves first, so no element is ever disconnected from its root
+        for elem_id in reversed(list(self._subtree_ids(root_id))):
+            self.remove(elem_id)
+
+        self._loaded_root_ids.discard(root_id)
+
+    def forget_far_threads(self,
+            elem_ids: Iterable[Optional[Id]],
+            threads: int = 30,
+            ) -> bool:
+        """
+        Forget all loaded threads that are more than a certain amount of
+        threads away from the threads containing the elements (e.g. the
+        cursor and the element the screen is positioned around). Ids of
+        elements that aren't loaded are ignored. If none of the elements are
+        loaded, nothing is forgotten.
+
+        Returns whether any threads were forgotten.
+        """
+
+        kept_ids: Set[Id] = set()
+
+        for elem_id in elem_ids:
+            if elem_id is None or elem_id not in self._elements:
+                continue
+
+            root_id = self.root_id(elem_id)
+            kept_ids.add(root_id)
+
+            for links in [self._previous_root_ids, self._next_root_ids]:
+                neighbour_id = root_id
+                for _ in range(threads):
+                    next_neighbour_id = links.get(neighbour_id)
+                    if next_neighbour_id is None:
+                        break
+                    neighbour_id = next_neighbour_id
+                    kept_ids.add(neighbour_id)
+
+        if not kept_ids:
+            return False
+
+        forgotten_ids = self._loaded_root_ids - kept_ids
+        for root_id in forgotten_ids:
+            self._forget_thread(root_id)
+
+        self._previous_root_ids = {root_id: neighbour_id for root_id,
+                neighbour_id in self._previous_root_ids.items()
+                if root_id in kept_ids}
+        self._next_root_ids = {root_id: neighbour_id for root_id,
+                neighbour_id in self._next_root_ids.items()
+                if root_id in kept_ids}
+
+        return bool(forgotten_ids)
@@ -1,16 +1,78 @@
 # TODO retrieve attributes of any (x, y) coordinates
 # TODO retrieve attributes of closest existing line (by y coordinate)
-# TODO use ulen and unicode string splitting
 
 import collections
-from typing import Any, Deque, Iterator, List, Optional, Set, Tuple
+from typing import (Any, Callable, Deque, Dict, Iterator, List, Optional, Set,
+        Tuple, Union)
 
-from .markup import AT, Attributes
+from .element import Id
+from .markup import AT, ATBuilder, Attributes
+from .utils import uindex, ulen
 
-__all__ = ["Line", "AttributedLines"]
+__all__ = ["Line", "LineBlock", "AttributedLines"]
 
 Line = Tuple[Attributes, AT]
 
+class LineBlock:
+    """
+    A run of lines that are only created once they are accessed. Created lines
+    are remembered.
+
+    This allows huge messages to be added to an AttributedLines as a single
+    entry, so only the lines that end up on the screen are ever created.
+    """
+
+    def __init__(self,
+            length: int,
+            attributes: Callable[[int], Attributes],
+            text: Callable[[int], AT],
+            ) -> None:
+
+        self._length = length
+        self._attributes = attributes
+        self._text = text
+
+        # Slices of a block share its created lines
+        self._start = 0
+        self._lines: Dict[int, Line] = {}
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[Line]:
+        for index in range(self._length):
+            yield self.line(index)
+
+    def attributes(self, index: int) -> Attributes:
+        """
+        The attributes of a line, without creating the line's text.
+        """
+
+        return self._attributes(self._start + index)
+
+    def line(self, index: int) -> Line:
+        index += self._start
+
+        line = self._lines.get(index)
+        if line is None:
+            line = (self._attributes(index), self._text(index))
+            self._lines[index] = line
+
+        return line
+
+    def slice(self, start: int, stop: int) -> "LineBlock":
+        """
+        The lines from start up to (but excluding) stop as a new LineBlock.
+        """
+
+        block = LineBlock(stop - start, self._attributes, self._text)
+        block._start = self._start + start
+        block._lines = self._lines
+        return block
+
+# An AttributedLines stores single lines and blocks of lines side by side
+Entry = Union[Line, LineBlock]
+
 class AttributedLines:
     """
     AttributedLines is a list of lines of AttributedText that maintains a
@@ -22,17 +84,42 @@ class AttributedLines:
 
     Multiple AttributedLines can be concatenated, keeping either the first or
     the second AttributedLines's offset.
+
+    The line containing the cursor (the "cursor" attribute) and the first line
+    of each message (the "mid" attribute) are remembered while lines are
+    added, so they can be found without looking at every line.
+
+    Lines can also be added as a LineBlock, whose lines are only created once
+    they are accessed.
     """
 
     def __init__(self, lines: Optional[List[Line]] = None) -> None:
         self.upper_offset = 0
-        self._lines: Deque[Line] = collections.deque(lines or [])
+        self._entries: Deque[Entry] = collections.deque()
+        self._length = 0
+
+        # Lines are indexed independently of the offsets. The first line's
+        # index decreases when lines are added above it.
+        self._first_index = 0
+        self._cursor_index: Optional[int] = None
+        self._message_indexes: Dict[Id, int] = {}
+        # The topmost and bottommost line with a "mid" attribute, as index and
+        # message id
+        self._first_message: Optional[Tuple[int, Id]] = None
+        self._last_message: Optional[Tuple[int, Id]] = None
+
+        for attributes, text in lines or []:
+            self.append_below(attributes, text)
 
     def __iter__(self) -> Iterator[Line]:
-        return self._lines.__iter__()
+        for entry in self._entries:
+            if isinstance(entry, LineBlock):
+                yield from entry
+            else:
+                yield entry
 
     def __len__(self) -> int:
-        return len(self._lines)
+        return self._length
 
     @property
     def lower_offset(self) -> int:
@@ -45,6 +132,116 @@ class AttributedLines:
     def lower_offset(self, lower_offset: int) -> None:
         self.upper_offset = lower_offset - (len(self) - 1)
 
+    @property
+    def cursor_offset(self) -> Optional[int]:
+        """
+        The offset of the line containing the cursor, if there is one.
+        """
+
+        if self._cursor_index is None:
+            return None
+
+        return self._offset_of(self._cursor_index)
+
+    def message_offset(self, mid: Id) -> Optional[int]:
+        """
+        The offset of the first line of a message, if it is contained.
+        """
+
+        index = self._message_indexes.get(mid)
+        if index is None:
+            return None
+
+        return self._offset_of(index)
+
+    @property
+    def first_message_id(self) -> Optional[Id]:
+        """
+        The id of the topmost message, if there is one.
+        """
+
+        return None if self._first_message is None else self._first_message[1]
+
+    @property
+    def last_message_id(self) -> Optional[Id]:
+        """
+        The id of the bottommost message, if there is one.
+        """
+
+        return None if self._last_message is None else self._last_message[1]
+
+    def at(self, offset: int) -> Line:
+        """
+        The line at an offset. Raises an IndexError if there is none.
+        """
+
+        position = offset - self.upper_offset
+        if not 0 <= position < self._length:
+            raise IndexError(f"no line at offset {offset}")
+
+        for entry in self._entries:
+            if not isinstance(entry, LineBlock):
+                if position == 0:
+                    return entry
+                position -= 1
+            elif position < len(entry):
+                return entry.line(position)
+            else:
+                position -= len(entry)
+
+        raise IndexError(f"no line at offset {offset}") # unreachable
+
+    @staticmethod
+    def _entry_length(entry: Entry) -> int:
+        return len(entry) if isinstance(entry, LineBlock) else 1
+
+    def _offset_of(self, index: int) -> int:
+        return self.upper_offset + (index - self._first_index)
+
+    def _index_line(self,
+            index: int,
+            attributes: Attributes,
+            above: bool,
+            ) -> None:
+
+        if attributes.get("cursor"):
+            self._cursor_index = index
+
+        mid = attributes.get("mid")
+        if mid is not None:
+            if above or mid not in self._message_indexes:
+                self._message_indexes[mid] = index
+            self._index_message_bounds(index, mid)
+
+    def _index_message_bounds(self, index: int, mid: Id) -> None:
+        if self._first_message is None or index < self._first_message[0]:
+            self._first_message = (index, mid)
+        if self._last_message is None or index > self._last_message[0]:
+            self._last_message = (index, mid)
+
+    def _index_lines(self, lines: "AttributedLines", above: bool) -> None:
+        """
+        Take over the indexes of lines that were just added above or below.
+        """
+
+        if above:
+            shift = self._first_index - lines._first_index
+        else:
+            last_index = self._first_index + self._length - len(lines)
+            shift = last_index - lines._first_index
+
+        if lines._cursor_index is not None:
+            self._cursor_index = lines._cursor_index + shift
+
+        for mid, index in lines._message_indexes.items():
+            if above or mid not in self._message_indexes:
+                self._message_indexes[mid] = index + shift
+
+        for bound in [lines._first_message, lines._last_message]:
+            if bound is not None:
+                index, mid = bound
+                self._index_message_bounds(index + shift, mid)
+
     # Modifying functions
 
     def append_above(self,
@@ -56,8 +253,11 @@ class AttributedLines:
         offsets do not change.
         """
 
-        self._lines.appendleft((attributes, text))
+        self._entries.appendleft((attributes, text))
+        self._length += 1
         self.upper_offset -= 1
+        self._first_index -= 1
+        self._index_line(self._first_index, attributes, above=True)
 
     def append_below(self,
             attributes: Attributes,
@@ -68,18 +268,39 @@ class AttributedLines:
         offsets do not change.
         """
 
-        self._lines.append((attributes, text))
+        self._entries.append((attributes, text))
+        self._length += 1
         # lower offset does not need to be modified since it's calculated based
         # on the upper offset
 
+        index = self._first_index + self._length - 1
+        self._index_line(index, attributes, above=False)
+
+    def append_block_below(self, block: LineBlock) -> None:
+        """
+        Append a LineBlock below all already existing lines. The existing
+        lines' offsets do not change.
+        """
+
+        if len(block) == 0:
+            return
+
+        self._entries.append(block)
+        index = self._first_index + self._length
+        self._length += len(block)
+        self._index_line(index, block.attributes(0), above=False)
+
     def extend_above(self, lines: "AttributedLines") -> None:
         """
         Prepend an AttributedLines, ignoring its offsets and using the current
         AttributedLines's offsets instead.
         """
 
-        self._lines.extendleft(reversed(lines._lines))
+        self._entries.extendleft(reversed(lines._entries))
+        self._length += len(lines)
         self.upper_offset -= len(lines)
+        self._first_index -= len(lines)
+        self._index_lines(lines, above=True)
 
     def extend_below(self, lines: "AttributedLines") -> None:
         """
@@ -87,10 +308,13 @@ class AttributedLines:
         AttributedLines's offsets instead.
         """
 
-        self._lines.extend(lines._lines)
+        self._entries.extend(lines._entries)
+        self._length += len(lines)
         # lower offset does not need to be modified since it's calculated based
         # on the upper offset
 
+        self._index_lines(lines, above=False)
+
     # Non-modifying functions
 
     def between(self, start_offset: int, end_offset: int) -> "AttributedLines":
@@ -99,14 +323,26 @@ class AttributedLines:
         (and including) start_offset and end_offset.
         """
 
-        lines = []
+        start = max(0, start_offset - self.upper_offset)
+        stop = max(start, end_offset - self.upper_offset + 1)
 
-        for i, line in enumerate(self):
-            line_offset = self.upper_offset + i
-            if start_offset <= line_offset <= end_offset:
-                lines.append(line)
+        attr_lines = AttributedLines()
+        position = 0
+        for entry in self._entries:
+            if position >= stop:
+                break
+
+            length = self._entry_length(entry)
+            if position + length > start:
+                if isinstance(entry, LineBlock):
+                    attr_lines.append_block_below(entry.slice(
+                            max(0, start - position),
+                            min(length, stop - position)))
+                else:
+                    attr_lines.append_below(*entry)
+
+            position += length
 
-        attr_lines = AttributedLines(lines)
         attr_lines.upper_offset = max(start_offset, self.upper_offset)
         attr_lines.lower_offset = min(end_offset, self.lower_offset)
         return attr_lines
@@ -154,36 +390,42 @@ class AttributedLines:
         start_offset = horizontal_offset
         end_offset = start_offset + text_width
 
-        result: AT = AT()
+        # Offsets are counted in columns, not characters
+        string = text.text
+        length = ulen(string)
+
+        builder = ATBuilder()
 
         if start_offset < 0:
             pad_length = min(text_width, -start_offset)
-            result += AT(offset_char * pad_length)
-
-        if end_offset < 0:
-            pass # the text should not be displayed at all
-        elif end_offset < len(text):
-            if start_offset > 0:
-                result += text[start_offset:end_offset]
-            else:
-                result += text[:end_offset]
+            builder.append_text(offset_char * pad_length)
+
+        visible_start = max(0, start_offset)
+        visible_end = min(end_offset, length)
+        if visible_start < visible_end:
+            first = uindex(string, visible_start, round_up=True)
+            last = max(first, uindex(string, visible_end))
+
+            # Wide characters cut in half by the edges are replaced by padding
+            builder.append_text(
+                    offset_char * (ulen(string[:first]) - visible_start))
+            builder.append(text[first:last])
+            builder.append_text(
+                    offset_char * (visible_end - ulen(string[:last])))
+
+        if end_offset > length:
+            pad_length = min(text_width, end_offset - length)
+            builder.append_text(offset_char * pad_length)
+
+        if end_offset < length:
+            builder.append_text(overlap_char)
         else:
-            if start_offset > 0:
-                result += text[start_offset:]
-            else:
-                result += text
+            builder.append_text(offset_char)
 
-        if end_offset > len(text):
-            pad_length = min(text_width, end_offset - len(text))
-            result += AT(offset_char * pad_length)
-
-        if end_offset < len(text):
-            result += AT(overlap_char)
-        else:
-            result += AT(offset_char)
-
-        for k, v in attributes.items():
-            result = result.set(k, v)
+        result = builder.build()
+        if attributes:
+            result = result.set_spans([(0, len(result), name, value)
+                for name, value in attributes.items()])
 
         return result
 
@@ -217,10 +459,18 @@ class AttributedLines:
                 horizontal_offset=horizontal_offset)
         return AT("\n").join(lines)
 
+    def _attributes(self) -> Iterator[Attributes]:
+        for entry in self._entries:
+            if isinstance(entry, LineBlock):
+                for index in range(len(entry)):
+                    yield entry.attributes(index)
+            else:
+                yield entry[0]
+
     def all_values(self, attribute: str) -> Set[Any]:
         values = set()
 
-        for attributes, _ in self._lines:
+        for attributes in self._attributes():
             if attribute in attributes:
                 values.add(attributes.get(attribute))
 
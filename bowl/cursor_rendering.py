@@ -1,14 +1,20 @@
 # TODO move meta spaces rendering to message
 
+import itertools
+import time
 from abc import ABC, abstractmethod
-from typing import Generic, List, Optional, Tuple, TypeVar
-
-from .attributed_lines import AttributedLines
-from .element import Element, Id, Message, RenderedElement, RenderedMessage
-from .element_supply import ElementSupply
+from typing import (Callable, Generic, Iterable, Iterator, List,
+        Optional, Set, Tuple, TypeVar)
+
+from .attributed_lines import AttributedLines, LineBlock
+from .element import (Element, Id, LazyLines, Message, RenderedElement,
+        RenderedMessage)
+from .element_supply import (ElementSupply, ElementSupplyException,
+        FoldingSupply)
 from .exceptions import ShouldNeverHappen
-from .markup import AT, Attributes
+from .markup import AT, ATBuilder, Attributes
 from .rendered_element_cache import RenderedElementCache
+from .utils import ulen
 
 __all__ = ["CursorRenderer", "CursorTreeRenderer", "BasicCursorRenderer"]
 
@@ -16,6 +22,9 @@ E = TypeVar("E", bound=Element)
 R = TypeVar("R", bound=RenderedElement)
 M = TypeVar("M", bound=RenderedMessage) # because it has a meta field
 
+# Cursor id, anchor id and anchor offset, see CursorTreeRenderer.position
+Position = Tuple[Optional[Id], Optional[Id], float]
+
 class CursorRenderer(ABC, Generic[E, R]):
 
     @property
@@ -31,11 +40,20 @@ class CursorRenderer(ABC, Generic[E, R]):
     def render_cursor(self, width: int) -> AT:
         pass
 
+    @abstractmethod
+    def render_folded(self, count: int, width: int) -> AT:
+        """
+        Render the line that replaces the children of a folded element.
+        count is the amount of elements hidden by the fold.
+        """
+
+        pass
+
 class CursorTreeRenderer(Generic[E]):
     """
     This class renders a tree of Element-s from an ElementSupply to
-    AttributedLines, including user interface elements like a cursor (and
-    possibly subtree folding?).
+    AttributedLines, including user interface elements like a cursor and
+    folded subtrees.
 
     It does the following:
     1. render the tree
@@ -57,14 +75,24 @@ class CursorTreeRenderer(Generic[E]):
             scrolloff: int = 3,
             ) -> None:
 
-        self._supply = supply
+        # All navigation goes through the folding supply, which hides the
+        # children of folded elements.
+        self._supply = FoldingSupply(supply)
         self._renderer = renderer
         self._cache = RenderedElementCache[M]()
 
         # Rendering result
         self._lines = AttributedLines()
+        self._visible_lines = AttributedLines()
         self._hit_top = False
 
+        # Messages invalidated since prerender_jobs() was called. Whatever was
+        # rendered for them elsewhere in the meantime is out of date (e.g.
+        # because the own nick changed) and is discarded by add_rendered().
+        # None while there are no jobs.
+        self._outdated_ids: Optional[Set[Id]] = None
+        self._all_outdated = False
+
         # Cursor and scrolling
         self._cursor_id: Optional[Id] = None
         self._anchor_id: Optional[Id] = None
@@ -99,12 +127,28 @@ class CursorTreeRenderer(Generic[E]):
         self._cursor_indent_attrs = cursor_indent_attrs
         self._scrolloff = scrolloff
 
+        # Indents by depth, see _get_indent()
+        self._indents = [AT()]
+        self._cursor_indents: List[AT] = []
+        self._cursor_indents_depth: Optional[int] = None
+
     # Some properties
 
     @property
     def lines(self) -> AttributedLines:
-        # Not sure if the between() is necessary
-        return self._lines.between(0, self._height - 1)
+        return self._visible_lines
+
+    @property
+    def renderer(self) -> CursorRenderer:
+        return self._renderer
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
 
     @property
     def hit_top(self) -> bool:
@@ -114,6 +158,49 @@ class CursorTreeRenderer(Generic[E]):
     def cursor_id(self) -> Optional[Id]:
         return self._cursor_id
 
+    # Saving and restoring the view
+
+    @property
+    def position(self) -> Position:
+        """
+        The cursor id, anchor id and anchor offset. Together, they determine
+        which part of the tree is displayed.
+        """
+
+        return self._cursor_id, self._anchor_id, self._anchor_offset
+
+    def _is_connected(self, elem_id: Id) -> bool:
+        """
+        Whether an element and all of its ancestors are in the supply. Only
+        then can the element be displayed.
+        """
+
+        try:
+            self._supply.ancestor_path(elem_id)
+            return True
+        except ElementSupplyException:
+            return False
+
+    def restore_position(self, position: Position) -> None:
+        """
+        Display the tree the way it was displayed when the position was saved,
+        as far as possible. If the cursor's element isn't in the supply (or
+        isn't connected to a root), the cursor is moved to the bottom. If the
+        same goes for the anchor's element, the cursor takes its place on the
+        screen.
+        """
+
+        cursor_id, anchor_id, anchor_offset = position
+
+        if cursor_id is not None and not self._is_connected(cursor_id):
+            cursor_id = None
+        if anchor_id is not None and not self._is_connected(anchor_id):
+            anchor_id = None
+
+        self._cursor_id = cursor_id
+        self._anchor_id = anchor_id
+        self._anchor_offset = min(1.0, max(0.0, anchor_offset))
+
     # Offsets
 
     @staticmethod
@@ -138,13 +225,62 @@ class CursorTreeRenderer(Generic[E]):
     # Message cache operations
 
     def invalidate(self, message_id: Id) -> None:
-        self._cache.invalidate(message_id)
+        self.invalidate_ids([message_id])
+
+    def invalidate_ids(self, message_ids: Iterable[Id]) -> None:
+        if self._outdated_ids is not None:
+            message_ids = list(message_ids)
+            self._outdated_ids.update(message_ids)
+
+        self._cache.invalidate_ids(message_ids)
+
+    def invalidate_if(self, predicate: Callable[[Id], bool]) -> None:
+        self._all_outdated = True
+        self._cache.invalidate_if(predicate)
 
     def invalidate_all(self) -> None:
+        self._all_outdated = True
         self._cache.invalidate_all()
 
+    # Folding
+
+    def is_folded(self, message_id: Id) -> bool:
+        return self._supply.is_folded(message_id)
+
+    def fold(self, message_id: Id) -> None:
+        """
+        Hide all children of a message. If the cursor or the anchor are hidden
+        by this, they are moved to the folded message.
+        """
+
+        self._supply.fold(message_id)
+
+        if self._cursor_id is not None:
+            if message_id in self._supply.ancestor_path(self._cursor_id):
+                self._cursor_id = message_id
+
+        if self._anchor_id is not None:
+            if message_id in self._supply.ancestor_path(self._anchor_id):
+                self._anchor_id = message_id
+
+    def unfold(self, message_id: Id) -> None:
+        self._supply.unfold(message_id)
+
+    def toggle_fold(self, message_id: Id) -> None:
+        if self.is_folded(message_id):
+            self.unfold(message_id)
+        else:
+            self.fold(message_id)
+
     # Rendering a single message
 
+    def _content_width(self, indent: AT) -> int:
+        """
+        The amount of columns left for a message next to its meta and indent.
+        """
+
+        return self._width - ulen(indent.text) - self._renderer.meta_width - 1
+
     def _get_rendered_message(self, message_id: Id, width: int) -> M:
         cached = self._cache.get(message_id)
         if cached is not None:
@@ -160,28 +296,69 @@ class CursorTreeRenderer(Generic[E]):
             indent: AT,
             ) -> AttributedLines:
 
-        width = self._width - len(indent) - self._renderer.meta_width - 1
+        width = self._content_width(indent)
         rendered: RenderedMessage = self._get_rendered_message(message_id,
                 width)
 
-        meta = rendered.meta
-        meta_spaces = AT(" " * len(meta))
-
         lines = AttributedLines()
-        for offset, line in enumerate(rendered.lines):
-            text = (meta if offset == 0 else meta_spaces) + indent + line
+
+        # Messages taller than the screen can never be visible completely.
+        # Instead of rendering all of their lines, they are added as a single
+        # block whose lines are only created once they end up on the screen.
+        if len(rendered.lines) > self._height:
+            lines.append_block_below(LineBlock(len(rendered.lines),
+                    lambda offset: {"mid": message_id, "offset": offset},
+                    lambda offset: self._message_line(rendered, offset,
+                        indent)))
+            return lines
+
+        for offset in range(len(rendered.lines)):
             attrs = {"mid": message_id, "offset": offset}
-            lines.append_below(attrs, text)
+            lines.append_below(attrs,
+                    self._message_line(rendered, offset, indent))
 
         return lines
 
+    @staticmethod
+    def _message_line(rendered: RenderedMessage, offset: int, indent: AT) -> AT:
+        builder = ATBuilder()
+
+        if offset == 0:
+            builder.append(rendered.meta)
+        else:
+            builder.append_text(" " * ulen(rendered.meta.text))
+
+        builder.extend([indent, rendered.lines[offset]])
+        return builder.build()
+
+    def _meta_spaces_line(self, indent: AT, text: AT) -> AT:
+        builder = ATBuilder()
+        builder.append_text(" " * self._renderer.meta_width)
+        builder.extend([indent, text])
+        return builder.build()
+
     def _render_cursor(self, indent: AT = AT(),) -> AttributedLines:
         lines = AttributedLines()
-        width = self._width - len(indent) - self._renderer.meta_width - 1
-        meta_spaces = AT(" " * self._renderer.meta_width)
+        width = self._content_width(indent)
         attrs = {"cursor": True, "offset": 0}
-        lines.append_below(attrs, meta_spaces + indent +
-                self._renderer.render_cursor(width))
+        lines.append_below(attrs, self._meta_spaces_line(indent,
+                self._renderer.render_cursor(width)))
+        return lines
+
+    def _render_folded(self,
+            message_id: Id,
+            offset: int,
+            indent: AT,
+            ) -> AttributedLines:
+
+        width = self._content_width(indent)
+        count = self._supply.descendant_count(message_id)
+
+        lines = AttributedLines()
+        # The summary line counts as one of the message's lines
+        attrs = {"mid": message_id, "offset": offset}
+        lines.append_below(attrs, self._meta_spaces_line(indent,
+                self._renderer.render_folded(count, width)))
         return lines
 
     def _render_indent(self,
@@ -206,42 +383,93 @@ class CursorTreeRenderer(Generic[E]):
             start = AT(self._indent, attributes=attrs)
             fill = AT(self._indent_fill, attributes=attrs)
 
-        return start + fill * (self._indent_width - len(start))
+        return start + fill * (self._indent_width - ulen(start.text))
+
+    def _get_indent(self, depth: int, cursor_depth: Optional[int] = None) -> AT:
+        """
+        Get the indent of a message at a certain depth below the root of its
+        tree. If the cursor belongs to an ancestor of the message at
+        cursor_depth, the indent includes the cursor's vertical line.
+
+        Indents are built from the indent of the next lower depth and
+        remembered, so deep threads don't need to concatenate the same indent
+        over and over again. The indents below the cursor are forgotten when
+        the cursor moves to a different depth.
+        """
+
+        while len(self._indents) <= depth:
+            self._indents.append(self._indents[-1] + self._render_indent())
+
+        if cursor_depth is None or depth <= cursor_depth:
+            return self._indents[depth]
+
+        if cursor_depth != self._cursor_indents_depth:
+            first = self._indents[cursor_depth] + self._render_indent(
+                    cursor=True)
+            self._cursor_indents = [first]
+            self._cursor_indents_depth = cursor_depth
+
+        index = depth - cursor_depth - 1
+        while len(self._cursor_indents) <= index:
+            self._cursor_indents.append(self._cursor_indents[-1] +
+                    self._render_indent())
+
+        return self._cursor_indents[index]
 
     # Rendering the tree
 
-    def _render_subtree(self,
-            lines: AttributedLines,
-            root_id: Id,
-            indent: AT = AT(),
-            ) -> None:
+    def _render_subtree(self, lines: AttributedLines, root_id: Id) -> None:
+        """
+        Render a message and all of its children below the existing lines.
+
+        This uses an explicit stack instead of recursion, so threads of any
+        depth can be rendered.
+        """
 
-        if self._anchor_id == root_id:
-            lines.lower_offset = -1
+        # Message id, depth and whether the entry stands for the cursor below
+        # the message's children
+        stack: List[Tuple[Id, int, bool]] = [(root_id, 0, False)]
 
-        # Do we have to draw a cursor?
-        cursor = self._cursor_id == root_id
+        # Depth of the cursor's message while rendering its children
+        cursor_depth: Optional[int] = None
 
-        # Render main message (root)
-        rendered_lines = self._render_message(root_id, indent)
-        lines.extend_below(rendered_lines)
+        while stack:
+            message_id, depth, is_cursor = stack.pop()
 
-        # Determine new indent
-        extra_indent = self._render_indent(cursor=cursor)
-        new_indent = indent + extra_indent
+            if is_cursor:
+                # The cursor also acts as anchor if anchor is not specified
+                if self._anchor_id is None:
+                    lines.lower_offset = -1
 
-        # Render children
-        for child_id in self._supply.child_ids(root_id):
-            self._render_subtree(lines, child_id, new_indent)
+                cursor_indent = self._get_indent(depth) + self._render_indent(
+                        cursor_line=True)
+                lines.extend_below(self._render_cursor(cursor_indent))
+                cursor_depth = None
+                continue
 
-        # Render cursor if necessary
-        if cursor:
-            # The cursor also acts as anchor if anchor is not specified
-            if self._anchor_id is None:
+            if self._anchor_id == message_id:
                 lines.lower_offset = -1
 
-            cursor_indent = indent + self._render_indent(cursor_line=True)
-            lines.extend_below(self._render_cursor(cursor_indent))
+            # Render main message
+            indent = self._get_indent(depth, cursor_depth)
+            rendered_lines = self._render_message(message_id, indent)
+            lines.extend_below(rendered_lines)
+
+            # Do we have to draw a cursor after the children?
+            if self._cursor_id == message_id:
+                cursor_depth = depth
+                stack.append((message_id, depth, True))
+
+            # Render summary instead of the children if folded
+            if self._supply.is_folded(message_id):
+                new_indent = self._get_indent(depth + 1, cursor_depth)
+                lines.extend_below(self._render_folded(message_id,
+                    len(rendered_lines), new_indent))
+
+            # Render children (the folding supply has none for folded
+            # elements)
+            for child_id in reversed(self._supply.child_ids(message_id)):
+                stack.append((child_id, depth + 1, False))
 
     def _render_tree(self, root_id: Id) -> AttributedLines:
         lines = AttributedLines()
@@ -389,6 +617,7 @@ class CursorTreeRenderer(Generic[E]):
         lines, delta, hit_top = self._render_lines()
 
         self._lines = lines
+        self._visible_lines = lines.between(0, self._height - 1)
         self._hit_top = hit_top
 
         return delta
@@ -415,22 +644,15 @@ class CursorTreeRenderer(Generic[E]):
         """
 
         middle_index = self.get_absolute_offset(0.5, self._height)
-        lines = list(self.lines)
+        lines = self.lines
 
         # This should never happen; there should always be at least a cursor.
         # I'm just being defensive here.
         if len(lines) < 1:
             return 0, middle_index
 
-        if middle_index < self.lines.upper_offset:
-            attrs, _ = lines[0]
-            index = self.lines.upper_offset
-        elif middle_index > self.lines.lower_offset:
-            attrs, _ = lines[-1]
-            index = self.lines.lower_offset
-        else:
-            attrs, _ = lines[middle_index - self.lines.upper_offset]
-            index = middle_index
+        index = min(max(middle_index, lines.upper_offset), lines.lower_offset)
+        attrs, _ = lines.at(index)
 
         mid = attrs.get("mid")
         # We know that all lines, including the cursor, have an offset.
@@ -439,13 +661,7 @@ class CursorTreeRenderer(Generic[E]):
         return mid, index
 
     def _find_cursor_on_screen(self) -> Optional[int]:
-        for index, line in enumerate(self.lines):
-            attrs, _ = line
-
-            if attrs.get("cursor"):
-                return index
-
-        return None
+        return self.lines.cursor_offset
 
     def _apply_scrolloff(self) -> None:
         offset = self._absolute_anchor_offset
@@ -487,14 +703,7 @@ class CursorTreeRenderer(Generic[E]):
             if cursor_id is None:
                 return None # empty supply
 
-        elem_id: Id = cursor_id
-        while True:
-            child_ids = self._supply.child_ids(elem_id)
-
-            if child_ids:
-                elem_id = child_ids[-1]
-            else:
-                return elem_id
+        return self._supply.last_descendant_id(cursor_id)
 
     def _element_id_below_cursor(self,
             cursor_id: Optional[Id],
@@ -519,10 +728,12 @@ class CursorTreeRenderer(Generic[E]):
         # This can't be the cursor id since the cursor is offscreen
         middle_id, _ = self._closest_to_middle()
 
-        cursor_ancestor_path = self._supply.ancestor_path(closest_id)
-        middle_ancestor_path = self._supply.ancestor_path(middle_id)
+        if closest_id is None or middle_id is None:
+            cursor_above = middle_id is not None
+        else:
+            cursor_above = self._supply.is_above(closest_id, middle_id)
 
-        if cursor_ancestor_path < middle_ancestor_path:
+        if cursor_above:
             # Cursor is above the screen somewhere
             self._anchor_offset = 0
         else:
@@ -536,12 +747,12 @@ class CursorTreeRenderer(Generic[E]):
         self._apply_scrolloff()
 
     def _cursor_visible(self) -> bool:
-        return True in self.lines.all_values("cursor")
+        return self.lines.cursor_offset is not None
 
-    def _height_of(self, between_ids: List[Id]) -> int:
+    def _height_of(self, mids: Iterable[Id]) -> int:
         height = 0
 
-        for mid in between_ids:
+        for mid in mids:
             message = self._cache.get(mid)
             if message is None:
                 self._render_tree_containing(mid)
@@ -552,6 +763,9 @@ class CursorTreeRenderer(Generic[E]):
 
             height += len(message.lines)
 
+            if self._supply.is_folded(mid):
+                height += 1 # the folded summary
+
         return height
 
     def move_cursor_up(self) -> None:
@@ -572,8 +786,8 @@ class CursorTreeRenderer(Generic[E]):
         if below_new is None:
             height = 0
         else:
-            between_ids = self._supply.between_ids(below_new, above_old)
-            height = self._height_of(between_ids)
+            mids = self._supply.iter_between(below_new, above_old)
+            height = self._height_of(mids)
 
         self._cursor_id = new_cursor_id
         self._absolute_anchor_offset -= height
@@ -598,8 +812,8 @@ class CursorTreeRenderer(Generic[E]):
         if below_old is None:
             height = 0
         else:
-            between_ids = self._supply.between_ids(below_old, above_new)
-            height = self._height_of(between_ids)
+            mids = self._supply.iter_between(below_old, above_new)
+            height = self._height_of(mids)
 
         self._cursor_id = new_cursor_id
         self._absolute_anchor_offset += height
@@ -611,6 +825,112 @@ class CursorTreeRenderer(Generic[E]):
         self._render()
         self._focus_on_cursor()
 
+    # Pre-rendering
+
+    def _ids_near_screen(self, screens: int) -> Iterator[Id]:
+        """
+        The ids of the messages above and below the rendered lines, closest
+        first, alternating between above and below. Since each message is at
+        least one line high, this covers at least the specified amount of
+        screens in each direction.
+        """
+
+        first_id = self._lines.first_message_id
+        last_id = self._lines.last_message_id
+        if first_id is None or last_id is None:
+            return iter([])
+
+        count = screens * self._height
+        above = itertools.islice(self._supply.iter_above(first_id), 1,
+                count + 1)
+        below = itertools.islice(self._supply.iter_below(last_id), 1,
+                count + 1)
+
+        both = itertools.chain.from_iterable(
+                itertools.zip_longest(above, below))
+        return (mid for mid in both if mid is not None)
+
+    def _unrendered_near_screen(self, screens: int) -> Iterator[Tuple[Id, int]]:
+        """
+        The messages near the screen (see _ids_near_screen()) that aren't
+        rendered yet, and the width they need to be rendered at.
+        """
+
+        for message_id in self._ids_near_screen(screens):
+            if self._cache.get(message_id) is None:
+                indent = self._get_indent(self._supply.depth(message_id))
+                yield message_id, self._content_width(indent)
+
+    def prerender(self, duration: float, screens: int = 3) -> bool:
+        """
+        Render messages close to the screen before they are scrolled into
+        view, so they don't need to be rendered while drawing the screen.
+
+        Renders messages until the duration (in seconds) has passed. Returns
+        whether there are still messages left that aren't rendered.
+        """
+
+        stop = time.monotonic() + duration
+
+        for message_id, width in self._unrendered_near_screen(screens):
+            if time.monotonic() >= stop:
+                return True
+
+            rendered: RenderedMessage = self._get_rendered_message(
+                    message_id, width)
+
+            # Only as many lines as could be visible are rendered, like
+            # _render_message() does for huge messages. Lines that aren't lazy
+            # were already rendered by the renderer.
+            if isinstance(rendered.lines, LazyLines):
+                rendered.lines.render_first(self._height)
+
+        return False
+
+    def prerender_jobs(self, screens: int = 3) -> List[Tuple[E, int]]:
+        """
+        Like prerender(), but instead of rendering the messages, return them
+        along with the width they need to be rendered at. They can then be
+        rendered somewhere else (e.g. by a RenderingPool) and be handed back
+        via add_rendered().
+
+        Only one set of jobs can be out at a time. Calling prerender_jobs()
+        again replaces the previous jobs.
+        """
+
+        self._outdated_ids = set()
+        self._all_outdated = False
+
+        return [(self._supply.get(message_id), width)
+                for message_id, width
+                in self._unrendered_near_screen(screens)]
+
+    def add_rendered(self,
+            rendered: Iterable[RenderedMessage],
+            width: int,
+            ) -> None:
+
+        """
+        Add messages that were rendered somewhere else to the cache. The width
+        must be the screen width at the time prerender_jobs() was called. If
+        the width has changed since, the messages are discarded. So are the
+        messages that were invalidated since.
+        """
+
+        outdated_ids = self._outdated_ids or set()
+        all_outdated = self._all_outdated
+        self._outdated_ids = None
+        self._all_outdated = False
+
+        if width != self._width or all_outdated:
+            return
+
+        for message in rendered:
+            if message.id in outdated_ids:
+                continue
+            if self._cache.get(message.id) is None:
+                self._cache.add(message) # type: ignore
+
 class BasicCursorRenderer(CursorRenderer):
 
     META_FORMAT = "%H:%M "
@@ -624,14 +944,18 @@ class BasicCursorRenderer(CursorRenderer):
         meta = AT(message.timestamp.strftime(self.META_FORMAT))
 
         nick = AT(f"[{message.nick}] ")
-        nick_spaces = AT(" " * len(nick))
+        nick_spaces = AT(" " * ulen(nick.text))
 
-        lines = []
-        for i, line in enumerate(message.content.split("\n")):
-            text = (nick if i == 0 else nick_spaces) + AT(line)
-            lines.append(text)
+        content_lines = message.content.split("\n")
 
+        def render_line(i: int) -> AT:
+            return (nick if i == 0 else nick_spaces) + AT(content_lines[i])
+
+        lines = LazyLines(len(content_lines), render_line)
         return RenderedMessage(message.id, lines, meta)
 
     def render_cursor(self, width: int) -> AT:
         return AT("<cursor>")
+
+    def render_folded(self, count: int, width: int) -> AT:
+        return AT(f"<{count} folded>")
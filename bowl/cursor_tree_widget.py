@@ -1,3 +1,4 @@
+import asyncio
 from typing import Optional, Tuple, TypeVar
 
 import urwid
@@ -5,6 +6,7 @@ import urwid
 from .attributed_lines_widget import AttributedLinesWidget
 from .cursor_rendering import CursorTreeRenderer
 from .element import Element
+from .rendering_pool import RenderingPool
 
 __all__ = ["CursorTreeWidget"]
 
@@ -13,13 +15,23 @@ E = TypeVar("E", bound=Element)
 class CursorTreeWidget(urwid.WidgetWrap):
     """
     This widget draws a CursorTree and moves the cursor around.
+
+    If prerender_screens is set, messages that many screens above and below
+    the visible ones are rendered in the background while the asyncio event
+    loop is idle. If a RenderingPool is given, most of them are rendered in
+    other processes instead.
     """
 
+    # How long each pre-rendering step may block the event loop, in seconds
+    PRERENDER_SLICE = 0.005
+
     def __init__(self,
             tree: CursorTreeRenderer[E],
             vertical_scroll_step: int = 1,
             horizontal_scroll_step: int = 4,
             half_page_scroll: bool = False,
+            prerender_screens: int = 0,
+            rendering_pool: Optional[RenderingPool] = None,
             ) -> None:
 
         self._tree = tree
@@ -32,18 +44,72 @@ class CursorTreeWidget(urwid.WidgetWrap):
             raise ValueError("vertical scroll step must be at least 1")
         if horizontal_scroll_step < 1:
             raise ValueError("horizontal scroll step must be at least 1")
+        if prerender_screens < 0:
+            raise ValueError("prerender screens must be 0 or greater")
         self._vertical_scroll_step = vertical_scroll_step
         self._horizontal_scroll_step = horizontal_scroll_step
         self._half_page_scroll = half_page_scroll
+        self._prerender_screens = prerender_screens
+        self._rendering_pool = rendering_pool
+
+        self._prerendering: Optional["asyncio.Future[None]"] = None
+
+    def close(self) -> None:
+        """
+        Stop pre-rendering and shut down the RenderingPool, if there is one.
+        """
+
+        if self._prerendering is not None:
+            self._prerendering.cancel()
+
+        if self._rendering_pool is not None:
+            self._rendering_pool.close()
+            self._rendering_pool = None
 
     def render(self, size: Tuple[int, int], focus: bool) -> None:
         width, height = size
 
         self._tree.render(width, height)
         self._lines.set_lines(self._tree.lines)
+        self._start_prerendering()
 
         return super().render(size, focus)
 
+    def _start_prerendering(self) -> None:
+        if self._prerender_screens == 0 or self._prerendering is not None:
+            return
+
+        # Only possible when running inside an asyncio event loop
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            return
+        if not loop.is_running():
+            return
+
+        self._prerendering = asyncio.ensure_future(self._prerender())
+
+    async def _prerender(self) -> None:
+        try:
+            if self._rendering_pool is not None:
+                width = self._tree.width
+                jobs = self._tree.prerender_jobs(self._prerender_screens)
+                rendered = await self._rendering_pool.render(jobs,
+                        self._tree.height)
+                self._tree.add_rendered(rendered, width)
+
+            # Whatever the pool didn't render (or what scrolled into range in
+            # the meantime) is rendered here.
+            #
+            # Every step pre-renders around the current screen position, so
+            # scrolling in the meantime doesn't need to restart this
+            while self._tree.prerender(self.PRERENDER_SLICE,
+                    self._prerender_screens):
+                # Let input and network events through between steps
+                await asyncio.sleep(0)
+        finally:
+            self._prerendering = None
+
     def selectable(self) -> bool:
         return True
 
@@ -59,6 +125,11 @@ class CursorTreeWidget(urwid.WidgetWrap):
         elif key in {"esc", "end", "G"}:
             self._tree.move_cursor_to_bottom()
             self._invalidate()
+        elif key == "f":
+            cursor_id = self._tree.cursor_id
+            if cursor_id is not None:
+                self._tree.toggle_fold(cursor_id)
+                self._invalidate()
         elif key in {"shift up", "K"}:
             self._tree.scroll(self._vertical_scroll_step)
             self._invalidate()
@@ -1,9 +1,11 @@
 import datetime
-from typing import Hashable, List, Optional
+from typing import (Callable, Dict, Hashable, List, Optional, Sequence, Union,
+        overload)
 
 from .markup import AT
 
-__all__ = ["Id", "Element", "RenderedElement", "Message", "RenderedMessage"]
+__all__ = ["Id", "Element", "LazyLines", "RenderedElement", "Message",
+        "RenderedMessage"]
 
 Id = Hashable
 
@@ -25,9 +27,56 @@ class Element:
     def parent_id(self) -> Optional[Id]:
         return self._parent_id
 
+class LazyLines(Sequence[AT]):
+    """
+    A sequence of a known amount of lines that are only rendered once they are
+    accessed. Rendered lines are remembered.
+
+    This allows huge messages to be rendered without rendering every single
+    one of their lines.
+    """
+
+    def __init__(self, count: int, render_line: Callable[[int], AT]) -> None:
+        self._count = count
+        self._render_line = render_line
+        self._lines: Dict[int, AT] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    @overload
+    def __getitem__(self, index: int) -> AT: ...
+    @overload
+    def __getitem__(self, index: slice) -> List[AT]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[AT, List[AT]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("line index out of range")
+
+        line = self._lines.get(index)
+        if line is None:
+            line = self._render_line(index)
+            self._lines[index] = line
+
+        return line
+
+    def render_first(self, count: int) -> None:
+        """
+        Render the first count lines (or all lines, if there are fewer) ahead
+        of time, so accessing them later is fast.
+        """
+
+        for index in range(min(count, self._count)):
+            self[index]
+
 class RenderedElement:
 
-    def __init__(self, id: Id, lines: List[AT]) -> None:
+    def __init__(self, id: Id, lines: Sequence[AT]) -> None:
 
         self._id = id
         self._lines = lines
@@ -37,7 +86,7 @@ class RenderedElement:
         return self._id
 
     @property
-    def lines(self) -> List[AT]:
+    def lines(self) -> Sequence[AT]:
         return self._lines
 
 class Message(Element):
@@ -69,7 +118,7 @@ class Message(Element):
 
 class RenderedMessage(RenderedElement):
 
-    def __init__(self, id: Id, lines: List[AT], meta: AT) -> None:
+    def __init__(self, id: Id, lines: Sequence[AT], meta: AT) -> None:
         super().__init__(id, lines)
         self._meta = meta
 
@@ -1,9 +1,13 @@
+import bisect
+import itertools
 from abc import ABC, abstractmethod
-from typing import Dict, Generic, List, Optional, TypeVar
+from typing import (Any, Dict, Generic, Iterator, KeysView, List, Optional,
+        Set, Tuple, TypeVar)
 
-from .element import Element, Id
+from .element import Element, Id, Message
 
-__all__ = ["ElementSupplyException", "ElementSupply", "InMemorySupply"]
+__all__ = ["ElementSupplyException", "ElementSupply", "InMemorySupply",
+        "InMemoryMessageSupply", "FoldingSupply"]
 
 class ElementSupplyException(Exception):
     pass
@@ -82,6 +86,56 @@ class ElementSupply(ABC, Generic[E]):
 
         pass
 
+    def descendant_count(self, elem_id: Id) -> int:
+        """
+        Count all elements in the subtree below an element, not including the
+        element itself.
+
+        Supplies that can count without visiting every descendant should
+        overwrite this function.
+        """
+
+        count = 0
+        stack = list(self.child_ids(elem_id))
+
+        while stack:
+            count += 1
+            stack.extend(self.child_ids(stack.pop()))
+
+        return count
+
+    def last_descendant_id(self, elem_id: Id) -> Id:
+        """
+        Find the lowest element in the subtree below an element. If the
+        element has no children, this is the element itself.
+        """
+
+        while True:
+            child_ids = self.child_ids(elem_id)
+            if child_ids:
+                elem_id = child_ids[-1]
+            else:
+                return elem_id
+
+    def subtree_depth(self, elem_id: Id) -> int:
+        """
+        Find the maximum nesting depth below an element. An element without
+        children has a subtree depth of 0, one with only children a subtree
+        depth of 1.
+        """
+
+        depth = 0
+        stack = [(elem_id, 0)]
+
+        while stack:
+            current_id, current_depth = stack.pop()
+            depth = max(depth, current_depth)
+
+            for child_id in self.child_ids(current_id):
+                stack.append((child_id, current_depth + 1))
+
+        return depth
+
     def root_id(self, elem_id: Id) -> Id:
         """
         Find the root of the tree that an element is contained in.
@@ -96,6 +150,13 @@ class ElementSupply(ABC, Generic[E]):
 
         return ancestor_id
 
+    def depth(self, elem_id: Id) -> int:
+        """
+        Count an element's ancestors. Roots have a depth of 0.
+        """
+
+        return len(self.ancestor_path(elem_id)) - 1
+
     def previous_id(self, elem_id: Id) -> Optional[Id]:
         """
         Find an element's previous (upper) sibling.
@@ -133,12 +194,7 @@ class ElementSupply(ABC, Generic[E]):
         if above_id is None:
             return self.parent_id(elem_id)
 
-        while True:
-            child_ids = self.child_ids(above_id)
-            if child_ids:
-                above_id = child_ids[-1]
-            else:
-                return above_id
+        return self.last_descendant_id(above_id)
 
     def below_id(self, elem_id: Id) -> Optional[Id]:
         child_ids = self.child_ids(elem_id)
@@ -194,26 +250,126 @@ class ElementSupply(ABC, Generic[E]):
             stop_id: Optional[Id],
             ) -> List[Id]:
 
-        start_path = self.ancestor_path(start_id)
-        stop_path = self.ancestor_path(stop_id)
+        return list(self.iter_between(start_id, stop_id))
 
-        if start_path > stop_path:
-            return []
-        elif start_id == stop_id:
-            return [start_id]
+    def iter_between(self,
+            start_id: Id,
+            stop_id: Optional[Id],
+            ) -> Iterator[Id]:
+        """
+        Iterate over all elements from start_id down to and including
+        stop_id. If stop_id is above start_id, nothing is yielded. If stop_id
+        is not below start_id, iterate until the end of the tree.
+        """
 
-        between_ids = [start_id]
-        current_id = start_id
-        while current_id != stop_id:
-            below_id = self.below_id(current_id)
+        if stop_id is None or self.is_above(stop_id, start_id):
+            return
 
-            if below_id is None:
-                break
+        for elem_id in self.iter_below(start_id):
+            yield elem_id
+
+            if elem_id == stop_id:
+                return
+
+    def is_above(self, elem_id: Id, other_id: Id) -> bool:
+        """
+        Whether an element is displayed above another element.
+
+        Supplies that know the order of their elements should overwrite this
+        function.
+        """
+
+        return self.ancestor_path(elem_id) < self.ancestor_path(other_id)
+
+    def count_between(self, start_id: Id, stop_id: Id) -> int:
+        """
+        Count the elements that between_ids() would return.
+
+        Supplies that know the order of their elements should overwrite this
+        function.
+        """
+
+        return sum(1 for _ in self.iter_between(start_id, stop_id))
+
+    def _sibling_stack(self, elem_id: Id) -> List[Tuple[List[Id], int]]:
+        """
+        For each element of an element's ancestor path, find its siblings and
+        its position among them. This is the state a pre-order traversal
+        starting at the element needs.
+        """
+
+        stack = []
+
+        for ancestor_id in self.ancestor_path(elem_id):
+            sibling_ids = self.sibling_ids(ancestor_id)
+            stack.append((sibling_ids, sibling_ids.index(ancestor_id)))
+
+        return stack
+
+    def iter_below(self, elem_id: Id) -> Iterator[Id]:
+        """
+        Iterate over an element and all elements below it, in the order they
+        are displayed in (pre-order).
+
+        Unlike repeatedly calling below_id(), this only looks up each
+        element's children once. Supplies that can list elements in order
+        more efficiently should overwrite this function.
+        """
+
+        stack = self._sibling_stack(elem_id)
+        yield elem_id
+
+        while True:
+            child_ids = self.child_ids(elem_id)
+            if child_ids:
+                stack.append((child_ids, 0))
+                elem_id = child_ids[0]
+                yield elem_id
+                continue
+
+            # Go to the next sibling of the closest ancestor that has one
+            while stack:
+                sibling_ids, index = stack.pop()
+                if index + 1 < len(sibling_ids):
+                    stack.append((sibling_ids, index + 1))
+                    elem_id = sibling_ids[index + 1]
+                    break
+            else:
+                return
+
+            yield elem_id
+
+    def iter_above(self, elem_id: Id) -> Iterator[Id]:
+        """
+        Iterate over an element and all elements above it, in the reverse
+        order they are displayed in.
+
+        Supplies that can list elements in order more efficiently should
+        overwrite this function.
+        """
+
+        stack = self._sibling_stack(elem_id)
+        yield elem_id
+
+        while stack:
+            sibling_ids, index = stack.pop()
+
+            if index > 0:
+                # The previous sibling's subtree comes first, bottom to top
+                stack.append((sibling_ids, index - 1))
+                elem_id = sibling_ids[index - 1]
 
-            current_id = below_id
-            between_ids.append(current_id)
+                while True:
+                    child_ids = self.child_ids(elem_id)
+                    if not child_ids: break
+                    stack.append((child_ids, len(child_ids) - 1))
+                    elem_id = child_ids[-1]
 
-        return between_ids
+                yield elem_id
+            elif stack:
+                # Then the parent
+                parent_ids, parent_index = stack[-1]
+                yield parent_ids[parent_index]
 
     def ancestor_path(self, elem_id: Optional[Id]) -> List[Id]:
         path = []
@@ -224,6 +380,19 @@ class ElementSupply(ABC, Generic[E]):
 
         return list(reversed(path))
 
+# InMemorySupply keeps ids sorted, so they need to be comparable and not just
+# hashable. Id can't express that, so these lists are typed more loosely.
+SortedIds = List[Any]
+
+# The distance between the labels of neighbouring elements after relabeling
+# (see InMemorySupply._label_subtree()). New elements are labeled at most
+# LABEL_STEP after the element above them, since new messages tend to be added
+# right below the previous new message. This way, tens of thousands of
+# messages can be added one after another in the same place (and a few dozen
+# above each other) before everything has to be relabeled.
+LABEL_GAP = 1 << 32
+LABEL_STEP = 1 << 16
+
 class InMemorySupply(ElementSupply[E]):
     """
     This supply stores messages in memory. It orders the messages by their ids.
@@ -231,34 +400,319 @@ class InMemorySupply(ElementSupply[E]):
 
     def __init__(self) -> None:
         self._elements: Dict[Id, E] = {}
-        self._children: Dict[Id, List[Id]] = {}
+        self._children: Dict[Id, SortedIds] = {}
+        self._root_ids: SortedIds = []
+
+        # Subtree statistics, kept up to date by add() and remove()
+        self._descendant_counts: Dict[Id, int] = {}
+        self._last_descendant_ids: Dict[Id, Id] = {}
+        self._subtree_depths: Dict[Id, int] = {}
+
+        # Labels that sort all elements in the order they are displayed in
+        # (pre-order). There are gaps between the labels, so a new element can
+        # almost always be labeled without changing any other labels. Elements
+        # whose parent is missing have no label.
+        self._labels: Dict[Id, int] = {}
+
+        # Every element's root and depth, filled in when they are first asked
+        # for. Elements whose parent is missing are never cached.
+        self._cached_root_ids: Dict[Id, Id] = {}
+        self._cached_depths: Dict[Id, int] = {}
 
     def add(self, elem: E) -> None:
-        if elem.id in self._elements:
+        old = self._elements.get(elem.id)
+        if old is not None:
+            if old.parent_id == elem.parent_id:
+                # Edits don't change the tree
+                self._elements[elem.id] = elem
+                return
+
             self.remove(elem.id)
 
         self._elements[elem.id] = elem
 
         if elem.parent_id is not None:
-            children = self._children.get(elem.parent_id, [])
-            children.append(elem.id)
-            children.sort()
-            self._children[elem.parent_id] = children
+            children = self._children.setdefault(elem.parent_id, [])
+            bisect.insort(children, elem.id)
+        else:
+            bisect.insort(self._root_ids, elem.id)
+
+        # The element's children might have been added before the element
+        # itself
+        self._update_statistics(elem.id)
+
+        count = self._descendant_counts[elem.id]
+        self._update_ancestor_statistics(elem.id, elem.parent_id, 1 + count)
+
+        if elem.parent_id is None or elem.parent_id in self._labels:
+            self._label_subtree(elem.id)
 
     def remove(self, elem_id: Id) -> None:
         elem = self._elements.get(elem_id)
         if elem is None: return
 
+        # The element's descendants are disconnected from their root
+        if elem.id in self._labels:
+            for subtree_id in self._subtree_ids(elem.id):
+                self._labels.pop(subtree_id, None)
+
         self._elements.pop(elem.id)
 
+        # Removing an element disconnects its descendants from their root. This
+        # also happens when an element is replaced with one that has a
+        # different parent, but that's rare enough to just start over.
+        if elem.id in self._children:
+            self._cached_root_ids = {}
+            self._cached_depths = {}
+        else:
+            self._cached_root_ids.pop(elem.id, None)
+            self._cached_depths.pop(elem.id, None)
+
+        count = self._descendant_counts.pop(elem.id)
+        self._last_descendant_ids.pop(elem.id)
+        self._subtree_depths.pop(elem.id)
+
         if elem.parent_id is not None:
-            children = self._children.get(elem.id)
+            children = self._children.get(elem.parent_id)
 
             if children is not None: # just to satisfy mypy
-                children.remove(elem)
+                children.remove(elem.id)
 
                 if not children:
-                    self._children.pop(elem.id)
+                    self._children.pop(elem.parent_id)
+        else:
+            self._root_ids.remove(elem.id)
+
+        self._update_ancestor_statistics(elem.id, elem.parent_id,
+                -(1 + count), removed=True)
+
+    def _update_statistics(self, elem_id: Id) -> None:
+        """
+        Calculate an element's subtree statistics from those of its children.
+        """
+
+        child_ids = self._children.get(elem_id, [])
+
+        if child_ids:
+            self._descendant_counts[elem_id] = sum(
+                    1 + self._descendant_counts[child_id]
+                    for child_id in child_ids)
+            self._last_descendant_ids[elem_id] = \
+                    self._last_descendant_ids[child_ids[-1]]
+            self._subtree_depths[elem_id] = 1 + max(
+                    self._subtree_depths[child_id] for child_id in child_ids)
+        else:
+            self._descendant_counts[elem_id] = 0
+            self._last_descendant_ids[elem_id] = elem_id
+            self._subtree_depths[elem_id] = 0
+
+    def _update_ancestor_statistics(self,
+            child_id: Id,
+            parent_id: Optional[Id],
+            delta: int,
+            removed: bool = False,
+            ) -> None:
+        """
+        Update the statistics of all ancestors of child_id after a subtree of
+        delta elements was added there (or removed, if delta is negative).
+
+        This only visits the ancestors themselves and, after a removal, their
+        children.
+        """
+
+        while parent_id is not None:
+            parent = self._elements.get(parent_id)
+            if parent is None: break
+
+            self._descendant_counts[parent_id] += delta
+
+            child_ids = self._children.get(parent_id, [])
+            if child_ids:
+                self._last_descendant_ids[parent_id] = \
+                        self._last_descendant_ids[child_ids[-1]]
+            else:
+                self._last_descendant_ids[parent_id] = parent_id
+
+            if removed:
+                self._subtree_depths[parent_id] = 1 + max(
+                        (self._subtree_depths[i] for i in child_ids),
+                        default=-1)
+            else:
+                self._subtree_depths[parent_id] = max(
+                        self._subtree_depths[parent_id],
+                        1 + self._subtree_depths[child_id])
+
+            child_id = parent_id
+            parent_id = parent.parent_id
+
+    def _cache_ancestry(self, elem_id: Id) -> bool:
+        """
+        Find the root and depth of an element and all its ancestors, starting
+        from the closest ancestor whose root and depth are already known.
+
+        Returns False if the element is not connected to a root.
+        """
+
+        uncached_ids = []
+
+        while elem_id not in self._cached_root_ids:
+            elem = self._elements.get(elem_id)
+            if elem is None:
+                return False
+
+            uncached_ids.append(elem_id)
+
+            if elem.parent_id is None:
+                root_id = elem_id
+                depth = -1
+                break
+
+            elem_id = elem.parent_id
+        else:
+            root_id = self._cached_root_ids[elem_id]
+            depth = self._cached_depths[elem_id]
+
+        for uncached_id in reversed(uncached_ids):
+            depth += 1
+            self._cached_root_ids[uncached_id] = root_id
+            self._cached_depths[uncached_id] = depth
+
+        return True
+
+    def _subtree_ids(self, elem_id: Id) -> Iterator[Id]:
+        """
+        Iterate over an element and its descendants in pre-order. Works for
+        elements whose parent is missing as well.
+        """
+
+        stack = [elem_id]
+        while stack:
+            current_id = stack.pop()
+            yield current_id
+            stack.extend(reversed(self._children.get(current_id, [])))
+
+    def _relabel(self) -> None:
+        self._labels = {}
+
+        label = 0
+        for root_id in self._root_ids:
+            for elem_id in self._subtree_ids(root_id):
+                self._labels[elem_id] = label
+                label += LABEL_GAP
+
+    def _neighbour_labels(self, elem_id: Id) -> Tuple[Optional[int],
+            Optional[int]]:
+        """
+        Find the labels of the elements displayed directly above an element
+        and directly below its subtree. They are None at the very top and the
+        very bottom.
+        """
+
+        elem = self._elements[elem_id]
+
+        siblings = self._siblings(elem_id)
+        index = bisect.bisect_left(siblings, elem_id)
+        above: Optional[int]
+        if index > 0:
+            previous_id = siblings[index - 1]
+            above = self._labels[self._last_descendant_ids[previous_id]]
+        elif elem.parent_id is not None:
+            above = self._labels[elem.parent_id]
+        else:
+            above = None
+
+        # The next sibling of the element or of its closest ancestor that has
+        # one
+        while True:
+            siblings = self._siblings(elem.id)
+            index = bisect.bisect_right(siblings, elem.id)
+            if index < len(siblings):
+                return above, self._labels[siblings[index]]
+
+            if elem.parent_id is None:
+                return above, None
+
+            elem = self._elements[elem.parent_id]
+
+    def _label_subtree(self, elem_id: Id) -> None:
+        """
+        Label an element that was just connected to a root, along with its
+        descendants, which might have been added before it.
+        """
+
+        subtree_ids = list(self._subtree_ids(elem_id))
+        above, below = self._neighbour_labels(elem_id)
+
+        if above is not None and below is not None:
+            step = min(LABEL_STEP, (below - above) // (len(subtree_ids) + 1))
+            if step < 1:
+                # The gap is used up
+                self._relabel_around(elem_id, subtree_ids)
+                return
+
+            start = above + step
+        elif above is not None:
+            start, step = above + LABEL_GAP, LABEL_GAP
+        elif below is not None:
+            start, step = below - len(subtree_ids) * LABEL_GAP, LABEL_GAP
+        else:
+            start, step = 0, LABEL_GAP
+
+        for index, subtree_id in enumerate(subtree_ids):
+            self._labels[subtree_id] = start + index * step
+
+    def _relabel_around(self, elem_id: Id, subtree_ids: List[Id]) -> None:
+        """
+        Label a subtree that doesn't fit between its neighbours' labels. The
+        labels of more and more of the surrounding elements are spread out
+        evenly until there is enough room between them.
+        """
+
+        above_ids = self.iter_above(elem_id)
+        below_ids = self.iter_below(self._last_descendant_ids[elem_id])
+        next(above_ids) # the element itself
+        next(below_ids) # the subtree's last element
+
+        above: List[Id] = []
+        below: List[Id] = []
+        amount = 1
+        requested = 0
+        while True:
+            above.extend(itertools.islice(above_ids, amount))
+            below.extend(itertools.islice(below_ids, amount))
+            requested += amount
+            amount *= 2
+
+            top = len(above) < requested
+            bottom = len(below) < requested
+            if top and bottom:
+                self._relabel()
+                return
+
+            # The outermost elements keep their labels, unless there are no
+            # more elements beyond them
+            inner_above = above if top else above[:-1]
+            inner_below = below if bottom else below[:-1]
+            ids = list(reversed(inner_above)) + subtree_ids + inner_below
+
+            if top:
+                high = self._labels[below[-1]]
+                start, step = high - len(ids) * LABEL_GAP, LABEL_GAP
+                break
+            elif bottom:
+                low = self._labels[above[-1]]
+                start, step = low + LABEL_GAP, LABEL_GAP
+                break
+
+            low = self._labels[above[-1]]
+            high = self._labels[below[-1]]
+            step = (high - low) // (len(ids) + 1)
+            if step >= LABEL_STEP:
+                start = low + step
+                break
+
+        for index, relabeled_id in enumerate(ids):
+            self._labels[relabeled_id] = start + index * step
 
     def get(self, elem_id: Id) -> E:
         elem = self._elements.get(elem_id)
@@ -277,29 +731,467 @@ class InMemorySupply(ElementSupply[E]):
         elem = self.get(elem_id)
         return elem.parent_id
 
-    def _roots(self) -> List[Id]:
-        roots = (i for i, m in self._elements.items() if m.parent_id is None)
-        return list(sorted(roots))
+    def _siblings(self, elem_id: Id) -> SortedIds:
+        """
+        The (sorted) list of siblings an element is stored in. Must not be
+        modified.
+        """
 
-    def sibling_ids(self, elem_id: Id) -> List[Id]:
         parent_id = self.parent_id(elem_id)
 
         if parent_id is None:
-            return self._roots()
+            return self._root_ids
         else:
-            return self.child_ids(parent_id)
+            return self._children[parent_id]
 
-    def lowest_root_id(self) -> Optional[Id]:
-        roots = self._roots()
+    def sibling_ids(self, elem_id: Id) -> List[Id]:
+        return list(self._siblings(elem_id))
+
+    def previous_id(self, elem_id: Id) -> Optional[Id]:
+        sibling_ids = self._siblings(elem_id)
+        index = bisect.bisect_left(sibling_ids, elem_id)
+
+        if index <= 0:
+            return None
+        else:
+            return sibling_ids[index - 1]
+
+    def next_id(self, elem_id: Id) -> Optional[Id]:
+        sibling_ids = self._siblings(elem_id)
+        index = bisect.bisect_right(sibling_ids, elem_id)
+
+        if index >= len(sibling_ids):
+            return None
+        else:
+            return sibling_ids[index]
 
-        if roots:
-            return roots[-1]
+    def lowest_root_id(self) -> Optional[Id]:
+        if self._root_ids:
+            return self._root_ids[-1]
         else:
             return None
 
     def oldest_id(self) -> Optional[Id]:
-        ids = self._elements.keys()
+        ids: KeysView[Any] = self._elements.keys()
         if ids:
             return min(ids)
         else:
             return None
+
+    def descendant_count(self, elem_id: Id) -> int:
+        self.get(elem_id) # Throw exception if element doesn't exist
+
+        return self._descendant_counts[elem_id]
+
+    def last_descendant_id(self, elem_id: Id) -> Id:
+        self.get(elem_id) # Throw exception if element doesn't exist
+
+        return self._last_descendant_ids[elem_id]
+
+    def subtree_depth(self, elem_id: Id) -> int:
+        self.get(elem_id) # Throw exception if element doesn't exist
+
+        return self._subtree_depths[elem_id]
+
+    def root_id(self, elem_id: Id) -> Id:
+        self.get(elem_id) # Throw exception if element doesn't exist
+
+        if not self._cache_ancestry(elem_id):
+            return super().root_id(elem_id)
+
+        return self._cached_root_ids[elem_id]
+
+    def depth(self, elem_id: Id) -> int:
+        self.get(elem_id) # Throw exception if element doesn't exist
+
+        if not self._cache_ancestry(elem_id):
+            return super().depth(elem_id)
+
+        return self._cached_depths[elem_id]
+
+    def is_above(self, elem_id: Id, other_id: Id) -> bool:
+        self.get(elem_id) # Throw exception if element doesn't exist
+        self.get(other_id) # Throw exception if element doesn't exist
+
+        label = self._labels.get(elem_id)
+        other_label = self._labels.get(other_id)
+
+        if label is None or other_label is None:
+            return super().is_above(elem_id, other_id)
+
+        return label < other_label
+
+    def _subtree_sizes(self, elem_ids: SortedIds) -> int:
+        return sum(1 + self._descendant_counts[elem_id] for elem_id in elem_ids)
+
+    def count_between(self, start_id: Id, stop_id: Id) -> int:
+        self.get(start_id) # Throw exception if element doesn't exist
+        self.get(stop_id) # Throw exception if element doesn't exist
+
+        start_label = self._labels.get(start_id)
+        stop_label = self._labels.get(stop_id)
+
+        if start_label is None or stop_label is None:
+            return super().count_between(start_id, stop_id)
+        if start_label > stop_label:
+            return 0
+
+        # In pre-order, an element comes after its ancestors and after the
+        # subtrees of its ancestors' (and its own) previous siblings. Above
+        # the closest common ancestor of both elements, these are the same for
+        # both of them.
+        start_path = self.ancestor_path(start_id)
+        stop_path = self.ancestor_path(stop_id)
+
+        level = 0
+        while (level < len(start_path)
+                and start_path[level] == stop_path[level]):
+            level += 1
+
+        if level == len(stop_path):
+            return 1 # the same element
+
+        count = 1 + len(stop_path) - len(start_path)
+
+        for index in range(level, len(stop_path)):
+            siblings = self._siblings(stop_path[index])
+            stop = bisect.bisect_left(siblings, stop_path[index])
+
+            # Where both paths split up, only the siblings between them count
+            start = 0
+            if index == level and level < len(start_path):
+                start = bisect.bisect_left(siblings, start_path[level])
+
+            count += self._subtree_sizes(siblings[start:stop])
+
+        for index in range(level + 1, len(start_path)):
+            siblings = self._siblings(start_path[index])
+            stop = bisect.bisect_left(siblings, start_path[index])
+            count -= self._subtree_sizes(siblings[:stop])
+
+        return count
+
+class InMemoryMessageSupply(InMemorySupply[Message]):
+    """
+    This supply stores Message-s in memory and additionally keeps track of
+    which messages were sent by which nick.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        self._nick_ids: Dict[str, Set[Id]] = {}
+
+    def _forget_nick(self, elem: Message) -> None:
+        nick_ids = self._nick_ids.get(elem.nick)
+        if nick_ids is None: return
+
+        nick_ids.discard(elem.id)
+        if not nick_ids:
+            self._nick_ids.pop(elem.nick)
+
+    def add(self, elem: Message) -> None:
+        # Edits don't go through remove()
+        old = self._elements.get(elem.id)
+        if old is not None:
+            self._forget_nick(old)
+
+        super().add(elem)
+
+        self._nick_ids.setdefault(elem.nick, set()).add(elem.id)
+
+    def remove(self, elem_id: Id) -> None:
+        elem = self._elements.get(elem_id)
+        if elem is None: return
+
+        super().remove(elem_id)
+        self._forget_nick(elem)
+
+    def nicks(self) -> List[str]:
+        """
+        Retrieve all nicks that messages were sent by.
+        """
+
+        return list(self._nick_ids)
+
+    def nick_ids(self, nick: str) -> List[Id]:
+        """
+        Retrieve all messages sent by a nick.
+        """
+
+        return list(self._nick_ids.get(nick, set()))
+
+class FoldingSupply(ElementSupply[E]):
+    """
+    This supply wraps another supply and hides the children of folded
+    elements. Navigating the tree (for example using below_id() or
+    between_ids()) skips over folded subtrees without visiting any of the
+    hidden elements.
+
+    Navigation is always done by the wrapped supply, so its optimizations
+    (like listing elements in order or counting them without visiting each
+    one) still apply while elements are folded. Folded subtrees are skipped
+    by continuing the wrapped supply's traversal after them.
+    """
+
+    def __init__(self, supply: ElementSupply[E]) -> None:
+        self._supply = supply
+        self._folded: Set[Id] = set()
+
+    @property
+    def supply(self) -> ElementSupply[E]:
+        return self._supply
+
+    # Folding
+
+    def is_folded(self, elem_id: Id) -> bool:
+        return elem_id in self._folded
+
+    def fold(self, elem_id: Id) -> None:
+        self._folded.add(elem_id)
+
+    def unfold(self, elem_id: Id) -> None:
+        self._folded.discard(elem_id)
+
+    def unfold_all(self) -> None:
+        self._folded = set()
+
+    def _hiding_id(self,
+            elem_id: Id,
+            known: Dict[Id, Optional[Id]],
+            ) -> Optional[Id]:
+        """
+        Find the highest folded ancestor of an element, which hides the
+        element. Returns None if the element is visible.
+
+        known holds the highest folded element among each element and its
+        ancestors, for elements that were already looked at. Elements visited
+        one after another mostly share their ancestors, so passing the same
+        dict to multiple calls means most of them only look at a single
+        parent.
+        """
+
+        path = []
+        parent_id = self._supply.parent_id(elem_id)
+        while parent_id is not None and parent_id not in known:
+            path.append(parent_id)
+            parent_id = self._supply.parent_id(parent_id)
+
+        hiding_id = None if parent_id is None else known[parent_id]
+        for ancestor_id in reversed(path):
+            if hiding_id is None and ancestor_id in self._folded:
+                hiding_id = ancestor_id
+            known[ancestor_id] = hiding_id
+
+        return hiding_id
+
+    def _iter_below(self, elem_id: Id) -> Iterator[Id]:
+        while True:
+            for current_id in self._supply.iter_below(elem_id):
+                yield current_id
+
+                if current_id not in self._folded:
+                    continue
+
+                last_id = self._supply.last_descendant_id(current_id)
+                if last_id == current_id:
+                    continue
+
+                # Continue after the folded subtree
+                below_id = self._supply.below_id(last_id)
+                if below_id is None:
+                    return
+
+                elem_id = below_id
+                break
+            else:
+                return
+
+    def _iter_above(self, elem_id: Id) -> Iterator[Id]:
+        known: Dict[Id, Optional[Id]] = {}
+
+        while True:
+            elem_ids = self._supply.iter_above(elem_id)
+            yield next(elem_ids) # the element the iteration starts at
+
+            for current_id in elem_ids:
+                hiding_id = self._hiding_id(current_id, known)
+                if hiding_id is None:
+                    yield current_id
+                    continue
+
+                # Continue at the folded element, skipping the rest of its
+                # subtree
+                elem_id = hiding_id
+                break
+            else:
+                return
+
+    # Queries affected by folding
+
+    def child_ids(self, elem_id: Id) -> List[Id]:
+        if elem_id in self._folded:
+            self.get(elem_id) # Throw exception if element doesn't exist
+            return []
+
+        return self._supply.child_ids(elem_id)
+
+    def iter_below(self, elem_id: Id) -> Iterator[Id]:
+        if not self._folded:
+            return self._supply.iter_below(elem_id)
+
+        return self._iter_below(elem_id)
+
+    def iter_above(self, elem_id: Id) -> Iterator[Id]:
+        if not self._folded:
+            return self._supply.iter_above(elem_id)
+
+        return self._iter_above(elem_id)
+
+    def above_id(self, elem_id: Id) -> Optional[Id]:
+        if not self._folded:
+            return self._supply.above_id(elem_id)
+
+        above = self._iter_above(elem_id)
+        next(above)
+        return next(above, None)
+
+    def below_id(self, elem_id: Id) -> Optional[Id]:
+        if not self._folded:
+            return self._supply.below_id(elem_id)
+
+        below = self._iter_below(elem_id)
+        next(below)
+        return next(below, None)
+
+    def position_above_id(self, elem_id: Optional[Id]) -> Optional[Id]:
+        if not self._folded:
+            return self._supply.position_above_id(elem_id)
+
+        # Only looks at children, siblings and parents
+        return super().position_above_id(elem_id)
+
+    def position_below_id(self, elem_id: Id) -> Optional[Id]:
+        if not self._folded:
+            return self._supply.position_below_id(elem_id)
+
+        # Only looks at children, siblings and parents
+        return super().position_below_id(elem_id)
+
+    def between_ids(self,
+            start_id: Id,
+            stop_id: Optional[Id],
+            ) -> List[Id]:
+
+        if not self._folded:
+            return self._supply.between_ids(start_id, stop_id)
+
+        return list(self.iter_between(start_id, stop_id))
+
+    def iter_between(self,
+            start_id: Id,
+            stop_id: Optional[Id],
+            ) -> Iterator[Id]:
+
+        if not self._folded:
+            return self._supply.iter_between(start_id, stop_id)
+
+        # Uses is_above() and iter_below()
+        return super().iter_between(start_id, stop_id)
+
+    def count_between(self, start_id: Id, stop_id: Id) -> int:
+        count = self._supply.count_between(start_id, stop_id)
+        if not self._folded:
+            return count
+
+        known: Dict[Id, Optional[Id]] = {}
+        if (self._hiding_id(start_id, known) is not None
+                or self._hiding_id(stop_id, known) is not None):
+            return super().count_between(start_id, stop_id)
+
+        # Both ends are visible, so every visible folded element between them
+        # has its whole subtree between them too
+        for folded_id in self._folded:
+            if self._hiding_id(folded_id, known) is not None:
+                continue # already subtracted with the element hiding it
+
+            after_start = (folded_id == start_id
+                    or self._supply.is_above(start_id, folded_id))
+            if after_start and self._supply.is_above(folded_id, stop_id):
+                count -= self._supply.descendant_count(folded_id)
+
+        return max(0, count)
+
+    def last_descendant_id(self, elem_id: Id) -> Id:
+        if elem_id in self._folded:
+            self.get(elem_id) # Throw exception if element doesn't exist
+            return elem_id
+
+        last_id = self._supply.last_descendant_id(elem_id)
+        if not self._folded:
+            return last_id
+
+        # The last descendant is reached by always going to the last child.
+        # If an element on the way there is folded, the highest one of those
+        # is the last visible descendant instead.
+        visible_id = last_id
+        current_id = last_id
+        while current_id != elem_id:
+            if current_id in self._folded:
+                visible_id = current_id
+
+            parent_id = self._supply.parent_id(current_id)
+            if parent_id is None:
+                break # just to satisfy mypy
+            current_id = parent_id
+
+        return visible_id
+
+    def subtree_depth(self, elem_id: Id) -> int:
+        if not self._folded:
+            return self._supply.subtree_depth(elem_id)
+
+        return super().subtree_depth(elem_id)
+
+    # Queries not affected by folding
+
+    def get(self, elem_id: Id) -> E:
+        return self._supply.get(elem_id)
+
+    def parent_id(self, elem_id: Id) -> Optional[Id]:
+        return self._supply.parent_id(elem_id)
+
+    def sibling_ids(self, elem_id: Id) -> List[Id]:
+        return self._supply.sibling_ids(elem_id)
+
+    def previous_id(self, elem_id: Id) -> Optional[Id]:
+        return self._supply.previous_id(elem_id)
+
+    def next_id(self, elem_id: Id) -> Optional[Id]:
+        return self._supply.next_id(elem_id)
+
+    def lowest_root_id(self) -> Optional[Id]:
+        return self._supply.lowest_root_id()
+
+    def oldest_id(self) -> Optional[Id]:
+        return self._supply.oldest_id()
+
+    def root_id(self, elem_id: Id) -> Id:
+        return self._supply.root_id(elem_id)
+
+    def ancestor_path(self, elem_id: Optional[Id]) -> List[Id]:
+        return self._supply.ancestor_path(elem_id)
+
+    def depth(self, elem_id: Id) -> int:
+        return self._supply.depth(elem_id)
+
+    def is_above(self, elem_id: Id, other_id: Id) -> bool:
+        return self._supply.is_above(elem_id, other_id)
+
+    def descendant_count(self, elem_id: Id) -> int:
+        """
+        Count all descendants of an element, including those hidden by
+        folding.
+        """
+
+        return self._supply.descendant_count(elem_id)
@@ -3,7 +3,10 @@ from typing import List
 from .edit_widgets import *
 from .euph_config import *
 from .euph_renderer import *
+from .euph_tree import *
 from .launch_application import *
+from .log_download import *
+from .log_view_widget import *
 from .nick_list_widget import *
 from .room_widget import *
 from .single_room_application import *
@@ -13,7 +16,10 @@ __all__: List[str] = []
 __all__ += edit_widgets.__all__
 __all__ += euph_config.__all__
 __all__ += euph_renderer.__all__
+__all__ += euph_tree.__all__
 __all__ += launch_application.__all__
+__all__ += log_download.__all__
+__all__ += log_view_widget.__all__
 __all__ += nick_list_widget.__all__
 __all__ += room_widget.__all__
 __all__ += single_room_application.__all__
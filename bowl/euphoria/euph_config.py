@@ -19,6 +19,18 @@ class EuphConfig(TransparentConfig):
     def human(self) -> bool:
         return self["behavior.human"]
 
+    @property
+    def log_dir(self) -> Optional[str]:
+        return self["behavior.log_dir"]
+
+    @property
+    def render_processes(self) -> int:
+        return self["behavior.render_processes"]
+
+    @property
+    def warm_start_messages(self) -> int:
+        return self["behavior.warm_start_messages"]
+
     # basic styles
 
     @property
@@ -69,6 +81,34 @@ class EuphConfig(TransparentConfig):
     def surround_style(self) -> str:
         return self["visual.surround.style"]
 
+    # content
+
+    @property
+    def word_wrap(self) -> bool:
+        return self["visual.content.word_wrap"]
+
+    # highlight
+
+    @property
+    def highlight_mention_style(self) -> str:
+        return self["visual.highlight.mention_style"]
+
+    @property
+    def highlight_room_style(self) -> str:
+        return self["visual.highlight.room_style"]
+
+    @property
+    def highlight_link_style(self) -> str:
+        return self["visual.highlight.link_style"]
+
+    @property
+    def highlight_emoji_style(self) -> str:
+        return self["visual.highlight.emoji_style"]
+
+    @property
+    def highlight_emote_style(self) -> str:
+        return self["visual.highlight.emote_style"]
+
     # indent
 
     @property
@@ -133,6 +173,12 @@ class EuphConfig(TransparentConfig):
     def indent_cursor_style(self) -> str:
         return self["visual.cursor.indent.style"]
 
+    # fold
+
+    @property
+    def fold_style(self) -> str:
+        return self["visual.fold.style"]
+
     # scroll
 
     @property
@@ -151,6 +197,10 @@ class EuphConfig(TransparentConfig):
     def half_page_scroll(self) -> bool:
         return self["visual.scroll.half_page"]
 
+    @property
+    def prerender_screens(self) -> int:
+        return self["visual.scroll.prerender_screens"]
+
     # borders
 
     @property
@@ -206,6 +256,10 @@ class EuphLoader(TreeLoader):
             "nick": {"fg": "light cyan"},
             "own_nick": {"fg": "yellow"},
 
+            "link": {"fg": "light blue, underline"},
+            "emoji": {"fg": "yellow"},
+            "emote": {"fg": "italics"},
+
             "error": {"fg": "light red"},
             "error_room": {"fg": "bold, yellow"},
     }
@@ -225,6 +279,10 @@ class EuphLoader(TreeLoader):
         # behavior
         self.add("behavior.cookie_file", Kind.RAW, None, self.OPTIONAL_STR)
         self.add("behavior.human", Kind.BOOL, True)
+        self.add("behavior.log_dir", Kind.RAW, None, self.OPTIONAL_STR)
+        self.add("behavior.render_processes", Kind.INT, 0, self.AT_LEAST_0)
+        self.add("behavior.warm_start_messages", Kind.INT, 500,
+                self.AT_LEAST_0)
 
         # basic styles
         self.add_style("visual.room_style", "room")
@@ -244,6 +302,16 @@ class EuphLoader(TreeLoader):
         self.add("visual.surround.right", Kind.STR, "]", self.SINGLE_CHAR)
         self.add_style("visual.surround.style", "bold")
 
+        # content
+        self.add("visual.content.word_wrap", Kind.BOOL, True)
+
+        # highlight
+        self.add_style("visual.highlight.mention_style", "nick")
+        self.add_style("visual.highlight.room_style", "room")
+        self.add_style("visual.highlight.link_style", "link")
+        self.add_style("visual.highlight.emoji_style", "emoji")
+        self.add_style("visual.highlight.emote_style", "emote")
+
         # indent
         self.add("visual.indent.width", Kind.INT, 2, self.AT_LEAST_1)
         self.add("visual.indent.char", Kind.STR, "│", self.SINGLE_CHAR)
@@ -269,11 +337,16 @@ class EuphLoader(TreeLoader):
         self.add("visual.cursor.indent.fill", Kind.STR, "━", self.SINGLE_CHAR)
         self.add_style("visual.cursor.indent.style", "cursor")
 
+        # fold
+        self.add_style("visual.fold.style", "gray")
+
         # scroll
         self.add("visual.scroll.scrolloff", Kind.INT, 3, self.AT_LEAST_0)
         self.add("visual.scroll.vertical", Kind.INT, 2, self.AT_LEAST_1)
         self.add("visual.scroll.horizontal", Kind.INT, 8, self.AT_LEAST_1)
         self.add("visual.scroll.half_page", Kind.BOOL, True)
+        self.add("visual.scroll.prerender_screens", Kind.INT, 3,
+                self.AT_LEAST_0)
 
         # borders
         self.add("visual.borders.room_name_separator", Kind.STR, "═",
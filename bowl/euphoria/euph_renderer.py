@@ -1,14 +1,87 @@
+import bisect
+import re
 import unicodedata
-from typing import Set
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypeVar
 
 import yaboli
 
 from ..cursor_rendering import CursorRenderer
-from ..element import Message, RenderedMessage
-from ..markup import AT, AttributedText, Attributes
+from ..element import Id, LazyLines, Message, RenderedMessage
+from ..markup import AT, ATBuilder, AttributedText, Attributes
+from ..utils import Spans, ulen, uwrap
 
 __all__ = ["EuphRenderer"]
 
+T = TypeVar("T")
+
+# Start index, end index and attributes of each highlighted part of a message,
+# in order
+Highlights = List[Tuple[int, int, Attributes]]
+
+def _lookup(
+        cache: Dict[Any, Tuple[str, T]],
+        key: Any,
+        content: str,
+        compute: Callable[[], T],
+        size: int,
+        ) -> T:
+    """
+    Look up the result for a message's content in a cache whose entries are
+    ordered from least to most recently used. If the message's content has
+    changed since the result was cached, it is computed again.
+
+    Results that only depend on the key are cached with an empty content.
+    """
+
+    cached = cache.pop(key, None)
+
+    if cached is not None and cached[0] == content:
+        result = cached[1]
+    else:
+        result = compute()
+
+    cache[key] = (content, result)
+    if len(cache) > size:
+        oldest = next(iter(cache))
+        cache.pop(oldest)
+
+    return result
+
+class _FilterTable(Dict[int, Optional[str]]):
+    """
+    A translation table for str.translate() that decides what to replace each
+    character with the first time the character is encountered.
+    """
+
+    NORMAL_WIDTH = {"N", "Na", "H", "A"}
+
+    def __init__(self,
+            replace_wide_unicode: bool,
+            replace_character_categories: Set[str],
+            unicode_placeholder: str,
+            ) -> None:
+
+        super().__init__()
+
+        self._replace_wide_unicode = replace_wide_unicode
+        self._replace_character_categories = replace_character_categories
+        self._unicode_placeholder = unicode_placeholder
+
+    def __missing__(self, codepoint: int) -> Optional[str]:
+        char = chr(codepoint)
+        replacement: Optional[str]
+
+        width = unicodedata.east_asian_width(char)
+        if self._replace_wide_unicode and width not in self.NORMAL_WIDTH:
+            replacement = self._unicode_placeholder
+        elif unicodedata.category(char) in self._replace_character_categories:
+            replacement = None # remove the character
+        else:
+            replacement = char
+
+        self[codepoint] = replacement
+        return replacement
+
 class EuphRenderer(CursorRenderer):
 
     YEAR_FORMAT = "%y-%m-%d "
@@ -20,7 +93,22 @@ class EuphRenderer(CursorRenderer):
     SECOND_FORMAT = ":%S"
     SECOND_WIDTH = 3
 
-    NORMAL_WIDTH = {"N", "Na", "H", "A"}
+    WRAP_CACHE_SIZE = 1024
+    HIGHLIGHT_CACHE_SIZE = 1024
+    META_CACHE_SIZE = 4096
+    NICK_CACHE_SIZE = 1024
+
+    # Everything that is highlighted in a message, in a single pattern so
+    # that a message only needs to be scanned once. Trailing punctuation isn't
+    # part of mentions and links.
+    HIGHLIGHT_PATTERN = re.compile(r"""
+        (?P<mention> (?<!\S) @ \S+? (?= [,.!?;&<'"]? (?:\s|$) ) )
+      | (?P<room> (?<![\w&]) & \w+ )
+      | (?P<link> https?:// \S+? (?= [,.!?;:)'"]? (?:\s|$) ) )
+      | (?P<emoji> (?<!\w) : [\w+-]+ : (?!\w) )
+    """, re.VERBOSE)
+
+    EMOTE_PREFIX = "/me "
 
     def __init__(self,
             nick: str,
@@ -35,6 +123,13 @@ class EuphRenderer(CursorRenderer):
             surround_left: str = "[",
             surround_right: str = "]",
             surround_attrs: Attributes = {},
+            # Content settings
+            word_wrap: bool = False,
+            mention_attrs: Attributes = {},
+            room_attrs: Attributes = {},
+            link_attrs: Attributes = {},
+            emoji_attrs: Attributes = {},
+            emote_attrs: Attributes = {},
             # Cursor settings
             cursor_surround_left: str = "<",
             cursor_surround_right: str = ">",
@@ -42,6 +137,8 @@ class EuphRenderer(CursorRenderer):
             cursor_own_nick_attrs: Attributes = {},
             cursor_fill: str = " ",
             cursor_fill_attrs: Attributes = {},
+            # Fold settings
+            fold_attrs: Attributes = {},
             # Various attributes
             nick_attrs: Attributes = {},
             own_nick_attrs: Attributes = {},
@@ -51,14 +148,39 @@ class EuphRenderer(CursorRenderer):
         self._replace_wide_unicode = replace_wide_unicode
         self._replace_character_categories = replace_character_categories
         self._unicode_placeholder = unicode_placeholder
+        self._filter_table = _FilterTable(replace_wide_unicode,
+                replace_character_categories, unicode_placeholder)
+        # Most text is plain ascii, which usually doesn't need to be filtered
+        self._filter_ascii = any(self._filter_table[codepoint] != chr(codepoint)
+                for codepoint in range(128))
         # Meta settings
         self._show_year = show_year
         self._show_seconds = show_seconds
         self._meta_attrs = meta_attrs
+        self._meta_format = self._build_meta_format()
+        # Timestamps that are displayed the same share their meta, see
+        # _render_meta(). Least recently used first.
+        self._meta_cache: Dict[Tuple[int, ...], Tuple[str, AttributedText]] = {}
         # Surround settings
         self._surround_left = surround_left
         self._surround_right = surround_right
         self._surround_attrs = surround_attrs
+        # Content settings
+        self._word_wrap = word_wrap
+        # (message id, width) -> (content, line spans), least recently used
+        # first
+        self._wrap_cache: Dict[Tuple[Id, int], Tuple[str, Spans]] = {}
+        self._highlight_attrs = {
+                "mention": mention_attrs,
+                "room": room_attrs,
+                "link": link_attrs,
+                "emoji": emoji_attrs,
+        }
+        self._emote_attrs = emote_attrs
+        # message id -> (content, (displayed content, attributes, highlights)),
+        # least recently used first
+        self._highlight_cache: Dict[Id,
+                Tuple[str, Tuple[str, Attributes, Highlights]]] = {}
         # Cursor settings
         self._cursor_surround_left = cursor_surround_left
         self._cursor_surround_right = cursor_surround_right
@@ -66,9 +188,25 @@ class EuphRenderer(CursorRenderer):
         self._cursor_own_nick_attrs = cursor_own_nick_attrs
         self._cursor_fill = cursor_fill
         self._cursor_fill_attrs = cursor_fill_attrs
+        # Fold settings
+        self._fold_attrs = fold_attrs
         # Various attributes
         self._nick_attrs = nick_attrs
         self._own_nick_attrs = own_nick_attrs
+        # (nick, own nick) -> (nick prefix, spaces as wide as the prefix),
+        # least recently used first
+        self._nick_cache: Dict[Tuple[str, bool],
+                Tuple[str, Tuple[AttributedText, AttributedText]]] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Renderers are sent to other processes by a RenderingPool. The caches
+        # are only useful in this process.
+        state = dict(self.__dict__)
+        state["_meta_cache"] = {}
+        state["_wrap_cache"] = {}
+        state["_highlight_cache"] = {}
+        state["_nick_cache"] = {}
+        return state
 
     @property
     def meta_width(self) -> int:
@@ -82,22 +220,13 @@ class EuphRenderer(CursorRenderer):
 
         return width
 
-    def _is_wide(self, char: str) -> bool:
-        return unicodedata.east_asian_width(char) not in self.NORMAL_WIDTH
-
     def _filter_unicode(self, text: str) -> str:
-        new_chars = []
-        for char in text:
-            if self._replace_wide_unicode and self._is_wide(char):
-                new_chars.append(self._unicode_placeholder)
-            elif unicodedata.category(char) in self._replace_character_categories:
-                pass
-            else:
-                new_chars.append(char)
+        if not self._filter_ascii and text.isascii():
+            return text
 
-        return "".join(new_chars)
+        return text.translate(self._filter_table)
 
-    def _render_meta(self, message: Message) -> AttributedText:
+    def _build_meta_format(self) -> str:
         elements = [self.TIME_FORMAT]
 
         if self._show_year:
@@ -106,45 +235,155 @@ class EuphRenderer(CursorRenderer):
         if self._show_seconds:
             elements.append(self.SECOND_FORMAT)
 
-        text = message.timestamp.strftime("".join(elements))
-        return AT(text, attributes=self._meta_attrs) + AT(" ")
+        return "".join(elements)
+
+    def _render_meta(self, message: Message) -> AttributedText:
+        # Everything down to the minute or second, depending on the format
+        time_tuple = message.timestamp.timetuple()
+        key = tuple(time_tuple[:6 if self._show_seconds else 5])
+
+        def render() -> AttributedText:
+            text = message.timestamp.strftime(self._meta_format)
+            builder = ATBuilder()
+            builder.append_text(text, self._meta_attrs)
+            builder.append_text(" ")
+            return builder.build()
+
+        return _lookup(self._meta_cache, key, "", render,
+                self.META_CACHE_SIZE)
+
+    def _render_nick(self,
+            nick: str,
+            ) -> Tuple[AttributedText, AttributedText]:
+
+        own = yaboli.similar(self.nick, nick)
+        return _lookup(self._nick_cache, (nick, own), "",
+                lambda: self._build_nick(nick, own), self.NICK_CACHE_SIZE)
+
+    def _build_nick(self,
+            nick: str,
+            own: bool,
+            ) -> Tuple[AttributedText, AttributedText]:
+
+        nick_attrs = self._own_nick_attrs if own else self._nick_attrs
+
+        builder = ATBuilder()
+        builder.append_text(self._surround_left, self._surround_attrs)
+        builder.append_text(self._filter_unicode(nick), nick_attrs)
+        builder.append_text(self._surround_right, self._surround_attrs)
+        builder.append_text(" ")
+
+        nick_str = builder.build()
+        nick_spaces = AT(" " * ulen(nick_str.text))
+        return nick_str, nick_spaces
 
     def render_element(self, message: Message, width: int) -> RenderedMessage:
         meta = self._render_meta(message)
+        nick_str, nick_spaces = self._render_nick(message.nick)
 
-        if yaboli.similar(self.nick, message.nick):
-            nick_attrs = self._own_nick_attrs
+        content = self._filter_unicode(message.content)
+        content, attrs, highlights = self._highlight(message.id, content)
+        highlight_ends = [end for _, end, _ in highlights]
+
+        spans: Spans
+        if self._word_wrap:
+            spans = self._wrap(message.id, content, width - len(nick_spaces))
         else:
-            nick_attrs = self._nick_attrs
+            spans = []
+            start = 0
+            for line in content.split("\n"):
+                spans.append((start, start + len(line)))
+                start += len(line) + 1
 
-        left = AT(self._surround_left, attributes=self._surround_attrs)
-        nick = AT(self._filter_unicode(message.nick),
-                attributes=nick_attrs)
-        right = AT(self._surround_right, attributes=self._surround_attrs)
+        # Huge messages are mostly offscreen, so their lines are only rendered
+        # when they are displayed
+        def render_line(i: int) -> AT:
+            start, end = spans[i]
+            # The first highlight that isn't over before the line starts
+            first = bisect.bisect_right(highlight_ends, start)
 
-        nick_str = left + nick + right + AT(" ")
-        nick_spaces = AT(" " * len(nick_str))
+            builder = ATBuilder()
+            builder.append(nick_str if i == 0 else nick_spaces)
 
-        content = self._filter_unicode(message.content)
-        lines = []
-        for i, line in enumerate(content.split("\n")):
-            text = (nick_str if i == 0 else nick_spaces) + AT(line)
-            lines.append(text)
+            pos = start
+            for hl_start, hl_end, hl_attrs in highlights[first:]:
+                if hl_start >= end:
+                    break
 
+                hl_start = max(start, hl_start)
+                hl_end = min(end, hl_end)
+
+                builder.append_text(content[pos:hl_start], attrs)
+                builder.append_text(content[hl_start:hl_end], hl_attrs)
+                pos = hl_end
+
+            builder.append_text(content[pos:end], attrs)
+            return builder.build()
+
+        lines = LazyLines(len(spans), render_line)
         return RenderedMessage(message.id, lines, meta)
 
-    def render_cursor(self, width: int) -> AttributedText:
-        left = AT(self._cursor_surround_left,
-                attributes=self._cursor_surround_attrs)
-        nick = AT(self._filter_unicode(self.nick),
-                attributes=self._cursor_own_nick_attrs)
-        right = AT(self._cursor_surround_right,
-                attributes=self._cursor_surround_attrs)
+    def _wrap(self, message_id: Id, content: str, width: int) -> Spans:
+        """
+        Wrap a message's content, reusing the result from the last time the
+        message was rendered at this width if its content hasn't changed.
+        """
+
+        return _lookup(self._wrap_cache, (message_id, width), content,
+                lambda: uwrap(content, width), self.WRAP_CACHE_SIZE)
+
+    def _highlight(self,
+            message_id: Id,
+            content: str,
+            ) -> Tuple[str, Attributes, Highlights]:
+        """
+        Find the parts of a message's content that should be highlighted.
+
+        Returns the content as it should be displayed, the attributes of the
+        content that isn't highlighted and the highlights.
+        """
 
-        nick_str = left + nick + right
+        return _lookup(self._highlight_cache, message_id, content,
+                lambda: self._find_highlights(content),
+                self.HIGHLIGHT_CACHE_SIZE)
+
+    def _find_highlights(self,
+            content: str,
+            ) -> Tuple[str, Attributes, Highlights]:
+
+        attrs: Attributes = {}
+        if content.startswith(self.EMOTE_PREFIX):
+            content = content[len(self.EMOTE_PREFIX):]
+            attrs = self._emote_attrs
+
+        highlights: Highlights = []
+        for match in self.HIGHLIGHT_PATTERN.finditer(content):
+            kind = match.lastgroup
+            if kind is None:
+                continue
+
+            hl_attrs = dict(attrs)
+            hl_attrs.update(self._highlight_attrs[kind])
+            highlights.append((match.start(), match.end(), hl_attrs))
+
+        return content, attrs, highlights
+
+    def render_cursor(self, width: int) -> AttributedText:
+        nick = self._filter_unicode(self.nick)
+        nick_width = ulen(self._cursor_surround_left + nick +
+                self._cursor_surround_right)
+        rest_width = max(0, width - nick_width)
 
-        rest_width = max(0, width - len(nick_str))
-        rest_str = AT(self._cursor_fill * rest_width,
-                attributes=self._cursor_fill_attrs)
+        builder = ATBuilder()
+        builder.append_text(self._cursor_surround_left,
+                self._cursor_surround_attrs)
+        builder.append_text(nick, self._cursor_own_nick_attrs)
+        builder.append_text(self._cursor_surround_right,
+                self._cursor_surround_attrs)
+        builder.append_text(self._cursor_fill * rest_width,
+                self._cursor_fill_attrs)
+        return builder.build()
 
-        return nick_str + rest_str
+    def render_folded(self, count: int, width: int) -> AttributedText:
+        replies = "reply" if count == 1 else "replies"
+        return AT(f"({count} {replies} folded)", attributes=self._fold_attrs)
@@ -0,0 +1,75 @@
+from ..cursor_rendering import CursorRenderer, CursorTreeRenderer
+from ..cursor_tree_widget import CursorTreeWidget
+from ..element_supply import ElementSupply
+from ..rendering_pool import RenderingPool
+from .euph_config import EuphConfig
+from .euph_renderer import EuphRenderer
+
+__all__ = ["create_euph_renderer", "create_cursor_tree_renderer",
+        "create_cursor_tree_widget"]
+
+# These functions create the parts needed to display a tree of euph messages
+# according to a config. They are shared by all widgets displaying messages,
+# whether they are connected to a room or not.
+
+def create_euph_renderer(config: EuphConfig) -> EuphRenderer:
+    return EuphRenderer(
+            "",
+            show_year=config.show_year,
+            show_seconds=config.show_seconds,
+            meta_attrs={"style": config.meta_style},
+            surround_left=config.surround_left,
+            surround_right=config.surround_right,
+            surround_attrs={"style": config.surround_style},
+            word_wrap=config.word_wrap,
+            mention_attrs={"style": config.highlight_mention_style},
+            room_attrs={"style": config.highlight_room_style},
+            link_attrs={"style": config.highlight_link_style},
+            emoji_attrs={"style": config.highlight_emoji_style},
+            emote_attrs={"style": config.highlight_emote_style},
+            cursor_surround_left=config.cursor_surround_left,
+            cursor_surround_right=config.cursor_surround_right,
+            cursor_surround_attrs={"style": config.cursor_surround_style},
+            cursor_own_nick_attrs={"style":config.cursor_own_nick_style},
+            cursor_fill=config.cursor_fill_char,
+            cursor_fill_attrs={"style": config.cursor_fill_style},
+            fold_attrs={"style": config.fold_style},
+            nick_attrs={"style": config.nick_style},
+            own_nick_attrs={"style": config.own_nick_style},
+    )
+
+def create_cursor_tree_renderer(
+        config: EuphConfig,
+        supply: ElementSupply,
+        renderer: CursorRenderer,
+        ) -> CursorTreeRenderer:
+
+    return CursorTreeRenderer(supply, renderer,
+            indent_width=config.indent_width,
+            indent=config.indent_char,
+            indent_fill=config.indent_fill,
+            indent_attrs={"style": config.indent_style},
+            cursor_indent=config.indent_cursor_char,
+            cursor_corner=config.indent_cursor_corner,
+            cursor_fill=config.indent_cursor_fill,
+            cursor_indent_attrs={"style": config.indent_cursor_style},
+            scrolloff=config.scrolloff,
+    )
+
+def create_cursor_tree_widget(
+        config: EuphConfig,
+        tree: CursorTreeRenderer,
+        ) -> CursorTreeWidget:
+
+    rendering_pool = None
+    if config.render_processes > 0:
+        rendering_pool = RenderingPool(tree.renderer,
+                processes=config.render_processes)
+
+    return CursorTreeWidget(tree,
+            vertical_scroll_step=config.vertical_scroll,
+            horizontal_scroll_step=config.vertical_scroll,
+            half_page_scroll=config.half_page_scroll,
+            prerender_screens=config.prerender_screens,
+            rendering_pool=rendering_pool,
+    )
@@ -7,7 +7,10 @@ from typing import Any, Callable, Optional
 import urwid
 import yaml
 
+from ..log_file_supply import compact_log, convert_log
 from .euph_config import EuphConfig, EuphLoader
+from .log_download import download_log
+from .log_view_widget import LogViewWidget
 
 __all__ = ["DEFAULT_CONFIG_PATHS", "launch"]
 
@@ -26,6 +29,10 @@ def parse_arguments() -> argparse.Namespace:
             )
     parser.add_argument("-e", "--export-defaults", type=str)
     parser.add_argument("-c", "--config-file", type=str)
+    parser.add_argument("-b", "--browse-log", type=str)
+    parser.add_argument("--compact-log", type=str, metavar="LOG_FILE")
+    parser.add_argument("-d", "--download-log", type=str, nargs=2,
+            metavar=("ROOM", "LOG_FILE"))
     return parser.parse_args()
 
 def load_config_yaml(args: argparse.Namespace) -> Optional[str]:
@@ -84,6 +91,42 @@ def launch(
         export_defaults(args.export_defaults)
         return
 
+    if args.compact_log is not None:
+        log_path = pathlib.Path(args.compact_log).expanduser()
+        if not LogViewWidget.log_exists(log_path):
+            print(f"There is no log file at {log_path}")
+            return
+
+        if pathlib.Path(str(log_path) + ".idx").is_file():
+            print(f"Compacting log file {log_path}")
+            compact_log(str(log_path))
+        else:
+            # An sqlite log is converted to a binary log next to it, which can
+            # then be browsed and compacted
+            binary_path = log_path.with_suffix("")
+            if binary_path == log_path:
+                binary_path = log_path.with_name(log_path.name + ".bin")
+            print(f"Converting log file {log_path} to {binary_path}")
+            convert_log(str(log_path), str(binary_path))
+        return
+
+    if args.download_log is not None:
+        roomname, path_str = args.download_log
+        config = load_config(args)
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(download_log(roomname, path_str, config))
+        return
+
+    if args.browse_log is not None:
+        path = args.browse_log
+        if not LogViewWidget.log_exists(pathlib.Path(path).expanduser()):
+            print(f"There is no log file at {path}")
+            return
+
+        def browse_log(config: EuphConfig) -> urwid.Widget:
+            return LogViewWidget(path, config)
+        application = browse_log
+
     config = load_config(args)
     loop = asyncio.get_event_loop()
 
@@ -0,0 +1,164 @@
+import asyncio
+import pathlib
+from typing import List, Optional
+
+import yaboli
+
+from ..element import Message
+from ..sqlite_supply import SqliteSupply
+from ..worker_thread import WorkerThread
+from .euph_config import EuphConfig
+
+__all__ = ["download_log"]
+
+# Keys in the log file's meta table
+ROOM_KEY = "room"
+RESUME_KEY = "download.resume_before"
+COMPLETE_KEY = "download.complete"
+
+class LogWriter:
+    """
+    Writes pages of messages to a SqliteSupply on a separate thread, so the
+    next page can already be requested while the previous one is written.
+
+    All access to the supply happens on the writer's thread, since sqlite
+    connections may only be used by the thread that created them.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._worker = WorkerThread()
+        self._supply: Optional[SqliteSupply] = None
+
+    def _open(self) -> SqliteSupply:
+        self._supply = SqliteSupply(self._path)
+        return self._supply
+
+    def _close(self) -> None:
+        if self._supply is not None:
+            self._supply.close()
+
+    def _write_page(self, messages: List[Message]) -> int:
+        """
+        Write a page of messages (sorted oldest first) and remember where to
+        continue. Returns the amount of messages that weren't in the log
+        before.
+        """
+
+        supply = self._supply
+        if supply is None:
+            raise RuntimeError("log file is not open")
+
+        new = sum(1 for msg in messages if not supply.contains(msg.id))
+        supply.add_many(messages)
+        supply.set_meta(RESUME_KEY, str(messages[0].id))
+        return new
+
+    async def open(self, roomname: str) -> SqliteSupply:
+        supply = await self._worker.run(self._open)
+        await self._worker.run(supply.set_meta, ROOM_KEY, roomname)
+        return supply
+
+    async def close(self) -> None:
+        await self._worker.run(self._close)
+        self._worker.close()
+
+    async def get_meta(self, key: str) -> Optional[str]:
+        if self._supply is None:
+            raise RuntimeError("log file is not open")
+
+        return await self._worker.run(self._supply.get_meta, key)
+
+    async def set_meta(self, key: str, value: Optional[str]) -> None:
+        if self._supply is None:
+            raise RuntimeError("log file is not open")
+
+        await self._worker.run(self._supply.set_meta, key, value)
+
+    def write_page(self, messages: List[Message]) -> "asyncio.Future[int]":
+        return self._worker.run(self._write_page, messages)
+
+def convert_message(msg: yaboli.Message) -> Message:
+    return Message(
+            msg.message_id,
+            msg.parent_id,
+            msg.time,
+            msg.sender.nick,
+            msg.content,
+    )
+
+async def download_log(
+        roomname: str,
+        path_str: str,
+        config: EuphConfig,
+        amount: int = 1000,
+        ) -> None:
+    """
+    Download a room's entire history into a log file, newest messages first.
+
+    Messages are written to the file page by page and never collected in
+    memory. If a download is interrupted, the next download of the same room
+    into the same file continues where the previous one stopped. Once a log is
+    complete, further downloads only fetch the messages that are missing at
+    its newest end.
+    """
+
+    path = pathlib.Path(path_str).expanduser()
+    print(f"Downloading &{roomname} to {path}")
+
+    url_format = yaboli.Room.URL_FORMAT
+    if config.human:
+        url_format += "?h=1"
+
+    cookie_file = config.cookie_file
+    if cookie_file is not None:
+        cookie_file = str(pathlib.Path(cookie_file).expanduser())
+
+    room = yaboli.Room(roomname, url_format=url_format,
+            cookie_file=cookie_file)
+
+    writer = LogWriter(str(path))
+    await writer.open(roomname)
+
+    before = await writer.get_meta(RESUME_KEY)
+    complete = await writer.get_meta(COMPLETE_KEY) is not None
+
+    if before is not None:
+        print(f"Resuming download before message {before}")
+
+    if not await room.connect():
+        print(f"Could not connect to &{roomname}")
+        await writer.close()
+        return
+
+    try:
+        total = 0
+        writing: Optional["asyncio.Future[int]"] = None
+
+        while True:
+            # The previous page is written while this one is requested
+            messages = await room.log(amount, before)
+
+            if writing is not None:
+                new = await writing
+                total += new
+                print(f"Downloaded {total} messages")
+
+                if complete and new == 0:
+                    # We've reached the part of the log we already have
+                    break
+
+            if not messages:
+                await writer.set_meta(COMPLETE_KEY, "1")
+                complete = True
+                break
+
+            writing = writer.write_page(
+                    [convert_message(msg) for msg in messages])
+            before = messages[0].message_id
+
+        await writer.set_meta(RESUME_KEY, None)
+        print("Download finished")
+    finally:
+        await room.disconnect()
+        await writer.close()
@@ -0,0 +1,157 @@
+import asyncio
+import pathlib
+from typing import Any, Optional, Tuple, Union
+
+import urwid
+
+from ..async_element_supply import PrefetchingSupply, ThreadedSupply
+from ..attributed_text_widget import ATWidget
+from ..log_file_supply import LogFileSupply
+from ..markup import AT
+from ..sqlite_supply import SqliteSupply
+from .euph_config import EuphConfig
+from .euph_tree import (create_cursor_tree_renderer, create_cursor_tree_widget,
+        create_euph_renderer)
+
+__all__ = ["LogViewWidget"]
+
+class LogViewWidget(urwid.WidgetWrap):
+    """
+    The LogViewWidget displays a room log stored on disk, without connecting
+    to the room.
+
+    Messages are read from the log file in another thread as they are
+    needed, a few threads around the displayed ones at a time, and forgotten
+    again once the screen has moved far enough away from them. This way, the
+    log is never loaded into memory completely and reading it never blocks
+    the user interface.
+    """
+
+    # How many threads above and below the displayed one are loaded
+    PREFETCH_THREADS = 20
+    # How many threads above and below the displayed one are kept in memory
+    KEEP_THREADS = 100
+
+    def __init__(self, path: str, config: EuphConfig) -> None:
+        self.c = config
+
+        self._path = pathlib.Path(path).expanduser()
+        self._log = self._open_log(self._path)
+        self._async_supply = ThreadedSupply(self._log)
+        self._supply = PrefetchingSupply(self._async_supply)
+        self._renderer = create_euph_renderer(self.c)
+        self._tree = create_cursor_tree_renderer(self.c, self._supply,
+                self._renderer)
+
+        self._prefetching: Optional["asyncio.Future[None]"] = None
+
+        roomname: Optional[str] = None
+        if isinstance(self._log, SqliteSupply):
+            roomname = self._log.get_meta("room")
+        roomname = roomname or self._path.stem
+
+        self._room_name = urwid.Text(
+                [(self.c.room_style, "&" + roomname), " (log)"],
+                align=urwid.CENTER,
+        )
+        self._room_name_divider = ATWidget(AT())
+        self._tree_widget = create_cursor_tree_widget(self.c, self._tree)
+
+        self._pile = urwid.Pile([
+            ("pack", self._room_name),
+            ("pack", self._room_name_divider),
+            self._tree_widget,
+        ])
+        self._pile.focus_position = 2
+
+        super().__init__(self._pile)
+
+    @staticmethod
+    def log_exists(path: pathlib.Path) -> bool:
+        """
+        Whether there is a binary or an sqlite log file at a path.
+        """
+
+        return pathlib.Path(str(path) + ".idx").is_file() or path.is_file()
+
+    @staticmethod
+    def _open_log(path: pathlib.Path) -> Union[SqliteSupply, LogFileSupply]:
+        """
+        Open either a binary log file (consisting of multiple files sharing the
+        same prefix) or an sqlite log file. Binary log files are opened
+        read-only.
+        """
+
+        if pathlib.Path(str(path) + ".idx").is_file():
+            return LogFileSupply(str(path), read_only=True)
+        elif path.is_file():
+            return SqliteSupply(str(path))
+        else:
+            raise FileNotFoundError(f"no log file at {path}")
+
+    def render(self, size: Tuple[int, int], focus: bool) -> Any:
+        width, _ = size
+
+        divider = AT(self.c.room_name_separator * width,
+                style=self.c.borders_style)
+        self._room_name_divider.set_attributed_text(divider)
+
+        canvas = super().render(size, focus)
+        self._start_prefetching()
+        return canvas
+
+    def _start_prefetching(self) -> None:
+        if self._prefetching is not None:
+            return
+
+        # Only possible when running inside an asyncio event loop
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            return
+        if not loop.is_running():
+            return
+
+        self._prefetching = asyncio.ensure_future(self._prefetch())
+
+    async def _prefetch(self) -> None:
+        try:
+            # The anchor is the message the screen is positioned around. If
+            # there is none, the bottom of the log is displayed.
+            cursor_id, anchor_id, _ = self._tree.position
+            elem_id = cursor_id if anchor_id is None else anchor_id
+            loaded = await self._supply.prefetch(elem_id,
+                    threads=self.PREFETCH_THREADS)
+        finally:
+            self._prefetching = None
+
+        # The cursor might be far away from the anchor, so the threads around
+        # both are kept
+        if anchor_id is None:
+            anchor_id = self._supply.lowest_root_id()
+        self._supply.forget_far_threads([cursor_id, anchor_id],
+                threads=self.KEEP_THREADS)
+
+        # Rendering the new threads starts the next prefetch around the (now
+        # possibly moved) screen position
+        if loaded:
+            self._tree_widget._invalidate()
+
+    def selectable(self) -> bool:
+        return True
+
+    def keypress(self, size: Tuple[int, int], key: str) -> Optional[str]:
+        if key == "q":
+            self._tree_widget.close()
+            if self._prefetching is not None:
+                self._prefetching.cancel()
+            self._async_supply.close()
+            self._log.close()
+            raise urwid.ExitMainLoop()
+        elif key == "r":
+            self._tree.invalidate_all()
+            self._tree_widget._invalidate()
+        else:
+            return super().keypress(size, key)
+
+        return None
@@ -7,18 +7,52 @@ import urwid
 import yaboli
 
 from ..attributed_text_widget import ATWidget
-from ..cursor_rendering import CursorRenderer, CursorTreeRenderer
-from ..cursor_tree_widget import CursorTreeWidget
-from ..element import Message, RenderedMessage
-from ..element_supply import ElementSupply, InMemorySupply
+from ..cursor_rendering import CursorRenderer, CursorTreeRenderer, Position
+from ..element import Id, Message, RenderedMessage
+from ..element_supply import ElementSupply, InMemoryMessageSupply
 from ..markup import AT, AttributedText, Attributes
+from ..sqlite_supply import SqliteSupply
+from ..write_behind_queue import WriteBehindQueue
 from .edit_widgets import EditWidget
 from .euph_config import EuphConfig
 from .euph_renderer import EuphRenderer
+from .euph_tree import (create_cursor_tree_renderer, create_cursor_tree_widget,
+        create_euph_renderer)
+from .log_download import ROOM_KEY
 from .nick_list_widget import NickListWidget
 
 __all__ = ["RoomWidget"]
 
+# Keys in the log file's meta table, in addition to the ones in log_download
+CURSOR_KEY = "view.cursor"
+ANCHOR_KEY = "view.anchor"
+ANCHOR_OFFSET_KEY = "view.anchor_offset"
+
+# These two are run on the log's thread
+
+def _load_view(
+        supply: SqliteSupply,
+        amount: int,
+        ) -> Tuple[List[Message], Optional[str], Position]:
+
+    offset = supply.get_meta(ANCHOR_OFFSET_KEY)
+    position = (
+            supply.get_meta(CURSOR_KEY),
+            supply.get_meta(ANCHOR_KEY),
+            0.5 if offset is None else float(offset),
+    )
+    # Replies can only be displayed along with their parents
+    messages = supply.newest_with_ancestors(amount)
+    oldest_id = supply.oldest_newest_id(amount)
+    return messages, None if oldest_id is None else str(oldest_id), position
+
+def _save_view(supply: SqliteSupply, position: Position) -> None:
+    # Euphoria's ids are all strings
+    cursor_id, anchor_id, anchor_offset = position
+    supply.set_meta(CURSOR_KEY, None if cursor_id is None else str(cursor_id))
+    supply.set_meta(ANCHOR_KEY, None if anchor_id is None else str(anchor_id))
+    supply.set_meta(ANCHOR_OFFSET_KEY, str(anchor_offset))
+
 # I don't know of a way to type the arguments correctly with mypy. You can't
 # just substitute a Callable's parameter list with a type variable (sadly), and
 # other workarounds didn't seem to solve this exact problem.
@@ -210,7 +244,26 @@ class RoomWidget(urwid.WidgetWrap):
         self._room.register_event("edit", self.on_edit)
         self._room.register_event("disconnect", self.on_disconnect)
 
-        self._supply = InMemorySupply[Message]()
+        self._supply = InMemoryMessageSupply()
+
+        # If there is a log dir, all received messages are also written to the
+        # room's log file there. The tree is still rendered from memory.
+        self._log: Optional[WriteBehindQueue] = None
+        log_dir = self.c.log_dir
+        if log_dir is not None:
+            log_path = pathlib.Path(log_dir).expanduser() / f"{roomname}.sqlite"
+            self._log = WriteBehindQueue(lambda: self._open_log(log_path))
+
+        # Messages loaded from the log file while connecting, see
+        # load_cached_view() and on_snapshot()
+        self._loading_cached_view: Optional["asyncio.Future[None]"] = None
+        self._cached_ids: List[str] = []
+        # All messages from here on are in the supply. Older cached messages
+        # are only there as ancestors of newer ones, so logs are requested
+        # from here until they reach past them. None if there are no such
+        # ancestors.
+        self._contiguous_id: Optional[str] = None
+
         self._renderer = self._create_euph_renderer()
         self._tree = self._create_cursor_tree_renderer(self._supply,
                 self._renderer)
@@ -252,41 +305,21 @@ class RoomWidget(urwid.WidgetWrap):
     #
     # These functions use (or rather: will use) self._conf.
 
+    def _open_log(self, path: pathlib.Path) -> SqliteSupply:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        supply = SqliteSupply(str(path))
+        supply.set_meta(ROOM_KEY, self._room.name)
+        return supply
+
     def _create_euph_renderer(self) -> EuphRenderer:
-        return EuphRenderer(
-                "",
-                show_year=self.c.show_year,
-                show_seconds=self.c.show_seconds,
-                meta_attrs={"style": self.c.meta_style},
-                surround_left=self.c.surround_left,
-                surround_right=self.c.surround_right,
-                surround_attrs={"style": self.c.surround_style},
-                cursor_surround_left=self.c.cursor_surround_left,
-                cursor_surround_right=self.c.cursor_surround_right,
-                cursor_surround_attrs={"style": self.c.cursor_surround_style},
-                cursor_own_nick_attrs={"style":self.c.cursor_own_nick_style},
-                cursor_fill=self.c.cursor_fill_char,
-                cursor_fill_attrs={"style": self.c.cursor_fill_style},
-                nick_attrs={"style": self.c.nick_style},
-                own_nick_attrs={"style": self.c.own_nick_style},
-        )
+        return create_euph_renderer(self.c)
 
     def _create_cursor_tree_renderer(self,
             supply: ElementSupply,
             renderer: CursorRenderer,
             ) -> CursorTreeRenderer:
 
-        return CursorTreeRenderer(supply, renderer,
-                indent_width=self.c.indent_width,
-                indent=self.c.indent_char,
-                indent_fill=self.c.indent_fill,
-                indent_attrs={"style": self.c.indent_style},
-                cursor_indent=self.c.indent_cursor_char,
-                cursor_corner=self.c.indent_cursor_corner,
-                cursor_fill=self.c.indent_cursor_fill,
-                cursor_indent_attrs={"style": self.c.indent_cursor_style},
-                scrolloff=self.c.scrolloff,
-        )
+        return create_cursor_tree_renderer(self.c, supply, renderer)
 
     def _create_connecting_widget(self) -> Any:
         text = (
@@ -313,11 +346,7 @@ class RoomWidget(urwid.WidgetWrap):
         )
 
     def _create_tree_widget(self) -> Any:
-        return CursorTreeWidget(self._tree,
-                vertical_scroll_step=self.c.vertical_scroll,
-                horizontal_scroll_step=self.c.vertical_scroll,
-                half_page_scroll=self.c.half_page_scroll,
-        )
+        return create_cursor_tree_widget(self.c, self._tree)
 
     def _create_edit_widget(self) -> Any:
         return urwid.Edit(multiline=True)
@@ -352,18 +381,53 @@ class RoomWidget(urwid.WidgetWrap):
 
     @synchronous
     async def connect(self) -> None:
-        success = await self._room.connect()
+        success = False
+        try:
+            # Reading the log file shouldn't delay connecting
+            if self._log is not None and self.c.warm_start_messages > 0:
+                self._loading_cached_view = asyncio.ensure_future(
+                        self.load_cached_view())
+
+            success = await self._room.connect()
+        finally:
+            # Too late to be useful once connected
+            self.stop_loading_cached_view()
+
+            if not success:
+                self.switch_connection_failed()
+                try:
+                    await self._close()
+                finally:
+                    urwid.emit_signal(self, "close")
+
         if success:
             self.switch_view()
-        else:
-            self.switch_connection_failed()
-            urwid.emit_signal(self, "close")
 
     @synchronous
     async def disconnect(self) -> None:
-        await self._room.disconnect()
-        # TODO attach this to the room's disconnect event instead
-        urwid.emit_signal(self, "close")
+        try:
+            await self._room.disconnect()
+            if self._log is not None:
+                await self._log.run(_save_view, self._tree.position)
+        finally:
+            try:
+                await self._close()
+            finally:
+                # TODO attach this to the room's disconnect event instead
+                urwid.emit_signal(self, "close")
+
+    async def _close(self) -> None:
+        """
+        Close the log file and stop the tree widget's rendering processes.
+        Every way the room can be left must end up here.
+        """
+
+        try:
+            if self._log is not None:
+                # Raises if queued messages couldn't be written
+                await self._log.close()
+        finally:
+            self._tree_widget.close()
 
     ## UI mode and mode switching
 
@@ -371,6 +435,13 @@ class RoomWidget(urwid.WidgetWrap):
         self._w = self._connecting
         self._mode = UiMode.CONNECTING
 
+    def show_cached_view(self) -> None:
+        # Still connecting, so only the tree can be navigated. Everything
+        # else needs a session.
+        self._w = self._layout
+        self._layout.set_edit_visible(False)
+        self._layout.focus_on_tree()
+
     def switch_connection_failed(self) -> None:
         self._w = self._connection_failed
         self._mode = UiMode.CONNECTION_FAILED
@@ -430,21 +501,34 @@ class RoomWidget(urwid.WidgetWrap):
         self._overlay._invalidate()
 
     def change_own_nick(self) -> None:
-        self._renderer.nick = self._room.session.nick
-        self._tree.invalidate_all()
+        old_nick = self._renderer.nick
+        new_nick = self._room.session.nick
+        self._renderer.nick = new_nick
+
+        # Only messages whose nick is highlighted differently now need to be
+        # rendered again
+        for nick in self._supply.nicks():
+            if yaboli.similar(nick, old_nick) or yaboli.similar(nick, new_nick):
+                self._tree.invalidate_ids(self._supply.nick_ids(nick))
+
         self.update_tree()
 
         self._nick_list.session = self._room.session
         self.update_nick_list()
 
     def receive_message(self, msg: yaboli.Message) -> None:
-        self._supply.add(Message(
+        message = Message(
             msg.message_id,
             msg.parent_id,
             msg.time,
             msg.sender.nick,
             msg.content,
-        ))
+        )
+
+        self._supply.add(message)
+        if self._log is not None:
+            self._log.put(message)
+
         self._tree.invalidate(msg.message_id)
         self.update_tree()
 
@@ -453,7 +537,8 @@ class RoomWidget(urwid.WidgetWrap):
     def render(self, size: Tuple[int, int], focus: bool) -> None:
         canvas = super().render(size, focus)
 
-        if not self._hit_top_of_supply:
+        # Logs can only be requested once the room is connected
+        if not self._hit_top_of_supply and self._mode != UiMode.CONNECTING:
             if self._tree.hit_top and not self._requesting_logs:
                 self._requesting_logs = True
                 self.request_logs()
@@ -516,6 +601,9 @@ class RoomWidget(urwid.WidgetWrap):
         pass
 
     async def on_snapshot(self, messages: List[yaboli.LiveMessage]) -> None:
+        self.stop_loading_cached_view()
+        self.drop_cached_messages(messages)
+
         for message in messages:
             self.receive_message(message)
 
@@ -545,11 +633,73 @@ class RoomWidget(urwid.WidgetWrap):
     async def on_disconnect(self, reason: str) -> None:
         pass
 
+    # Cached messages
+
+    async def load_cached_view(self) -> None:
+        """
+        Load the newest messages and the last cursor position from the log
+        file, so the room can be displayed before it is connected.
+        """
+
+        if self._log is None:
+            return
+
+        messages, oldest_id, position = await self._log.run(_load_view,
+                self.c.warm_start_messages)
+        if not messages or self._mode != UiMode.CONNECTING:
+            return
+
+        for message in messages:
+            self._supply.add(message)
+        self._cached_ids = [str(message.id) for message in messages]
+        if oldest_id is not None and self._cached_ids[0] < oldest_id:
+            self._contiguous_id = oldest_id
+
+        self._tree.restore_position(position)
+        self.show_cached_view()
+        self.update_tree()
+
+    def stop_loading_cached_view(self) -> None:
+        if self._loading_cached_view is not None:
+            self._loading_cached_view.cancel()
+            self._loading_cached_view = None
+
+    def drop_cached_messages(self, snapshot: List[yaboli.LiveMessage]) -> None:
+        """
+        Remove the messages loaded from the log file if there might be
+        messages missing between them and the snapshot. Logs are only ever
+        requested above the contiguous messages, so the gap would never be
+        filled.
+        """
+
+        cached_ids = self._cached_ids
+        self._cached_ids = []
+
+        if not cached_ids or not snapshot:
+            return
+
+        # The snapshot contains the newest messages, so it overlaps with the
+        # cached messages if it reaches back to the newest one of them
+        if min(msg.message_id for msg in snapshot) <= max(cached_ids):
+            return
+
+        self._contiguous_id = None
+        for mid in cached_ids:
+            self._supply.remove(mid)
+        self._tree.invalidate_ids(cached_ids)
+
+        # Moves the cursor and anchor away from removed messages
+        self._tree.restore_position(self._tree.position)
+        self.update_tree()
+
     # Euph actions
 
     @synchronous
     async def request_logs(self) -> None:
-        oldest_id = self._supply.oldest_id()
+        oldest_id: Optional[Id] = self._contiguous_id
+        if oldest_id is None:
+            oldest_id = self._supply.oldest_id()
+
         if oldest_id is not None:
             messages = await self._room.log(self._log_amount, oldest_id)
 
@@ -559,6 +709,14 @@ class RoomWidget(urwid.WidgetWrap):
             for message in messages:
                 self.receive_message(message)
 
+            # Done once the logs have reached the oldest cached ancestor
+            if self._contiguous_id is not None:
+                self._contiguous_id = None
+                if messages:
+                    logs_id = min(str(msg.message_id) for msg in messages)
+                    if logs_id > str(self._supply.oldest_id()):
+                        self._contiguous_id = logs_id
+
         self._requesting_logs = False
 
     @synchronous
@@ -0,0 +1,522 @@
+import datetime
+import heapq
+import mmap
+import os
+import struct
+from typing import (BinaryIO, Dict, Iterable, Iterator, List, Optional, Set,
+        Tuple)
+
+from .element import Id, Message
+from .element_supply import ElementSupply, ElementSupplyException
+from .sqlite_supply import SqliteSupply
+
+__all__ = ["LogFileException", "LogFileSupply", "compact_log", "convert_log"]
+
+class LogFileException(Exception):
+    pass
+
+# A log file consists of three files sharing a common prefix:
+#
+# - The heap (".<generation>.dat") contains the nick and content of every
+#   message, encoded as utf-8 and written one after another.
+#
+# - The index (".idx") starts with a header and contains one fixed-size record
+#   per message: id, parent id, timestamp, and the position of nick and content
+#   in the heap. The first records (their amount is stored in the header) are
+#   sorted by id, so they can be searched without reading the whole index.
+#   All records after those are appended in the order the messages were
+#   added. The last record for an id is the current one.
+#
+# - The parent index (".<generation>.par") contains (parent id, id) pairs for
+#   all sorted index records, sorted by parent id and then id. Roots have an
+#   empty parent id, which sorts before all other ids.
+#
+# Compacting a log file sorts all records, removes outdated records and rewrites
+# the heap in the new order. The result is written as a new generation of heap
+# and parent index, next to the old one. The index header names the generation
+# its records point into, so replacing the index (which is atomic) switches the
+# whole log over to the new generation at once.
+
+MAGIC = b"BOWLLOG2"
+HEADER = struct.Struct("<8sQQ") # magic, amount of sorted records, generation
+
+ID_SIZE = 16
+RECORD = struct.Struct(f"<{ID_SIZE}s{ID_SIZE}sdQIH")
+PARENT_RECORD = struct.Struct(f"<{ID_SIZE}s{ID_SIZE}s")
+
+NO_ID = b"\0" * ID_SIZE
+MAX_ID = b"\xff" * ID_SIZE
+
+# id, parent id, timestamp, heap offset, content length, nick length
+Record = Tuple[bytes, bytes, float, int, int, int]
+
+# id, parent id, timestamp, nick, content
+Entry = Tuple[bytes, bytes, float, bytes, bytes]
+
+def _encode_id(elem_id: Optional[Id]) -> bytes:
+    if elem_id is None:
+        return NO_ID
+
+    if not isinstance(elem_id, str):
+        raise LogFileException(f"id {elem_id!r} is not a string")
+
+    encoded = elem_id.encode()
+    if not encoded or len(encoded) > ID_SIZE or b"\0" in encoded:
+        raise LogFileException(f"id {elem_id!r} can't be stored in a log file")
+
+    return encoded.ljust(ID_SIZE, b"\0")
+
+def _decode_id(encoded: bytes) -> Optional[Id]:
+    if encoded == NO_ID:
+        return None
+
+    return encoded.rstrip(b"\0").decode()
+
+def _data_paths(path: str, generation: int) -> Tuple[str, str]:
+    return f"{path}.{generation}.dat", f"{path}.{generation}.par"
+
+def _map(path: str) -> Optional[mmap.mmap]:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class LogFileSupply(ElementSupply[Message]):
+    """
+    This supply reads Message-s from an append-only binary log file. The files
+    are memory mapped, so opening even a huge log is instant and only the
+    messages that are actually looked at are read from disk.
+
+    Messages can be added to the log. They are appended to the end of the log
+    file and kept track of in memory until the log is compacted again using
+    compact_log().
+
+    The app itself only ever writes sqlite logs. Binary log files are opt-in:
+    they are created from an sqlite log using convert_log() (bowl
+    --compact-log) and can then be browsed.
+
+    Parents of messages are not expected to change.
+    """
+
+    def __init__(self, path: str, read_only: bool = False) -> None:
+        """
+        If read_only is set, the log file must already exist and messages
+        can't be added. Otherwise, it is created if it doesn't exist yet.
+        """
+
+        self._path = path
+        self._index_path = path + ".idx"
+
+        if not os.path.exists(self._index_path):
+            if read_only:
+                raise FileNotFoundError(f"no log file at {path}")
+            _create_log(path)
+
+        self._index = _map(self._index_path)
+        if self._index is None or len(self._index) < HEADER.size:
+            raise LogFileException(f"{self._index_path} is not a log index")
+
+        magic, self._sorted, self._generation = \
+                HEADER.unpack_from(self._index, 0)
+        if magic != MAGIC:
+            raise LogFileException(f"{self._index_path} is not a log index")
+
+        self._heap_path, self._parent_path = _data_paths(path,
+                self._generation)
+        for file_path in [self._heap_path, self._parent_path]:
+            if not os.path.isfile(file_path):
+                raise LogFileException(f"{file_path} is missing")
+
+        self._heap = _map(self._heap_path)
+        self._parents = _map(self._parent_path)
+
+        # The unsorted tail of the index is small and kept in memory
+        self._tail: Dict[bytes, Record] = {}
+        self._tail_children: Dict[bytes, Set[bytes]] = {}
+
+        tail_start = HEADER.size + self._sorted * RECORD.size
+        for offset in range(tail_start, len(self._index), RECORD.size):
+            self._remember(RECORD.unpack_from(self._index, offset))
+
+        self._index_file: Optional[BinaryIO] = None
+        self._heap_file: Optional[BinaryIO] = None
+        if not read_only:
+            self._index_file = open(self._index_path, "ab")
+            self._heap_file = open(self._heap_path, "ab")
+
+    def close(self) -> None:
+        for f in [self._index_file, self._heap_file]:
+            if f is not None:
+                f.close()
+
+        for view in [self._index, self._heap, self._parents]:
+            if view is not None:
+                view.close()
+
+    def _remember(self, record: Record) -> None:
+        self._tail[record[0]] = record
+        self._tail_children.setdefault(record[1], set()).add(record[0])
+
+    # Writing to the log
+
+    def add(self, elem: Message) -> None:
+        self.add_many([elem])
+
+    def add_many(self, elems: Iterable[Message]) -> None:
+        if self._index_file is None or self._heap_file is None:
+            raise LogFileException(f"{self._path} was opened read-only")
+
+        records = []
+
+        for elem in elems:
+            nick = elem.nick.encode()
+            content = elem.content.encode()
+
+            offset = self._heap_file.tell()
+            self._heap_file.write(nick)
+            self._heap_file.write(content)
+
+            records.append((_encode_id(elem.id), _encode_id(elem.parent_id),
+                elem.timestamp.timestamp(), offset, len(content), len(nick)))
+
+        # The heap must be written before the records pointing into it
+        self._heap_file.flush()
+
+        for record in records:
+            self._index_file.write(RECORD.pack(*record))
+            self._remember(record)
+
+        self._index_file.flush()
+
+    # Reading the whole log in order, see compact_log()
+
+    def _entry(self, record: Record) -> Entry:
+        encoded, parent, time, offset, length, nick_length = record
+        data = self._read_heap(offset, nick_length + length)
+        return encoded, parent, time, data[:nick_length], data[nick_length:]
+
+    def _compacted_entries(self) -> Iterator[Entry]:
+        # Sorted records that were replaced by a record in the tail are left
+        # out. Only the tail is sorted in memory.
+        sorted_records = (self._sorted_record(index)
+                for index in range(self._sorted))
+        kept = (record for record in sorted_records
+                if record[0] not in self._tail)
+        tail = sorted(self._tail.values())
+
+        for record in heapq.merge(kept, tail):
+            yield self._entry(record)
+
+    def _compacted_pairs(self) -> Iterator[Tuple[bytes, bytes]]:
+        pairs = (self._parent_pair(index)
+                for index in range(self._parent_count()))
+        kept = ((pair[:ID_SIZE], pair[ID_SIZE:]) for pair in pairs
+                if pair[ID_SIZE:] not in self._tail)
+        tail = sorted((record[1], record[0]) for record in self._tail.values())
+
+        return heapq.merge(kept, tail)
+
+    # Searching the memory mapped files
+
+    def _sorted_record(self, index: int) -> Record:
+        assert self._index is not None
+        offset = HEADER.size + index * RECORD.size
+        return RECORD.unpack_from(self._index, offset)
+
+    def _sorted_id(self, index: int) -> bytes:
+        assert self._index is not None
+        offset = HEADER.size + index * RECORD.size
+        return self._index[offset:offset + ID_SIZE]
+
+    def _parent_pair(self, index: int) -> bytes:
+        assert self._parents is not None
+        offset = index * PARENT_RECORD.size
+        return self._parents[offset:offset + PARENT_RECORD.size]
+
+    def _parent_count(self) -> int:
+        if self._parents is None:
+            return 0
+
+        return len(self._parents) // PARENT_RECORD.size
+
+    def _find(self, encoded: bytes) -> Optional[Record]:
+        record = self._tail.get(encoded)
+        if record is not None:
+            return record
+
+        low, high = 0, self._sorted
+        while low < high:
+            middle = (low + high) // 2
+            if self._sorted_id(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self._sorted and self._sorted_id(low) == encoded:
+            return self._sorted_record(low)
+
+        return None
+
+    def _bisect_parents(self, pair: bytes) -> int:
+        low, high = 0, self._parent_count()
+        while low < high:
+            middle = (low + high) // 2
+            if self._parent_pair(middle) < pair:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def _children(self, parent: bytes) -> List[bytes]:
+        start = self._bisect_parents(parent + NO_ID)
+        stop = self._bisect_parents(parent + MAX_ID)
+
+        children = {self._parent_pair(i)[ID_SIZE:] for i in range(start, stop)}
+        children.update(self._tail_children.get(parent, set()))
+        return sorted(children)
+
+    def _neighbour(self,
+            parent: bytes,
+            encoded: bytes,
+            below: bool,
+            ) -> Optional[bytes]:
+
+        candidates = []
+
+        # Closest sibling in the parent index
+        if below:
+            index = self._bisect_parents(parent + encoded + b"\0")
+            if index < self._parent_count():
+                pair = self._parent_pair(index)
+                if pair[:ID_SIZE] == parent:
+                    candidates.append(pair[ID_SIZE:])
+        else:
+            index = self._bisect_parents(parent + encoded) - 1
+            if index >= 0:
+                pair = self._parent_pair(index)
+                if pair[:ID_SIZE] == parent:
+                    candidates.append(pair[ID_SIZE:])
+
+        # Closest sibling in the tail
+        for sibling in self._tail_children.get(parent, set()):
+            if (sibling > encoded) if below else (sibling < encoded):
+                candidates.append(sibling)
+
+        if not candidates:
+            return None
+
+        return min(candidates) if below else max(candidates)
+
+    def _get_record(self, elem_id: Id) -> Record:
+        try:
+            record = self._find(_encode_id(elem_id))
+        except LogFileException:
+            record = None
+
+        if record is None:
+            raise ElementSupplyException(f"no element with id {elem_id!r}")
+
+        return record
+
+    def _read_heap(self, offset: int, length: int) -> bytes:
+        if self._heap is None or offset + length > len(self._heap):
+            # The heap has grown since it was mapped
+            if self._heap is not None:
+                self._heap.close()
+            self._heap = _map(self._heap_path)
+
+        assert self._heap is not None
+        return self._heap[offset:offset + length]
+
+    # Implementing the supply
+
+    def get(self, elem_id: Id) -> Message:
+        encoded, parent, time, offset, length, nick_length = \
+                self._get_record(elem_id)
+
+        data = self._read_heap(offset, nick_length + length)
+        nick = data[:nick_length].decode()
+        content = data[nick_length:].decode()
+        timestamp = datetime.datetime.fromtimestamp(time)
+
+        return Message(_decode_id(encoded), _decode_id(parent), timestamp,
+                nick, content)
+
+    def parent_id(self, elem_id: Id) -> Optional[Id]:
+        return _decode_id(self._get_record(elem_id)[1])
+
+    def child_ids(self, elem_id: Id) -> List[Id]:
+        record = self._get_record(elem_id)
+        return [_decode_id(child) for child in self._children(record[0])]
+
+    def sibling_ids(self, elem_id: Id) -> List[Id]:
+        record = self._get_record(elem_id)
+        return [_decode_id(sibling) for sibling in self._children(record[1])]
+
+    def previous_id(self, elem_id: Id) -> Optional[Id]:
+        encoded, parent, *_ = self._get_record(elem_id)
+        previous = self._neighbour(parent, encoded, below=False)
+        return None if previous is None else _decode_id(previous)
+
+    def next_id(self, elem_id: Id) -> Optional[Id]:
+        encoded, parent, *_ = self._get_record(elem_id)
+        following = self._neighbour(parent, encoded, below=True)
+        return None if following is None else _decode_id(following)
+
+    def lowest_root_id(self) -> Optional[Id]:
+        lowest = self._neighbour(NO_ID, MAX_ID, below=False)
+        return None if lowest is None else _decode_id(lowest)
+
+    def oldest_id(self) -> Optional[Id]:
+        candidates = list(self._tail)
+        if self._sorted > 0:
+            candidates.append(self._sorted_id(0))
+
+        if not candidates:
+            return None
+
+        return _decode_id(min(candidates))
+
+def _create_log(path: str) -> None:
+    # The data files are created first, so there is never an index without
+    # them
+    for file_path in _data_paths(path, 0):
+        open(file_path, "wb").close()
+
+    with open(path + ".idx", "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0))
+
+def _sync(f: BinaryIO) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+
+def _write_generation(
+        path: str,
+        generation: int,
+        entries: Iterable[Entry],
+        pairs: Iterable[Tuple[bytes, bytes]],
+        ) -> str:
+    """
+    Write a new generation of a log file. The entries must be sorted by id and
+    the pairs by parent id and id.
+
+    The new index is written to a temporary file whose path is returned. The
+    log only switches over to the new generation in _switch_generation().
+    """
+
+    heap_path, parent_path = _data_paths(path, generation)
+    index_path = path + ".idx.new"
+
+    with open(index_path, "wb") as index_file, \
+            open(heap_path, "wb") as heap_file:
+
+        # The amount of records is only known at the end
+        index_file.write(HEADER.pack(MAGIC, 0, generation))
+
+        count = 0
+        offset = 0
+        for encoded, parent, time, nick, content in entries:
+            heap_file.write(nick)
+            heap_file.write(content)
+            index_file.write(RECORD.pack(encoded, parent, time, offset,
+                len(content), len(nick)))
+
+            count += 1
+            offset += len(nick) + len(content)
+
+        index_file.seek(0)
+        index_file.write(HEADER.pack(MAGIC, count, generation))
+
+        _sync(heap_file)
+        _sync(index_file)
+
+    with open(parent_path, "wb") as parent_file:
+        for pair in pairs:
+            parent_file.write(PARENT_RECORD.pack(*pair))
+        _sync(parent_file)
+
+    return index_path
+
+def _switch_generation(
+        path: str,
+        index_path: str,
+        old_generation: Optional[int],
+        ) -> None:
+
+    # Everything before this leaves the old generation untouched, and
+    # everything after this only cleans up
+    os.replace(index_path, path + ".idx")
+
+    if old_generation is not None:
+        for file_path in _data_paths(path, old_generation):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+def _generation(path: str) -> Optional[int]:
+    if not os.path.isfile(path + ".idx"):
+        return None
+
+    supply = LogFileSupply(path, read_only=True)
+    generation = supply._generation
+    supply.close()
+    return generation
+
+def compact_log(path: str) -> None:
+    """
+    Compact a log file by sorting all of its records, dropping records that
+    were replaced by later ones and rewriting the heap in id order.
+
+    The compacted log is written as a new generation next to the old one, and
+    the log only switches over once it is complete. An interrupted compaction
+    leaves the log intact.
+
+    Only the records appended since the last compaction are held in memory.
+    All others are streamed from the old generation.
+    """
+
+    if not os.path.isfile(path + ".idx"):
+        raise LogFileException(f"no log file at {path}")
+
+    supply = LogFileSupply(path, read_only=True)
+    generation = supply._generation
+
+    try:
+        index_path = _write_generation(path, generation + 1,
+                supply._compacted_entries(), supply._compacted_pairs())
+    finally:
+        supply.close()
+
+    _switch_generation(path, index_path, generation)
+
+def convert_log(sqlite_path: str, path: str) -> None:
+    """
+    Write all messages of an sqlite log (see SqliteSupply) to a compacted log
+    file, replacing the log file's previous contents.
+
+    The messages are streamed from the database, so even huge logs can be
+    converted. Like compact_log(), an interrupted conversion leaves an
+    existing log file intact.
+    """
+
+    if not os.path.isfile(sqlite_path):
+        raise LogFileException(f"no log file at {sqlite_path}")
+
+    old_generation = _generation(path)
+    generation = 0 if old_generation is None else old_generation + 1
+
+    supply = SqliteSupply(sqlite_path)
+
+    try:
+        entries = ((_encode_id(msg.id), _encode_id(msg.parent_id),
+            msg.timestamp.timestamp(), msg.nick.encode(), msg.content.encode())
+            for msg in supply.iter_messages())
+        pairs = ((_encode_id(parent_id), _encode_id(elem_id))
+                for parent_id, elem_id in supply.iter_parent_pairs())
+
+        index_path = _write_generation(path, generation, entries, pairs)
+    finally:
+        supply.close()
+
+    _switch_generation(path, index_path, old_generation)
@@ -1,32 +1,40 @@
-from typing import Any, Iterable, List, Mapping, Optional, Tuple, Union
+from typing import (Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple,
+        Union)
 
-__all__ = ["Attributes", "Chunk", "AttributedText", "AT"]
+__all__ = ["Attributes", "Span", "Chunk", "AttributedText", "AT",
+        "AttributedTextBuilder", "ATBuilder"]
 
 Attributes = Mapping[str, Any]
 
+# Start index, stop index, attribute name and attribute value
+Span = Tuple[int, int, str, Any]
+
 class Chunk:
 
     @staticmethod
-    def join_chunks(chunks: List["Chunk"]) -> List["Chunk"]:
-        if not chunks:
-            return []
-
+    def join_chunks(chunks: Iterable["Chunk"]) -> List["Chunk"]:
         new_chunks: List[Chunk] = []
 
-        current_chunk = chunks[0]
-        for chunk in chunks[1:]:
-            if not chunk.text:
-                continue
-
-            joined_chunk = current_chunk._join(chunk)
+        # The texts of all chunks that will be joined with current_chunk are
+        # collected first and then joined all at once.
+        current_chunk: Optional[Chunk] = None
+        texts: List[str] = []
 
-            if joined_chunk is None:
-                new_chunks.append(current_chunk)
+        for chunk in chunks:
+            if current_chunk is None:
                 current_chunk = chunk
+                texts = [chunk.text]
+            elif not chunk.text:
+                continue
+            elif current_chunk._attributes == chunk._attributes:
+                texts.append(chunk.text)
             else:
-                current_chunk = joined_chunk
+                new_chunks.append(current_chunk._with_texts(texts))
+                current_chunk = chunk
+                texts = [chunk.text]
 
-        new_chunks.append(current_chunk)
+        if current_chunk is not None:
+            new_chunks.append(current_chunk._with_texts(texts))
 
         return new_chunks
 
@@ -69,11 +77,11 @@ class Chunk:
 
     # Private methods
 
-    def _join(self, chunk: "Chunk") -> Optional["Chunk"]:
-        if self._attributes == chunk._attributes:
-            return Chunk(self.text + chunk.text, self._attributes)
+    def _with_texts(self, texts: List[str]) -> "Chunk":
+        if len(texts) == 1:
+            return self # chunks are immutable
 
-        return None
+        return Chunk("".join(texts), self._attributes)
 
     # Public methods
 
@@ -103,8 +111,13 @@ class AttributedText:
 
     @classmethod
     def from_chunks(cls, chunks: Iterable[Chunk]) -> "AttributedText":
+        return cls._from_joined_chunks(Chunk.join_chunks(chunks))
+
+    @classmethod
+    def _from_joined_chunks(cls, chunks: List[Chunk]) -> "AttributedText":
+        # The chunks must already be joined, see Chunk.join_chunks()
         new = cls()
-        new._chunks = Chunk.join_chunks(list(chunks))
+        new._chunks = chunks
         return new
 
     # Common special methods
@@ -258,40 +271,29 @@ class AttributedText:
         attribute: Any = None
 
         for chunk in self._chunks:
-            chunk_attr = chunk.attributes.get(attribute_name)
+            chunk_attr = chunk._attributes.get(attribute_name)
 
-            if chunks:
-                if attribute == chunk_attr:
-                    chunks.append(chunk)
-                else:
-                    blocks.append((self.from_chunks(chunks), attribute))
+            if chunks and attribute != chunk_attr:
+                blocks.append((self._from_joined_chunks(chunks), attribute))
+                chunks = []
 
-                    chunks = [chunk]
-                    attribute = chunk_attr
-            else:
-                chunks.append(chunk)
-                attribute = chunk_attr
+            chunks.append(chunk)
+            attribute = chunk_attr
 
         if chunks:
-            blocks.append((self.from_chunks(chunks), attribute))
+            blocks.append((self._from_joined_chunks(chunks), attribute))
 
         return blocks
 
     def join(self, segments: Iterable["AttributedText"]) -> "AttributedText":
-        # Lazy and inefficient solution to the fact that segments can be any
-        # Iterable. TODO: Optimize, if this becomes a bottleneck.
-        segments = list(segments)
-
-        interspersed = segments[:1]
-        for segment in segments[1:]:
-            interspersed.append(self)
-            interspersed.append(segment)
+        builder = AttributedTextBuilder()
 
-        chunks = []
-        for segment in interspersed:
-            chunks.extend(segment.chunks)
+        for i, segment in enumerate(segments):
+            if i > 0:
+                builder.append(self)
+            builder.append(segment)
 
-        return self.from_chunks(chunks)
+        return builder.build()
 
     def set(self,
             name: str,
@@ -317,6 +319,88 @@ class AttributedText:
     def set_at(self, name: str, value: Any, pos: int) -> "AttributedText":
         return self.set(name, value, pos, pos + 1)
 
+    def set_spans(self, spans: Iterable[Span]) -> "AttributedText":
+        """
+        Set multiple attributes on multiple parts of the text at once, in a
+        single pass over the text.
+
+        Each span sets an attribute from its start index (inclusive) to its
+        stop index (exclusive). Where spans overlap, later spans override
+        earlier ones, just like calling set() for each span in order would.
+        Like in set(), negative indices count from the end of the text, and a
+        span whose start is greater than its stop sets the attribute
+        everywhere BUT the specified interval.
+        """
+
+        length = len(self)
+
+        def normalise(index: int) -> int:
+            if index < 0:
+                index += length
+            return min(max(0, index), length)
+
+        # Which spans start and stop at each index
+        starts: Dict[int, List[int]] = {}
+        stops: Dict[int, List[int]] = {}
+        values: List[Tuple[str, Any]] = []
+
+        for start, stop, name, value in spans:
+            if start > stop:
+                intervals = [(0, stop), (start, length)]
+            else:
+                intervals = [(start, stop)]
+
+            for interval_start, interval_stop in intervals:
+                interval_start = normalise(interval_start)
+                interval_stop = normalise(interval_stop)
+                if interval_start >= interval_stop:
+                    continue
+
+                starts.setdefault(interval_start, []).append(len(values))
+                stops.setdefault(interval_stop, []).append(len(values))
+                values.append((name, value))
+
+        if not values:
+            return self
+
+        boundaries = sorted(set(starts) | set(stops))
+        boundary = 0 # index of the next boundary
+        active: Set[int] = set()
+
+        chunks: List[Chunk] = []
+        pos = 0
+        for chunk in self._chunks:
+            chunk_start = pos
+            chunk_stop = pos + len(chunk)
+
+            while pos < chunk_stop:
+                # Spans starting or stopping here
+                while (boundary < len(boundaries) and
+                        boundaries[boundary] <= pos):
+                    index = boundaries[boundary]
+                    active.difference_update(stops.get(index, []))
+                    active.update(starts.get(index, []))
+                    boundary += 1
+
+                end = chunk_stop
+                if boundary < len(boundaries):
+                    end = min(end, boundaries[boundary])
+
+                if not active and pos == chunk_start and end == chunk_stop:
+                    chunks.append(chunk) # chunks are immutable
+                else:
+                    attributes = dict(chunk._attributes)
+                    for index in sorted(active):
+                        name, value = values[index]
+                        attributes[name] = value
+
+                    text = chunk.text[pos - chunk_start:end - chunk_start]
+                    chunks.append(Chunk(text, attributes))
+
+                pos = end
+
+        return AttributedText.from_chunks(chunks)
+
     def remove(self,
             name: str,
             start: Optional[int] = None,
@@ -338,3 +422,32 @@ class AttributedText:
             return self[:start] + middle + self[stop:]
 
 AT = AttributedText
+
+class AttributedTextBuilder:
+    """
+    Collects AttributedText-s and strings and builds a single AttributedText
+    out of them. Unlike adding up AttributedText-s with +, the chunks are only
+    joined once, when the result is built.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[Chunk] = []
+
+    def __len__(self) -> int:
+        return sum(map(len, self._chunks))
+
+    def append(self, text: AttributedText) -> None:
+        self._chunks.extend(text._chunks)
+
+    def extend(self, texts: Iterable[AttributedText]) -> None:
+        for text in texts:
+            self._chunks.extend(text._chunks)
+
+    def append_text(self, text: str, attributes: Attributes = {}) -> None:
+        if text:
+            self._chunks.append(Chunk(text, attributes))
+
+    def build(self) -> AttributedText:
+        return AttributedText.from_chunks(self._chunks)
+
+ATBuilder = AttributedTextBuilder
@@ -1,4 +1,4 @@
-from typing import Dict, Generic, Optional, TypeVar
+from typing import Callable, Dict, Generic, Iterable, Optional, TypeVar
 
 from .element import Id, RenderedElement
 
@@ -17,6 +17,19 @@ class RenderedElementCache(Generic[E]):
         except KeyError:
             pass
 
+    def invalidate_ids(self, elem_ids: Iterable[Id]) -> None:
+        for elem_id in elem_ids:
+            self._elements.pop(elem_id, None)
+
+    def invalidate_if(self, predicate: Callable[[Id], bool]) -> None:
+        """
+        Invalidate all cached elements whose id satisfies the predicate.
+        """
+
+        self._elements = {elem_id: elem
+                for elem_id, elem in self._elements.items()
+                if not predicate(elem_id)}
+
     def invalidate_all(self) -> None:
         self._elements = {}
 
@@ -0,0 +1,128 @@
+import asyncio
+import concurrent.futures
+import math
+import multiprocessing
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from .cursor_rendering import CursorRenderer
+from .element import Element, Id, RenderedMessage
+from .markup import AT, Attributes, Chunk
+
+__all__ = ["RenderingPool"]
+
+# AttributedText as a list of (text, attributes) pairs, which is a lot cheaper
+# to send between processes than the AttributedText itself
+SerializedText = List[Tuple[str, Attributes]]
+
+# id, meta and lines of a rendered message
+SerializedMessage = Tuple[Id, SerializedText, List[SerializedText]]
+
+def _serialize(text: AT) -> SerializedText:
+    return [(chunk.text, chunk.attributes) for chunk in text.chunks]
+
+def _deserialize(text: SerializedText) -> AT:
+    return AT.from_chunks(Chunk(string, attributes)
+            for string, attributes in text)
+
+def _render_batch(
+        renderer: CursorRenderer,
+        jobs: List[Tuple[Element, int]],
+        max_lines: int,
+        ) -> List[Optional[SerializedMessage]]:
+
+    results: List[Optional[SerializedMessage]] = []
+
+    for element, width in jobs:
+        rendered = renderer.render_element(element, width)
+
+        # Huge messages are only ever partially visible, so sending all their
+        # lines back would be a waste
+        if len(rendered.lines) > max_lines:
+            results.append(None)
+            continue
+
+        lines = [_serialize(line) for line in rendered.lines]
+        results.append((rendered.id, _serialize(rendered.meta), lines))
+
+    return results
+
+class RenderingPool:
+    """
+    Renders big amounts of messages in multiple processes at once, for example
+    to fill a CursorTreeRenderer's cache after the screen width changed (see
+    CursorTreeRenderer.prerender_jobs()).
+
+    The renderer is sent to the processes along with each batch of messages,
+    so it needs to be picklable.
+    """
+
+    def __init__(self,
+            renderer: CursorRenderer,
+            processes: Optional[int] = None,
+            max_batch_size: int = 500,
+            ) -> None:
+        """
+        processes - the amount of processes to render in, defaults to the
+          amount of CPUs
+
+        max_batch_size - the maximum amount of messages sent to a process at
+          once
+        """
+
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes < 1:
+            raise ValueError("processes must be at least 1")
+        if max_batch_size < 1:
+            raise ValueError("max batch size must be at least 1")
+
+        self._renderer = renderer
+        self._processes = processes
+        self._max_batch_size = max_batch_size
+        # Forking would copy the state of the process's other threads (e.g.
+        # the ones reading log files) in the middle of whatever they are doing
+        context = multiprocessing.get_context("spawn")
+        self._executor = concurrent.futures.ProcessPoolExecutor(processes,
+                mp_context=context)
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    async def render(self,
+            jobs: Sequence[Tuple[Element, int]],
+            max_lines: int,
+            ) -> List[RenderedMessage]:
+        """
+        Render messages, each at its own width.
+
+        Messages with more than max_lines lines are left out. They are better
+        rendered lazily, as only a part of them is visible at a time.
+        """
+
+        if not jobs:
+            return []
+
+        # Spread the messages over all processes
+        batch_size = math.ceil(len(jobs) / self._processes)
+        batch_size = min(batch_size, self._max_batch_size)
+
+        loop = asyncio.get_event_loop()
+        batches = [
+                loop.run_in_executor(self._executor, _render_batch,
+                    self._renderer, list(jobs[i:i + batch_size]), max_lines)
+                for i in range(0, len(jobs), batch_size)
+        ]
+
+        rendered = []
+        for batch in await asyncio.gather(*batches):
+            for result in batch:
+                if result is None:
+                    continue
+
+                mid, meta, lines = result
+                rendered.append(RenderedMessage(mid,
+                    [_deserialize(line) for line in lines],
+                    _deserialize(meta)))
+
+        return rendered
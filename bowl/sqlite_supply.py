@@ -0,0 +1,305 @@
+import datetime
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .element import Id, Message
+from .element_supply import ElementSupply, ElementSupplyException
+
+__all__ = ["SqliteSupply"]
+
+class SqliteSupply(ElementSupply[Message]):
+    """
+    This supply stores Message-s in an sqlite database. Nothing is kept in
+    memory: every query is answered by the database, so even huge room logs
+    can be opened instantly.
+
+    Like the InMemorySupply, it orders the messages by their ids.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS messages (
+        id TEXT PRIMARY KEY,
+        parent TEXT,
+        time REAL NOT NULL,
+        nick TEXT NOT NULL,
+        content TEXT NOT NULL
+    );
+
+    CREATE INDEX IF NOT EXISTS messages_parent ON messages (parent, id);
+
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """
+
+    # Lists a thread in pre-order by sorting its elements by their path from
+    # the root. The path separator must sort before all characters used in
+    # ids.
+    SEPARATOR = "\x01"
+    THREAD = """
+    WITH RECURSIVE thread(id, path) AS (
+        SELECT id, id FROM messages WHERE id = ?
+        UNION ALL
+        SELECT messages.id, thread.path || char(1) || messages.id
+        FROM messages JOIN thread ON messages.parent = thread.id
+    )
+    SELECT id FROM thread WHERE path {} ? ORDER BY path {}
+    """
+
+    # Lists the newest messages along with all of their ancestors
+    NEWEST_WITH_ANCESTORS = """
+    WITH RECURSIVE ancestors(id) AS (
+        SELECT id FROM (SELECT id FROM messages ORDER BY id DESC LIMIT ?)
+        UNION
+        SELECT messages.parent
+        FROM messages JOIN ancestors ON messages.id = ancestors.id
+        WHERE messages.parent IS NOT NULL
+    )
+    SELECT id, parent, time, nick, content FROM messages
+    WHERE id IN (SELECT id FROM ancestors) ORDER BY id
+    """
+
+    def __init__(self, path: str) -> None:
+        # A ThreadedSupply queries the supply from a different thread, but
+        # never from multiple threads at once.
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    # Writing to the database
+
+    def add(self, elem: Message) -> None:
+        self.add_many([elem])
+
+    def add_many(self, elems: Iterable[Message]) -> None:
+        """
+        Add multiple messages in a single transaction.
+        """
+
+        rows = ((elem.id, elem.parent_id, elem.timestamp.timestamp(),
+            elem.nick, elem.content) for elem in elems)
+
+        with self._connection:
+            self._connection.executemany(
+                    "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)",
+                    rows)
+
+    def remove(self, elem_id: Id) -> None:
+        with self._connection:
+            self._connection.execute("DELETE FROM messages WHERE id = ?",
+                    (elem_id,))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_meta(self, key: str, value: Optional[str]) -> None:
+        with self._connection:
+            self._connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    # Querying the database
+
+    def _ids(self, query: str, *args: object) -> List[Id]:
+        return [row[0] for row in self._connection.execute(query, args)]
+
+    def _id(self, query: str, *args: object) -> Optional[Id]:
+        row = self._connection.execute(query, args).fetchone()
+        return None if row is None else row[0]
+
+    def contains(self, elem_id: Id) -> bool:
+        return self._id("SELECT id FROM messages WHERE id = ?",
+                elem_id) is not None
+
+    @staticmethod
+    def _message(row: Tuple[Id, Optional[Id], float, str, str]) -> Message:
+        mid, parent_id, time, nick, content = row
+        timestamp = datetime.datetime.fromtimestamp(time)
+        return Message(mid, parent_id, timestamp, nick, content)
+
+    def get(self, elem_id: Id) -> Message:
+        row = self._connection.execute(
+                "SELECT id, parent, time, nick, content FROM messages"
+                " WHERE id = ?", (elem_id,)).fetchone()
+
+        if row is None:
+            raise ElementSupplyException(f"no element with id {elem_id!r}")
+
+        return self._message(row)
+
+    def iter_messages(self) -> Iterator[Message]:
+        """
+        Iterate over all messages, ordered by their ids. The messages are read
+        from the database one by one.
+        """
+
+        rows = self._connection.execute(
+                "SELECT id, parent, time, nick, content FROM messages"
+                " ORDER BY id")
+        return (self._message(row) for row in rows)
+
+    def iter_parent_pairs(self) -> Iterator[Tuple[Optional[Id], Id]]:
+        """
+        Iterate over the (parent id, id) pairs of all messages, ordered by
+        parent id and then id. Roots come first.
+        """
+
+        return iter(self._connection.execute(
+                "SELECT parent, id FROM messages ORDER BY parent, id"))
+
+    def newest(self, amount: int) -> List[Message]:
+        """
+        Retrieve the newest messages (those with the highest ids), oldest
+        first.
+        """
+
+        rows = self._connection.execute(
+                "SELECT id, parent, time, nick, content FROM messages"
+                " ORDER BY id DESC LIMIT ?", (amount,)).fetchall()
+
+        return [self._message(row) for row in reversed(rows)]
+
+    def oldest_newest_id(self, amount: int) -> Optional[Id]:
+        """
+        The id of the oldest message retrieved by newest(). Unlike the ancestors
+        retrieved by newest_with_ancestors(), all messages between it and the
+        newest message are retrieved.
+        """
+
+        return self._id("SELECT MIN(id) FROM"
+                " (SELECT id FROM messages ORDER BY id DESC LIMIT ?)", amount)
+
+    def newest_with_ancestors(self, amount: int) -> List[Message]:
+        """
+        Retrieve the newest messages like newest(), along with all of their
+        ancestors, so that every message is connected to a root. Messages with
+        ancestors missing from the log are left out. Oldest first.
+        """
+
+        rows = self._connection.execute(self.NEWEST_WITH_ANCESTORS,
+                (amount,)).fetchall()
+        messages = {row[0]: self._message(row) for row in rows}
+
+        connected: Dict[Id, bool] = {}
+        for message in messages.values():
+            path = []
+            elem: Optional[Message] = message
+            while elem is not None and elem.id not in connected:
+                path.append(elem.id)
+                if elem.parent_id is None:
+                    break
+                elem = messages.get(elem.parent_id)
+
+            if elem is None:
+                is_connected = False
+            elif elem.parent_id is None:
+                is_connected = True
+            else:
+                is_connected = connected[elem.id]
+
+            for elem_id in path:
+                connected[elem_id] = is_connected
+
+        return [message for message in messages.values()
+                if connected[message.id]]
+
+    def parent_id(self, elem_id: Id) -> Optional[Id]:
+        row = self._connection.execute(
+                "SELECT parent FROM messages WHERE id = ?",
+                (elem_id,)).fetchone()
+
+        if row is None:
+            raise ElementSupplyException(f"no element with id {elem_id!r}")
+
+        return row[0]
+
+    def child_ids(self, elem_id: Id) -> List[Id]:
+        return self._ids(
+                "SELECT id FROM messages WHERE parent = ? ORDER BY id",
+                elem_id)
+
+    def sibling_ids(self, elem_id: Id) -> List[Id]:
+        # Only used by the default previous_id() and next_id(), which are
+        # overwritten below. Listing all roots of a big room is slow.
+        parent_id = self.parent_id(elem_id)
+        return self._ids(
+                "SELECT id FROM messages WHERE parent IS ? ORDER BY id",
+                parent_id)
+
+    def previous_id(self, elem_id: Id) -> Optional[Id]:
+        parent_id = self.parent_id(elem_id)
+        return self._id(
+                "SELECT id FROM messages WHERE parent IS ? AND id < ?"
+                " ORDER BY id DESC LIMIT 1", parent_id, elem_id)
+
+    def next_id(self, elem_id: Id) -> Optional[Id]:
+        parent_id = self.parent_id(elem_id)
+        return self._id(
+                "SELECT id FROM messages WHERE parent IS ? AND id > ?"
+                " ORDER BY id ASC LIMIT 1", parent_id, elem_id)
+
+    def lowest_root_id(self) -> Optional[Id]:
+        return self._id(
+                "SELECT id FROM messages WHERE parent IS NULL"
+                " ORDER BY id DESC LIMIT 1")
+
+    def oldest_id(self) -> Optional[Id]:
+        return self._id("SELECT MIN(id) FROM messages")
+
+    def descendant_count(self, elem_id: Id) -> int:
+        row = self._connection.execute("""
+                WITH RECURSIVE subtree(id) AS (
+                    SELECT id FROM messages WHERE parent = ?
+                    UNION ALL
+                    SELECT messages.id FROM messages
+                    JOIN subtree ON messages.parent = subtree.id
+                )
+                SELECT COUNT(*) FROM subtree
+                """, (elem_id,)).fetchone()
+        return row[0]
+
+    def newest_id(self) -> Optional[Id]:
+        return self._id("SELECT MAX(id) FROM messages")
+
+    # Each thread is listed by a single query, and the roots by a single
+    # cursor, instead of querying for every element separately.
+
+    def _iter_threads(self, elem_id: Id, below: bool) -> Iterator[Id]:
+        path = self.ancestor_path(elem_id)
+        root_id = path[0]
+
+        # Paths are never empty, so comparing them to the empty path lets
+        # entire threads through.
+        if below:
+            start_query = self.THREAD.format(">=", "ASC")
+            thread_query = start_query
+            roots_query = ("SELECT id FROM messages WHERE parent IS NULL"
+                    " AND id > ? ORDER BY id ASC")
+        else:
+            start_query = self.THREAD.format("<=", "DESC")
+            thread_query = self.THREAD.format("<>", "DESC")
+            roots_query = ("SELECT id FROM messages WHERE parent IS NULL"
+                    " AND id < ? ORDER BY id DESC")
+
+        # The rest of the element's own thread
+        rows = self._connection.execute(start_query,
+                (root_id, self.SEPARATOR.join(map(str, path))))
+        for (thread_elem_id,) in rows:
+            yield thread_elem_id
+
+        # All following threads, completely
+        roots = self._connection.execute(roots_query, (root_id,))
+        for (root_id,) in roots:
+            rows = self._connection.execute(thread_query, (root_id, ""))
+            for (thread_elem_id,) in rows:
+                yield thread_elem_id
+
+    def iter_below(self, elem_id: Id) -> Iterator[Id]:
+        return self._iter_threads(elem_id, below=True)
+
+    def iter_above(self, elem_id: Id) -> Iterator[Id]:
+        return self._iter_threads(elem_id, below=False)
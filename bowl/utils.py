@@ -1,6 +1,9 @@
+import bisect
+import functools
 import unicodedata
+from typing import Dict, List, Tuple
 
-__all__ = ["ulen"]
+__all__ = ["ulen", "uwidth", "uindex", "uslice", "uwrap"]
 
 # See http://www.unicode.org/reports/tr11/#ED7
 #
@@ -10,23 +13,184 @@ __all__ = ["ulen"]
 _WIDE = {"W", "F", "A"} # when in East Asian context
 _NARROW = {"N", "Na", "H", "A"} # when not in East Asian context
 
-def ulen(string: str, east_asian_context: bool = False) -> int:
-    length = 0
+# Combining marks and invisible formatting characters don't take up any space
+# of their own.
+_ZERO_WIDTH = {"Mn", "Me", "Cf"}
 
-    if east_asian_context:
-        for char in string:
-            if char in _WIDE:
-                length += 2
-            else:
-                length += 1
+# The widths of all characters are stored as sorted tables of codepoint ranges,
+# one table per page of codepoints. Looking at every codepoint takes about a
+# second, so pages are only created once a character from them is needed.
+_PAGE_BITS = 8
+
+# page, east asian context -> (range starts, range widths)
+_pages: Dict[Tuple[int, bool], Tuple[List[int], List[int]]] = {}
+
+def _char_width(char: str, east_asian_context: bool) -> int:
+    if unicodedata.category(char) in _ZERO_WIDTH:
+        return 0
 
+    east_asian_width = unicodedata.east_asian_width(char)
+    if east_asian_context:
+        return 2 if east_asian_width in _WIDE else 1
     else:
-        for char in string:
-            if char in _NARROW:
-                length += 1
+        return 1 if east_asian_width in _NARROW else 2
+
+def _page(page: int, east_asian_context: bool) -> Tuple[List[int], List[int]]:
+    table = _pages.get((page, east_asian_context))
+    if table is not None:
+        return table
+
+    starts: List[int] = []
+    widths: List[int] = []
+
+    first = page << _PAGE_BITS
+    for codepoint in range(first, first + (1 << _PAGE_BITS)):
+        width = _char_width(chr(codepoint), east_asian_context)
+        if not widths or widths[-1] != width:
+            starts.append(codepoint)
+            widths.append(width)
+
+    table = (starts, widths)
+    _pages[(page, east_asian_context)] = table
+    return table
+
+def uwidth(char: str, east_asian_context: bool = False) -> int:
+    """
+    The amount of columns a single character takes up: 0, 1 or 2.
+    """
+
+    codepoint = ord(char)
+    if codepoint < 128:
+        return 1
+
+    starts, widths = _page(codepoint >> _PAGE_BITS, east_asian_context)
+    return widths[bisect.bisect_right(starts, codepoint) - 1]
+
+@functools.lru_cache(maxsize=4096)
+def _ulen(string: str, east_asian_context: bool) -> int:
+    return sum(uwidth(char, east_asian_context) for char in string)
+
+def ulen(string: str, east_asian_context: bool = False) -> int:
+    """
+    The amount of columns a string takes up when displayed.
+    """
+
+    if string.isascii():
+        return len(string)
+
+    return _ulen(string, east_asian_context)
+
+def uindex(
+        string: str,
+        width: int,
+        east_asian_context: bool = False,
+        round_up: bool = False,
+        ) -> int:
+    """
+    The amount of characters at the start of a string that fit into a certain
+    amount of columns.
+
+    If round_up is set, a wide character that only partially fits is counted
+    as well.
+    """
+
+    if string.isascii():
+        return max(0, min(width, len(string)))
+
+    columns = 0
+    for index, char in enumerate(string):
+        columns += uwidth(char, east_asian_context)
+
+        if columns > width:
+            # Only a character that starts before the limit can stick out
+            if round_up and columns - uwidth(char, east_asian_context) < width:
+                return index + 1
+            return index
+
+    return len(string)
+
+def uslice(
+        string: str,
+        start: int,
+        stop: int,
+        east_asian_context: bool = False,
+        ) -> str:
+    """
+    The characters of a string that are displayed completely between two
+    columns (including start, excluding stop).
+    """
+
+    first = uindex(string, start, east_asian_context, round_up=True)
+    last = uindex(string, stop, east_asian_context)
+    return string[first:max(first, last)]
+
+# Start and end index of each line
+Spans = List[Tuple[int, int]]
+
+def _fitting(
+        text: str,
+        start: int,
+        stop: int,
+        width: int,
+        ascii: bool,
+        ) -> int:
+    """
+    Like uindex() for text[start:stop], without slicing the text.
+    """
+
+    if ascii:
+        return max(0, min(width, stop - start))
+
+    columns = 0
+    for index in range(start, stop):
+        columns += uwidth(text[index])
+        if columns > width:
+            return index - start
+
+    return stop - start
+
+def uwrap(text: str, width: int) -> Spans:
+    """
+    Break a text into lines that are at most width columns wide. Lines are
+    broken at spaces where possible and at newlines. The space a line is broken
+    at is removed.
+
+    Returns the start and end index of each line within the text.
+    """
+
+    width = max(1, width)
+    spans = []
+
+    # Only indices into the text are moved around, so each character is only
+    # looked at a constant amount of times
+    all_ascii = text.isascii()
+    paragraph_start = 0
+    while True:
+        paragraph_end = text.find("\n", paragraph_start)
+        if paragraph_end < 0:
+            paragraph_end = len(text)
+
+        ascii = all_ascii or text[paragraph_start:paragraph_end].isascii()
+        start = paragraph_start
+
+        while True:
+            # Characters wider than the line need to go somewhere
+            fitting = max(1, _fitting(text, start, paragraph_end, width, ascii))
+
+            if start + fitting >= paragraph_end:
+                spans.append((start, paragraph_end))
+                break
+
+            # A space at the very start of the line doesn't help
+            space = text.rfind(" ", start + 1, start + fitting + 1)
+            if space >= 0:
+                spans.append((start, space))
+                start = space + 1
             else:
-                length += 2
+                spans.append((start, start + fitting))
+                start += fitting
 
-    return length
+        if paragraph_end == len(text):
+            return spans
 
-# TODO unicode string splitting based on the same principle as above
+        paragraph_start = paragraph_end + 1
@@ -0,0 +1,37 @@
+import asyncio
+import concurrent.futures
+from typing import Any, Callable, TypeVar
+
+__all__ = ["WorkerThread"]
+
+T = TypeVar("T")
+
+class WorkerThread:
+    """
+    Calls functions one after another on a separate thread, so the event loop
+    doesn't have to wait for them.
+
+    Since all calls happen on the same thread, objects that may only be used
+    by the thread that created them (like sqlite connections) can be created
+    and used there.
+    """
+
+    def __init__(self) -> None:
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def run(self, f: Callable[..., T], *args: Any) -> "asyncio.Future[T]":
+        """
+        Call a function on the thread. The call is queued right away, even if
+        the returned future is only awaited later. Must be called while the
+        event loop is running.
+        """
+
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self._executor, f, *args)
+
+    def close(self) -> None:
+        """
+        Stop the thread, after all queued calls are finished.
+        """
+
+        self._executor.shutdown()
@@ -0,0 +1,209 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+
+from .element import Id, Message
+from .log_file_supply import LogFileSupply
+from .sqlite_supply import SqliteSupply
+from .worker_thread import WorkerThread
+
+__all__ = ["WriteBehindQueue"]
+
+T = TypeVar("T")
+
+PersistentSupply = Union[SqliteSupply, LogFileSupply]
+
+class WriteBehindQueue:
+    """
+    Writes messages to a log file on a separate thread, so the event loop
+    never waits for the disk.
+
+    Messages put into the queue while a batch is being written are collected
+    and written as the next batch, in a single transaction. This way, even big
+    bursts of messages only result in a few writes.
+
+    Like the LogWriter, the supply is only ever used on the queue's thread. It
+    is opened when the first batch is written or when run() is first called.
+
+    If a batch can't be written, its messages stay in the queue and are
+    written again later, waiting twice as long after every failed attempt.
+    After MAX_ATTEMPTS failed attempts in a row, the queue gives up: The
+    queued messages are dropped and no further messages are accepted. Either
+    way, the error is raised by the next flush() or close().
+    """
+
+    # How often a batch is attempted before the queue gives up
+    MAX_ATTEMPTS = 5
+    # How long to wait (in seconds) before attempting a batch again for the
+    # first time
+    RETRY_DELAY = 1.0
+
+    def __init__(self, open_supply: Callable[[], PersistentSupply]) -> None:
+        """
+        open_supply - a function that opens the log file the messages are
+          written to, called on the queue's thread
+        """
+
+        self._open_supply = open_supply
+        self._supply: Optional[PersistentSupply] = None
+        self._worker = WorkerThread()
+
+        # Messages waiting for the next batch and messages currently being
+        # written, by id. If a message is put into the queue multiple times
+        # (e.g. because it was edited), only its newest version is written.
+        self._pending: Dict[Id, Message] = {}
+        self._writing: Dict[Id, Message] = {}
+
+        self._task: Optional["asyncio.Future[None]"] = None
+        # The error of the last batch, if it couldn't be written
+        self._error: Optional[Exception] = None
+        # Failed attempts in a row and the next attempt, if one is scheduled
+        self._failures = 0
+        self._retry: Optional[asyncio.TimerHandle] = None
+
+    def _open(self) -> PersistentSupply:
+        if self._supply is None:
+            self._supply = self._open_supply()
+        return self._supply
+
+    def _write(self, messages: List[Message]) -> None:
+        self._open().add_many(messages)
+
+    def _call(self, f: Callable[..., T], *args: Any) -> T:
+        return f(self._open(), *args)
+
+    def _close(self) -> None:
+        if self._supply is not None:
+            self._supply.close()
+
+    async def _write_pending(self) -> None:
+        try:
+            while self._pending:
+                self._writing = self._pending
+                self._pending = {}
+
+                try:
+                    await self._worker.run(self._write,
+                            list(self._writing.values()))
+                except Exception as e:
+                    self._error = e
+                    self._failures += 1
+                    if self.failed:
+                        self._pending = {}
+                        return
+
+                    # The batch is queued again, except for the messages that
+                    # were put into the queue again in the meantime.
+                    self._writing.update(self._pending)
+                    self._pending = self._writing
+                    self._schedule_retry()
+                    return
+
+                self._writing = {}
+                self._error = None
+                self._failures = 0
+        finally:
+            self._writing = {}
+            self._task = None
+
+    def _schedule_retry(self) -> None:
+        delay = self.RETRY_DELAY * 2 ** (self._failures - 1)
+        loop = asyncio.get_event_loop()
+        self._retry = loop.call_later(delay, self._retry_writing)
+
+    def _cancel_retry(self) -> None:
+        if self._retry is not None:
+            self._retry.cancel()
+            self._retry = None
+
+    def _retry_writing(self) -> None:
+        self._retry = None
+        self._start_writing()
+
+    def _start_writing(self) -> None:
+        if self._task is None and self._retry is None:
+            self._task = asyncio.ensure_future(self._write_pending())
+
+    @property
+    def failed(self) -> bool:
+        """
+        Whether the queue has given up on writing messages.
+        """
+
+        return self._failures >= self.MAX_ATTEMPTS
+
+    def put(self, message: Message) -> None:
+        """
+        Queue a message to be written. Must be called while the event loop is
+        running. If the queue has given up, the message is ignored.
+        """
+
+        if self.failed:
+            return
+
+        self._pending[message.id] = message
+        self._start_writing()
+
+    def get(self, message_id: Id) -> Optional[Message]:
+        """
+        Retrieve a message that hasn't been written yet. Returns None if there
+        is no such message.
+        """
+
+        message = self._pending.get(message_id)
+        if message is None:
+            message = self._writing.get(message_id)
+        return message
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending) + len(self._writing)
+
+    async def run(self, f: Callable[..., T], *args: Any) -> T:
+        """
+        Call a function with the log file (and any further arguments) on the
+        queue's thread, opening the log file if necessary. This is how the log
+        file can be read from, or written to without going through the queue.
+
+        Messages that are still queued might not have been written yet.
+        """
+
+        return await self._worker.run(self._call, f, *args)
+
+    async def flush(self) -> None:
+        """
+        Wait until all queued messages are written.
+
+        Messages left over from a batch that couldn't be written are written
+        again right away. If writing fails or the queue has given up, the error
+        is raised.
+        """
+
+        if self._pending:
+            self._cancel_retry()
+            self._start_writing()
+
+        while self._task is not None:
+            await self._task
+
+        if self._error is not None:
+            error = self._error
+            # Once the queue has given up, every flush() fails
+            if not self.failed:
+                self._error = None
+            raise error
+
+    async def close(self) -> None:
+        """
+        Write all queued messages, then close the log file and stop the
+        queue's thread.
+
+        If the queued messages can't be written, the log file is closed anyway
+        and the error is raised afterwards.
+        """
+
+        try:
+            await self.flush()
+        finally:
+            self._cancel_retry()
+            await self._worker.run(self._close)
+            self._worker.close()
@@ -1,9 +1,25 @@
+from .test_async_element_supply import *
+from .test_attributed_lines import *
 from .test_element_rendering import *
+from .test_element_supply import *
+from .test_log_file_supply import *
 from .test_markup import *
 from .test_rendered_element_cache import *
+from .test_rendering_pool import *
+from .test_sqlite_supply import *
+from .test_utils import *
+from .test_write_behind_queue import *
 
 __all__ = []
 
+__all__+= test_async_element_supply.__all__
+__all__+= test_attributed_lines.__all__
 __all__+= test_element_rendering.__all__
+__all__+= test_element_supply.__all__
+__all__+= test_log_file_supply.__all__
 __all__+= test_markup.__all__
 __all__+= test_rendered_element_cache.__all__
+__all__+= test_rendering_pool.__all__
+__all__+= test_sqlite_supply.__all__
+__all__+= test_utils.__all__
+__all__+= test_write_behind_queue.__all__
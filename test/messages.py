@@ -0,0 +1,12 @@
+import datetime
+
+from bowl import Message
+
+__all__ = ["TIMESTAMP", "message"]
+
+# All test messages are sent at the same time, so they all render the same
+# meta ("12:30")
+TIMESTAMP = datetime.datetime(2019, 6, 21, 12, 30)
+
+def message(mid, parent_id=None, content="content", nick="nick"):
+    return Message(mid, parent_id, TIMESTAMP, nick, content)
@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+
+from bowl import (AsyncElementSupply, Element, ElementSupplyException,
+        InMemorySupply, PrefetchingSupply, ThreadedSupply)
+
+__all__ = ["TestPrefetchingSupply"]
+
+# Five threads: a, c, f, h and i
+#
+# a
+# └ b
+# c
+# ├ d
+# └ e
+# f
+# └ g
+# h
+# i
+
+TREE = [
+        ("a", None),
+        ("b", "a"),
+        ("c", None),
+        ("d", "c"),
+        ("e", "c"),
+        ("f", None),
+        ("g", "f"),
+        ("h", None),
+        ("i", None),
+]
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+class TestPrefetchingSupply(unittest.TestCase):
+
+    def setUp(self):
+        supply = InMemorySupply()
+        for elem_id, parent_id in TREE:
+            supply.add(Element(elem_id, parent_id))
+
+        self.threaded = ThreadedSupply(supply)
+        self.supply = PrefetchingSupply(self.threaded)
+
+    def tearDown(self):
+        self.threaded.close()
+
+    def loaded_ids(self):
+        return list(self.supply.iter_below(self.supply.oldest_id()))
+
+    def test_nothing_loaded(self):
+        self.assertIsNone(self.supply.lowest_root_id())
+        self.assertFalse(self.supply.is_loaded("a"))
+
+    def test_loading_threads(self):
+        self.assertTrue(run(self.supply.load_thread("c")))
+        self.assertFalse(run(self.supply.load_thread("c")))
+
+        self.assertTrue(self.supply.is_loaded("c"))
+        self.assertEqual(["c", "d", "e"], self.loaded_ids())
+
+    def test_prefetching_around_element(self):
+        self.assertTrue(run(self.supply.prefetch("g", threads=1)))
+        self.assertEqual(["c", "d", "e", "f", "g", "h"], self.loaded_ids())
+
+        # Nothing new to load
+        self.assertFalse(run(self.supply.prefetch("f", threads=1)))
+
+        self.assertTrue(run(self.supply.prefetch("e", threads=3)))
+        self.assertEqual(["a", "b", "c", "d", "e", "f", "g", "h", "i"],
+                self.loaded_ids())
+
+    def test_prefetching_bottom(self):
+        self.assertTrue(run(self.supply.prefetch(None, threads=1)))
+        self.assertEqual(["h", "i"], self.loaded_ids())
+
+    def test_remembering_root_order(self):
+        calls = []
+        previous_id = self.threaded.previous_id
+        next_id = self.threaded.next_id
+
+        async def counting_previous_id(elem_id):
+            calls.append(elem_id)
+            return await previous_id(elem_id)
+
+        async def counting_next_id(elem_id):
+            calls.append(elem_id)
+            return await next_id(elem_id)
+
+        self.threaded.previous_id = counting_previous_id
+        self.threaded.next_id = counting_next_id
+
+        run(self.supply.prefetch("f", threads=2))
+        self.assertTrue(calls)
+
+        calls.clear()
+        self.assertFalse(run(self.supply.prefetch("g", threads=2)))
+        self.assertFalse(run(self.supply.prefetch("c", threads=1)))
+        self.assertEqual([], calls)
+
+    def test_forgetting_far_threads(self):
+        run(self.supply.prefetch("a", threads=4))
+
+        self.assertTrue(self.supply.forget_far_threads(["b"], threads=1))
+        self.assertEqual(["a", "b", "c", "d", "e"], self.loaded_ids())
+        self.assertFalse(self.supply.is_loaded("f"))
+        self.assertFalse(self.supply.is_loaded("i"))
+        with self.assertRaises(ElementSupplyException):
+            self.supply.get("g")
+
+        # Forgotten threads are loaded again when needed
+        self.assertTrue(run(self.supply.prefetch("c", threads=1)))
+        self.assertEqual(["a", "b", "c", "d", "e", "f", "g"],
+                self.loaded_ids())
+
+    def test_forgetting_around_several_elements(self):
+        run(self.supply.prefetch("f", threads=4))
+
+        self.assertTrue(self.supply.forget_far_threads(["a", "i"], 0))
+        self.assertEqual(["a", "b", "i"], self.loaded_ids())
+
+        # Nothing to keep the threads around
+        self.assertFalse(self.supply.forget_far_threads(["x", None], 0))
+        self.assertEqual(["a", "b", "i"], self.loaded_ids())
+
+    def test_default_thread(self):
+        class SlowSupply(AsyncElementSupply):
+            # Only the abstract methods are implemented
+            get = self.threaded.get
+            parent_id = self.threaded.parent_id
+            child_ids = self.threaded.child_ids
+            previous_id = self.threaded.previous_id
+            next_id = self.threaded.next_id
+            lowest_root_id = self.threaded.lowest_root_id
+
+        slow = SlowSupply()
+        self.assertEqual("c", run(slow.root_id("e")))
+        self.assertEqual(["c", "d", "e"],
+                [elem.id for elem in run(slow.thread("c"))])
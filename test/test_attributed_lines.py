@@ -0,0 +1,90 @@
+import unittest
+
+from bowl import AT, AttributedLines, LineBlock
+
+__all__ = ["TestAttributedLines"]
+
+class TestAttributedLines(unittest.TestCase):
+
+    def message(self, mid, amount):
+        lines = AttributedLines()
+        for offset in range(amount):
+            lines.append_below({"mid": mid, "offset": offset}, AT(mid))
+        return lines
+
+    def test_indexes(self):
+        lines = self.message("b", 2)
+        lines.append_below({"cursor": True}, AT("cursor"))
+        self.assertEqual(0, lines.message_offset("b"))
+        self.assertEqual(2, lines.cursor_offset)
+
+        lines.extend_above(self.message("a", 3))
+        lines.append_above({"mid": "x"}, AT("x"))
+        lines.extend_below(self.message("c", 1))
+        self.assertEqual(-3, lines.message_offset("a"))
+        self.assertEqual(-4, lines.message_offset("x"))
+        self.assertEqual(0, lines.message_offset("b"))
+        self.assertEqual(3, lines.message_offset("c"))
+        self.assertEqual(2, lines.cursor_offset)
+        self.assertEqual(None, lines.message_offset("d"))
+        self.assertEqual("x", lines.first_message_id)
+        self.assertEqual("c", lines.last_message_id)
+
+        lines.upper_offset = 0
+        self.assertEqual(1, lines.message_offset("a"))
+        self.assertEqual(6, lines.cursor_offset)
+        self.assertEqual("cursor", str(lines.at(6)[1]))
+
+        with self.assertRaises(IndexError):
+            lines.at(8)
+
+    def test_between(self):
+        lines = self.message("a", 3)
+        lines.extend_below(self.message("b", 3))
+        lines.upper_offset = -2
+
+        between = lines.between(0, 2)
+        self.assertEqual(["a", "b", "b"], [str(text) for _, text in between])
+        self.assertEqual(0, between.upper_offset)
+        self.assertEqual(1, between.message_offset("b"))
+        self.assertEqual(0, between.message_offset("a"))
+        self.assertEqual(None, between.cursor_offset)
+
+    def test_blocks(self):
+        created = []
+
+        def text(offset):
+            created.append(offset)
+            return AT(f"b{offset}")
+
+        lines = self.message("a", 2)
+        lines.append_block_below(LineBlock(1000,
+                lambda offset: {"mid": "b", "offset": offset}, text))
+        lines.extend_below(self.message("c", 1))
+        lines.upper_offset = -500
+
+        self.assertEqual(1003, len(lines))
+        self.assertEqual(-498, lines.message_offset("b"))
+        self.assertEqual(502, lines.message_offset("c"))
+        self.assertEqual([], created)
+
+        between = lines.between(0, 2)
+        self.assertEqual(["b498", "b499", "b500"],
+                [str(text) for _, text in between])
+        self.assertEqual({"mid": "b", "offset": 499}, between.at(1)[0])
+        self.assertEqual(0, between.message_offset("b"))
+        self.assertEqual("b", between.first_message_id)
+        self.assertEqual("b", between.last_message_id)
+
+        # Lines are only created once
+        list(between)
+        self.assertEqual([498, 499, 500], created)
+
+    def test_rendering_wide_lines(self):
+        render = AttributedLines.render_line
+        line = ({}, AT("a漢字b"))
+
+        self.assertEqual("a漢字b  ", str(render(line, 8, 0)))
+        self.assertEqual("a漢 …", str(render(line, 5, 0)))
+        self.assertEqual(" 字b  ", str(render(line, 6, 2)))
+        self.assertEqual("  a漢…", str(render(line, 6, -2)))
@@ -1,11 +1,26 @@
+import sys
 import unittest
 
-from bowl import CursorTreeRenderer
+from bowl import BasicCursorRenderer, CursorTreeRenderer, InMemorySupply
+
+from .messages import message
 
 __all__ = ["TestCursorTreeRenderer"]
 
 class TestCursorTreeRenderer(unittest.TestCase):
 
+    def create_renderer(self):
+        supply = InMemorySupply()
+        for mid, parent_id in [("a", None), ("b", "a"), ("c", "b"),
+                ("d", None)]:
+            supply.add(message(mid, parent_id, mid, nick="n"))
+
+        return CursorTreeRenderer(supply, BasicCursorRenderer())
+
+    def rendered_lines(self, renderer):
+        renderer.render(40, 8)
+        return [str(line) for _, line in renderer.lines]
+
     def test_static_offset(self):
         gao = CursorTreeRenderer.get_absolute_offset
         gro = CursorTreeRenderer.get_relative_offset
@@ -24,3 +39,157 @@ class TestCursorTreeRenderer(unittest.TestCase):
         height = 1000
         for i in range(height):
             self.assertEqual(i, gao(gro(i, height), height))
+
+    def test_rendering_tree(self):
+        renderer = self.create_renderer()
+        self.assertEqual([
+                "12:30 [n] a",
+                "12:30 │ [n] b",
+                "12:30 │ │ [n] c",
+                "12:30 [n] d",
+                "      <cursor>",
+        ], self.rendered_lines(renderer))
+
+    def test_rendering_cursor_indent(self):
+        renderer = self.create_renderer()
+        for _ in range(3):
+            renderer.move_cursor_up()
+
+        self.assertEqual([
+                "12:30 [n] a",
+                "12:30 │ [n] b",
+                "12:30 │ ┃ [n] c",
+                "      │ ┗━<cursor>",
+                "12:30 [n] d",
+        ], self.rendered_lines(renderer))
+
+    def test_restoring_position(self):
+        renderer = self.create_renderer()
+        for _ in range(3):
+            renderer.move_cursor_up()
+        expected = self.rendered_lines(renderer)
+
+        restored = self.create_renderer()
+        restored.restore_position(renderer.position)
+        self.assertEqual("b", restored.cursor_id)
+        self.assertEqual(expected, self.rendered_lines(restored))
+
+        # Elements that are gone are replaced with the bottom of the tree
+        restored = self.create_renderer()
+        restored.restore_position(("x", "y", 0.5))
+        self.assertEqual((None, None, 0.5), restored.position)
+
+        # So are elements that aren't connected to a root, like replies whose
+        # parents weren't loaded
+        supply = InMemorySupply()
+        supply.add(message("a", nick="n"))
+        supply.add(message("c", "b", nick="n"))
+        restored = CursorTreeRenderer(supply, BasicCursorRenderer())
+        restored.restore_position(("c", "c", 0.5))
+        self.assertEqual((None, None, 0.5), restored.position)
+
+    def test_rendering_deep_thread(self):
+        supply = InMemorySupply()
+        depth = sys.getrecursionlimit() + 100
+
+        parent_id = None
+        for i in range(depth):
+            mid = f"{i:05}"
+            supply.add(message(mid, parent_id, mid, nick="n"))
+            parent_id = mid
+
+        renderer = CursorTreeRenderer(supply, BasicCursorRenderer(),
+                indent_width=0)
+        self.assertEqual([
+                f"12:30 [n] {depth - 7:05}",
+                f"12:30 [n] {depth - 6:05}",
+                f"12:30 [n] {depth - 5:05}",
+                f"12:30 [n] {depth - 4:05}",
+                f"12:30 [n] {depth - 3:05}",
+                f"12:30 [n] {depth - 2:05}",
+                f"12:30 [n] {depth - 1:05}",
+                "      <cursor>",
+        ], self.rendered_lines(renderer))
+
+    def test_rendering_huge_message(self):
+        supply = InMemorySupply()
+        content = "\n".join(str(i) for i in range(20000))
+        supply.add(message("a", None, content, nick="n"))
+
+        renderer = CursorTreeRenderer(supply, BasicCursorRenderer())
+        self.assertEqual([
+                "          19993",
+                "          19994",
+                "          19995",
+                "          19996",
+                "          19997",
+                "          19998",
+                "          19999",
+                "      <cursor>",
+        ], self.rendered_lines(renderer))
+
+        # Only the visible lines were rendered
+        rendered = renderer._cache.get("a")
+        self.assertEqual(20000, len(rendered.lines))
+        self.assertEqual(7, len(rendered.lines._lines))
+
+        # The message is stored as a single block, next to the cursor
+        self.assertEqual(20001, len(renderer._lines))
+        self.assertEqual(2, len(renderer._lines._entries))
+
+        for _ in range(3):
+            renderer.scroll(4)
+        self.assertEqual("          19984", self.rendered_lines(renderer)[0])
+        self.assertTrue(len(rendered.lines._lines) < 30)
+
+    def test_prerendering(self):
+        supply = InMemorySupply()
+        for i in range(30):
+            supply.add(message(f"m{i:02}", None, "root", nick="n"))
+            supply.add(message(f"r{i:02}", f"m{i:02}", "reply", nick="n"))
+
+        renderer = CursorTreeRenderer(supply, BasicCursorRenderer())
+        self.rendered_lines(renderer)
+        cached = {mid for mid in supply.iter_above("r29")
+                if renderer._cache.get(mid) is not None}
+        self.assertNotIn("m20", cached)
+
+        # Nothing is rendered if there's no time
+        self.assertTrue(renderer.prerender(0, screens=1))
+        self.assertIsNone(renderer._cache.get("m20"))
+
+        self.assertFalse(renderer.prerender(10, screens=1))
+        above = list(supply.iter_above(min(cached)))[1:9]
+        for mid in above:
+            self.assertIsNotNone(renderer._cache.get(mid))
+
+        # Messages further away are left alone
+        self.assertIsNone(renderer._cache.get("m00"))
+
+        # Pre-rendered messages look the same as if they were rendered while
+        # scrolling
+        prerendered = [str(line) for line in
+                renderer._cache.get(above[-1]).lines]
+        for _ in range(4):
+            renderer.scroll(4)
+        renderer.invalidate(above[-1])
+        self.rendered_lines(renderer)
+        self.assertEqual(prerendered,
+                [str(line) for line in renderer._cache.get(above[-1]).lines])
+
+    def test_folding(self):
+        renderer = self.create_renderer()
+        renderer.fold("a")
+        self.assertEqual([
+                "12:30 [n] a",
+                "      │ <2 folded>",
+                "12:30 [n] d",
+                "      <cursor>",
+        ], self.rendered_lines(renderer))
+
+        renderer.move_cursor_up()
+        renderer.move_cursor_up()
+        self.assertEqual("a", renderer.cursor_id)
+
+        renderer.unfold("a")
+        self.assertEqual(5, len(self.rendered_lines(renderer)))
@@ -0,0 +1,365 @@
+import random
+import unittest
+
+from bowl import (Element, ElementSupply, ElementSupplyException, FoldingSupply,
+        InMemoryMessageSupply, InMemorySupply, SqliteSupply)
+
+from .messages import message
+
+__all__ = ["TestInMemorySupply", "TestInMemoryMessageSupply",
+        "TestFoldingSupply"]
+
+# The tree used in these tests:
+#
+# a
+# ├ b
+# │ ├ d
+# │ └ e
+# │   └ f
+# └ c
+# g
+# └ h
+
+TREE = [
+        ("a", None),
+        ("b", "a"),
+        ("c", "a"),
+        ("d", "b"),
+        ("e", "b"),
+        ("f", "e"),
+        ("g", None),
+        ("h", "g"),
+]
+
+def create_supply():
+    supply = InMemorySupply()
+    for elem_id, parent_id in TREE:
+        supply.add(Element(elem_id, parent_id))
+    return supply
+
+class TestInMemorySupply(unittest.TestCase):
+
+    def setUp(self):
+        self.supply = create_supply()
+
+    def test_navigation(self):
+        self.assertEqual(["a", "b", "d", "e", "f", "c", "g", "h"],
+                self.supply.between_ids("a", "h"))
+        self.assertEqual("c", self.supply.above_id("g"))
+        self.assertEqual("f", self.supply.above_id("c"))
+        self.assertEqual("c", self.supply.below_id("f"))
+
+    def test_iterators(self):
+        self.assertEqual(["e", "f", "c", "g", "h"],
+                list(self.supply.iter_below("e")))
+        self.assertEqual(["e", "d", "b", "a"],
+                list(self.supply.iter_above("e")))
+        self.assertEqual(["g", "c", "f", "e", "d", "b", "a"],
+                list(self.supply.iter_above("g")))
+        self.assertEqual(["d", "e", "f"],
+                list(self.supply.iter_between("d", "f")))
+        self.assertEqual([], list(self.supply.iter_between("f", "d")))
+
+    def test_iterators_match_navigation(self):
+        for elem_id, _ in TREE:
+            below = [elem_id]
+            while True:
+                below_id = self.supply.below_id(below[-1])
+                if below_id is None: break
+                below.append(below_id)
+
+            above = [elem_id]
+            while True:
+                above_id = self.supply.above_id(above[-1])
+                if above_id is None: break
+                above.append(above_id)
+
+            with self.subTest(elem_id=elem_id):
+                self.assertEqual(below, list(self.supply.iter_below(elem_id)))
+                self.assertEqual(above, list(self.supply.iter_above(elem_id)))
+
+    def test_ordering(self):
+        self.assertTrue(self.supply.is_above("d", "c"))
+        self.assertFalse(self.supply.is_above("c", "d"))
+        self.assertFalse(self.supply.is_above("c", "c"))
+        self.assertEqual(5, self.supply.count_between("b", "c"))
+        self.assertEqual(0, self.supply.count_between("c", "b"))
+
+        # Not at the bottom
+        self.supply.add(Element("bb", "a"))
+        self.assertTrue(self.supply.is_above("f", "bb"))
+        self.assertEqual(7, self.supply.count_between("b", "g"))
+
+        # At the bottom
+        self.supply.add(Element("i", "h"))
+        self.assertEqual(3, self.supply.count_between("g", "i"))
+
+        self.supply.remove("bb")
+        self.assertEqual(["a", "b", "d", "e", "f", "c", "g", "h", "i"],
+                sorted(self.supply._elements,
+                    key=lambda i: self.supply._labels[i]))
+        self.assertEqual(9, self.supply.count_between("a", "i"))
+        self.assertEqual(1, self.supply.count_between("e", "e"))
+        self.assertEqual(0, self.supply.count_between("f", "e"))
+
+    def test_ordering_matches_traversal(self):
+        rng = random.Random(1)
+        supply = InMemorySupply()
+
+        ids = [f"{i:03}" for i in range(100)]
+        for i, elem_id in enumerate(ids):
+            parent_id = rng.choice([None] + ids[:i]) if i else None
+            supply.add(Element(elem_id, parent_id))
+
+        for elem_id in rng.sample(ids, 20):
+            other_id = rng.choice(ids)
+            with self.subTest(elem_id=elem_id, other_id=other_id):
+                self.assertEqual(
+                        ElementSupply.is_above(supply, elem_id, other_id),
+                        supply.is_above(elem_id, other_id))
+                self.assertEqual(
+                        ElementSupply.count_between(supply, elem_id, other_id),
+                        supply.count_between(elem_id, other_id))
+
+    def test_roots_and_depths(self):
+        self.assertEqual("a", self.supply.root_id("f"))
+        self.assertEqual(3, self.supply.depth("f"))
+        self.assertEqual(0, self.supply.depth("g"))
+        self.assertEqual("g", self.supply.root_id("h"))
+
+        # Moving an element
+        self.supply.add(Element("e", "h"))
+        self.assertEqual("g", self.supply.root_id("f"))
+        self.assertEqual(3, self.supply.depth("f"))
+        self.assertEqual(2, self.supply.depth("d"))
+
+        # Disconnecting elements from their root
+        self.supply.remove("h")
+        with self.assertRaises(ElementSupplyException):
+            self.supply.root_id("f")
+
+        self.supply.add(Element("h", None))
+        self.assertEqual("h", self.supply.root_id("f"))
+        self.assertEqual(2, self.supply.depth("f"))
+
+    def test_ordering_without_relabeling(self):
+        supply = InMemorySupply()
+        for i in range(10):
+            supply.add(Element(f"r{i}", None))
+
+        # Replies into an older thread, one below the other
+        labels = dict(supply._labels)
+        for i in range(300):
+            supply.add(Element(f"r5-{i:03}", "r5"))
+            self.assertTrue(supply.is_above(f"r5-{i:03}", "r6"))
+            self.assertTrue(supply.is_above("r5", f"r5-{i:03}"))
+
+        self.assertTrue(supply.is_above("r5-000", "r5-299"))
+        for elem_id, label in labels.items():
+            self.assertEqual(label, supply._labels[elem_id])
+
+        # Replies above each other, until the gap between two labels is used
+        # up
+        for i in range(100):
+            supply.add(Element(f"r5-000-{99 - i:02}", "r5-000"))
+            self.assertTrue(supply.is_above(f"r5-000-{99 - i:02}", "r5-001"))
+            self.assertTrue(supply.is_above("r5-000", f"r5-000-{99 - i:02}"))
+
+        self.assertEqual(list(supply.iter_below("r0")),
+                sorted(supply._elements, key=lambda i: supply._labels[i]))
+
+        # Edits and removals
+        supply.add(Element("r5", None))
+        supply.remove("r5-100")
+        supply.add(Element("r4-a", "r4"))
+        self.assertTrue(supply.is_above("r4-a", "r5-000"))
+
+        self.assertEqual(402, supply.count_between("r4-a", "r6"))
+
+    def test_ordering_with_changes(self):
+        rng = random.Random(2)
+        supply = InMemorySupply()
+
+        ids = [f"{i:03}" for i in range(200)]
+        for i, elem_id in enumerate(ids):
+            parent_id = rng.choice([None] + ids[:i]) if i else None
+            supply.add(Element(elem_id, parent_id))
+
+            # Removing an element disconnects its subtree until it is added
+            # again
+            if rng.random() < 0.1:
+                removed_id = rng.choice(ids[:i + 1])
+                removed = supply.get(removed_id)
+                supply.remove(removed_id)
+                supply.add(removed)
+
+        for elem_id in rng.sample(ids, 50):
+            other_id = rng.choice(ids)
+            with self.subTest(elem_id=elem_id, other_id=other_id):
+                self.assertEqual(
+                        ElementSupply.is_above(supply, elem_id, other_id),
+                        supply.is_above(elem_id, other_id))
+                self.assertEqual(
+                        ElementSupply.count_between(supply, elem_id, other_id),
+                        supply.count_between(elem_id, other_id))
+
+    def test_descendant_count(self):
+        self.assertEqual(5, self.supply.descendant_count("a"))
+        self.assertEqual(3, self.supply.descendant_count("b"))
+        self.assertEqual(0, self.supply.descendant_count("c"))
+        self.assertEqual(1, self.supply.descendant_count("g"))
+
+    def test_descendant_count_with_late_parent(self):
+        supply = InMemorySupply()
+        supply.add(Element("c", "b"))
+        supply.add(Element("d", "b"))
+        supply.add(Element("a", None))
+        supply.add(Element("b", "a"))
+
+        self.assertEqual(3, supply.descendant_count("a"))
+        self.assertEqual(2, supply.descendant_count("b"))
+
+    def test_replacing_and_removing(self):
+        self.supply.add(Element("e", "b"))
+        self.assertEqual(["d", "e"], self.supply.child_ids("b"))
+        self.assertEqual(["f"], self.supply.child_ids("e"))
+        self.assertEqual(5, self.supply.descendant_count("a"))
+
+        self.supply.remove("d")
+        self.assertEqual(["e"], self.supply.child_ids("b"))
+        self.assertEqual(4, self.supply.descendant_count("a"))
+
+    def test_subtree_statistics(self):
+        self.assertEqual("c", self.supply.last_descendant_id("a"))
+        self.assertEqual("f", self.supply.last_descendant_id("b"))
+        self.assertEqual("c", self.supply.last_descendant_id("c"))
+        self.assertEqual(3, self.supply.subtree_depth("a"))
+        self.assertEqual(2, self.supply.subtree_depth("b"))
+        self.assertEqual(0, self.supply.subtree_depth("c"))
+
+        self.supply.remove("c")
+        self.assertEqual("f", self.supply.last_descendant_id("a"))
+
+        self.supply.remove("f")
+        self.assertEqual("e", self.supply.last_descendant_id("a"))
+        self.assertEqual(2, self.supply.subtree_depth("a"))
+
+    def test_statistics_match_traversal(self):
+        rng = random.Random(0)
+        supply = InMemorySupply()
+
+        ids = [f"{i:03}" for i in range(200)]
+        rng.shuffle(ids)
+        for i, elem_id in enumerate(ids):
+            parent_id = rng.choice([None] + ids[:i]) if i else None
+            supply.add(Element(elem_id, parent_id))
+
+        for elem_id in ids[::3]:
+            supply.remove(elem_id)
+
+        for elem_id in ids:
+            if elem_id not in supply._elements:
+                continue
+
+            with self.subTest(elem_id=elem_id):
+                self.assertEqual(
+                        ElementSupply.descendant_count(supply, elem_id),
+                        supply.descendant_count(elem_id))
+                self.assertEqual(
+                        ElementSupply.last_descendant_id(supply, elem_id),
+                        supply.last_descendant_id(elem_id))
+                self.assertEqual(
+                        ElementSupply.subtree_depth(supply, elem_id),
+                        supply.subtree_depth(elem_id))
+
+class TestInMemoryMessageSupply(unittest.TestCase):
+
+    def setUp(self):
+        self.supply = InMemoryMessageSupply()
+        for mid, nick in [("a", "foo"), ("b", "bar"), ("c", "foo")]:
+            self.supply.add(message(mid, content=mid, nick=nick))
+
+    def test_nicks(self):
+        self.assertEqual({"foo", "bar"}, set(self.supply.nicks()))
+        self.assertEqual({"a", "c"}, set(self.supply.nick_ids("foo")))
+        self.assertEqual([], self.supply.nick_ids("baz"))
+
+    def test_replacing_and_removing(self):
+        self.supply.add(message("b", content="b", nick="foo"))
+        self.assertEqual(["foo"], self.supply.nicks())
+        self.assertEqual({"a", "b", "c"}, set(self.supply.nick_ids("foo")))
+
+        self.supply.remove("a")
+        self.assertEqual({"b", "c"}, set(self.supply.nick_ids("foo")))
+
+        # Moved to a different parent
+        self.supply.add(message("c", "b", content="c", nick="bar"))
+        self.assertEqual({"b"}, set(self.supply.nick_ids("foo")))
+        self.assertEqual({"c"}, set(self.supply.nick_ids("bar")))
+
+class TestFoldingSupply(unittest.TestCase):
+
+    def setUp(self):
+        self.supply = FoldingSupply(create_supply())
+
+    def test_unfolded_supply(self):
+        self.assertEqual(["a", "b", "d", "e", "f", "c", "g", "h"],
+                self.supply.between_ids("a", "h"))
+
+    def test_folded_supply(self):
+        self.supply.fold("b")
+
+        self.assertEqual([], self.supply.child_ids("b"))
+        self.assertEqual(["a", "b", "c", "g", "h"],
+                self.supply.between_ids("a", "h"))
+        self.assertEqual("b", self.supply.above_id("c"))
+        self.assertEqual("c", self.supply.below_id("b"))
+        self.assertEqual("b", self.supply.position_above_id("c"))
+        self.assertEqual(3, self.supply.descendant_count("b"))
+        self.assertEqual("b", self.supply.last_descendant_id("b"))
+        self.assertEqual(1, self.supply.subtree_depth("a"))
+        self.assertEqual(["b", "c", "g", "h"],
+                list(self.supply.iter_below("b")))
+        self.assertEqual(4, self.supply.count_between("a", "g"))
+        self.assertTrue(self.supply.is_above("f", "c"))
+        self.assertEqual(["c", "b", "a"], list(self.supply.iter_above("c")))
+
+        self.supply.unfold("b")
+        self.assertEqual("f", self.supply.above_id("c"))
+
+    def test_folds_inside_folds(self):
+        self.supply.fold("e")
+        self.supply.fold("b")
+
+        self.assertEqual(["a", "b", "c", "g", "h"],
+                self.supply.between_ids("a", "h"))
+        self.assertEqual(["h", "g", "c", "b", "a"],
+                list(self.supply.iter_above("h")))
+        self.assertEqual(4, self.supply.count_between("a", "g"))
+
+        self.supply.unfold("b")
+        self.assertEqual("e", self.supply.last_descendant_id("b"))
+        self.assertEqual(["h", "g", "c", "e", "d", "b", "a"],
+                list(self.supply.iter_above("h")))
+        self.assertEqual(6, self.supply.count_between("a", "g"))
+
+    def test_navigating_with_wrapped_supply(self):
+        supply = SqliteSupply(":memory:")
+        supply.add_many(message(elem_id, parent_id)
+                for elem_id, parent_id in TREE)
+
+        # Listing siblings means listing all roots, which is slow in big logs
+        def sibling_ids(elem_id):
+            raise AssertionError("sibling_ids() was called")
+        supply.sibling_ids = sibling_ids
+
+        folding = FoldingSupply(supply)
+        folding.fold("e")
+        self.assertEqual(["a", "b", "d", "e", "c", "g", "h"],
+                folding.between_ids("a", "h"))
+        self.assertEqual(["h", "g", "c", "e", "d", "b", "a"],
+                list(folding.iter_above("h")))
+        self.assertEqual("e", folding.above_id("c"))
+        self.assertEqual("c", folding.below_id("e"))
+
+        supply.close()
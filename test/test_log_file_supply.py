@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+
+from bowl import (ElementSupplyException, LogFileException, LogFileSupply,
+        SqliteSupply, compact_log, convert_log, log_file_supply)
+
+from .messages import TIMESTAMP, message
+
+__all__ = ["TestLogFileSupply"]
+
+class TestLogFileSupply(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "room")
+
+        supply = LogFileSupply(self.path)
+        supply.add_many([
+                message("d", "b"),
+                message("e"),
+                message("a"),
+                message("c", "a"),
+                message("b", "a", content="old"),
+        ])
+        supply.add(message("b", "a", content="new"))
+        supply.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def check_supply(self, supply):
+        msg = supply.get("b")
+        self.assertEqual("new", msg.content)
+        self.assertEqual("nick", msg.nick)
+        self.assertEqual("a", msg.parent_id)
+        self.assertEqual(TIMESTAMP, msg.timestamp)
+
+        self.assertEqual(["b", "c"], supply.child_ids("a"))
+        self.assertEqual(["a", "e"], supply.sibling_ids("e"))
+        self.assertEqual("e", supply.next_id("a"))
+        self.assertEqual("a", supply.previous_id("e"))
+        self.assertEqual(None, supply.next_id("c"))
+        self.assertEqual("e", supply.lowest_root_id())
+        self.assertEqual("a", supply.oldest_id())
+        self.assertEqual(["a", "b", "d", "c", "e"], supply.between_ids("a", "e"))
+
+        with self.assertRaises(ElementSupplyException):
+            supply.get("x")
+
+    def test_reading_appended_log(self):
+        supply = LogFileSupply(self.path)
+        self.check_supply(supply)
+        supply.close()
+
+    def test_reading_read_only(self):
+        supply = LogFileSupply(self.path, read_only=True)
+        self.check_supply(supply)
+        with self.assertRaises(LogFileException):
+            supply.add(message("f"))
+        supply.close()
+
+        missing_path = os.path.join(self.directory.name, "missing")
+        with self.assertRaises(FileNotFoundError):
+            LogFileSupply(missing_path, read_only=True)
+        self.assertEqual([], [name for name in os.listdir(self.directory.name)
+                if name.startswith("missing")])
+
+    def test_reading_compacted_log(self):
+        compact_log(self.path)
+
+        supply = LogFileSupply(self.path)
+        self.check_supply(supply)
+        supply.close()
+
+    def test_appending_to_compacted_log(self):
+        compact_log(self.path)
+
+        supply = LogFileSupply(self.path)
+        supply.add(message("f", "a"))
+        supply.add(message("aa"))
+        self.assertEqual(["b", "c", "f"], supply.child_ids("a"))
+        self.assertEqual("aa", supply.next_id("a"))
+        self.assertEqual("e", supply.next_id("aa"))
+        self.assertEqual("content", supply.get("f").content)
+        supply.close()
+
+    def test_compacting_into_new_generation(self):
+        compact_log(self.path)
+        compact_log(self.path)
+
+        # Only the newest generation is kept around
+        self.assertEqual(["room.2.dat", "room.2.par", "room.idx"],
+                sorted(os.listdir(self.directory.name)))
+
+    def test_interrupted_compaction(self):
+        supply = LogFileSupply(self.path)
+        entries = list(supply._compacted_entries())
+        supply.close()
+
+        # The new generation is written, but the index is never replaced
+        def interrupted():
+            yield from entries[:2]
+            raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            log_file_supply._write_generation(self.path, 1, interrupted(), [])
+
+        supply = LogFileSupply(self.path)
+        self.check_supply(supply)
+        supply.close()
+
+    def test_converting_sqlite_log(self):
+        sqlite_path = os.path.join(self.directory.name, "room.sqlite")
+        sqlite = SqliteSupply(sqlite_path)
+        sqlite.add_many([
+                message("a"),
+                message("b", "a", content="new"),
+                message("c", "a"),
+                message("d", "b"),
+                message("e"),
+        ])
+        sqlite.close()
+
+        # Replaces the appended log
+        convert_log(sqlite_path, self.path)
+
+        supply = LogFileSupply(self.path)
+        self.assertEqual(0, len(supply._tail))
+        self.check_supply(supply)
+        supply.close()
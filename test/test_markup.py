@@ -1,6 +1,6 @@
 import unittest
 
-from bowl import AT
+from bowl import AT, ATBuilder
 
 __all__ = ["TestAttributedText"]
 
@@ -68,6 +68,47 @@ class TestAttributedText(unittest.TestCase):
         self.assertEqual(self.text, text3)
         self.assertEqual(self.text, text4)
 
+    def test_setting_spans(self):
+        spans = [
+                (2, 9, "attribute", "foo"),
+                (7, 14, "attribute2", "bar"),
+                (12, 30, "attribute", "baz"),
+                (0, 0, "attribute", "empty"),
+        ]
+
+        expected = self.text
+        for start, stop, name, value in spans:
+            expected = expected.set(name, value, start, stop)
+
+        self.assertEqual(expected, self.text.set_spans(spans))
+        self.assertEqual(self.text, self.text.set_spans([]))
+
+    def test_setting_spans_like_set(self):
+        spans = [
+                (-5, -2, "attribute", "end"),
+                (-30, 3, "attribute2", "start"),
+                (20, 4, "attribute", "outside"),
+                (-3, 30, "attribute2", "past the end"),
+                (8, -20, "attribute2", "both"),
+        ]
+
+        for start, stop, name, value in spans:
+            with self.subTest(start=start, stop=stop):
+                expected = self.text.set(name, value, start, stop)
+                self.assertEqual(expected,
+                        self.text.set_spans([(start, stop, name, value)]))
+
+    def test_setting_overlapping_spans(self):
+        text = AT("abcdef").set_spans([
+                (0, 4, "attribute", 1),
+                (2, 6, "attribute", 2),
+                (3, 4, "attribute", 3),
+        ])
+
+        expected = (AT("ab", attribute=1) + AT("c", attribute=2) +
+                AT("d", attribute=3) + AT("ef", attribute=2))
+        self.assertEqual(expected, text)
+
     def test_removing_attributes(self):
         text = self.text.remove("attribute", 9, 15)
 
@@ -111,6 +152,25 @@ class TestAttributedText(unittest.TestCase):
 
         self.assertEqual(text1, text2)
 
+    def test_joining_many_segments(self):
+        segments = (AT(str(i), x=i % 2) for i in range(100))
+        text = AT(",", x=0).join(segments)
+
+        self.assertEqual(",".join(str(i) for i in range(100)), text.text)
+        # Even numbers are joined with the separators around them
+        self.assertEqual(100, len(text.chunks))
+
+    def test_building(self):
+        builder = ATBuilder()
+        builder.append(AT("hello", foo="bar"))
+        builder.append_text("")
+        builder.append_text(" ", {"foo": "bar"})
+        builder.append(AT("world"))
+
+        self.assertEqual(11, len(builder))
+        self.assertEqual(AT("hello ", foo="bar") + AT("world"), builder.build())
+        self.assertEqual(AT(), ATBuilder().build())
+
     def test_repeating_by_multiplication(self):
         text = AT("a", x=1) + AT("b", y=2)
         repeated_1 = text + text + text + text + text
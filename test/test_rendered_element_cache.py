@@ -48,3 +48,16 @@ class TestRenderedElementCache(unittest.TestCase):
 
         self.assertEqual(self.cache.get("e1"), None)
         self.assertEqual(self.cache.get("e2"), None)
+
+    def test_invalidating_some(self):
+        self.cache.add(self.e1)
+        self.cache.add(self.e2)
+        self.cache.add(self.e3)
+
+        self.cache.invalidate_ids(["e1", "e4"])
+        self.assertEqual(self.cache.get("e1"), None)
+        self.assertEqual(self.cache.get("e2"), self.e2)
+
+        self.cache.invalidate_if(lambda elem_id: elem_id == "e3")
+        self.assertEqual(self.cache.get("e2"), self.e2)
+        self.assertEqual(self.cache.get("e3"), None)
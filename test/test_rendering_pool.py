@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+
+from bowl import (BasicCursorRenderer, CursorTreeRenderer, InMemorySupply,
+        RenderingPool)
+
+from .messages import message
+
+__all__ = ["TestRenderingPool"]
+
+class TestRenderingPool(unittest.TestCase):
+
+    def setUp(self):
+        self.renderer = BasicCursorRenderer()
+        self.pool = RenderingPool(self.renderer, processes=2,
+                max_batch_size=3)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.pool.close()
+        self.loop.close()
+
+    def render(self, jobs, max_lines=10):
+        return self.loop.run_until_complete(self.pool.render(jobs, max_lines))
+
+    def test_rendering_like_renderer(self):
+        jobs = [(message(f"m{i}", content=f"line\n{i}"), 20 + i)
+                for i in range(10)]
+        rendered = self.render(jobs)
+
+        self.assertEqual([f"m{i}" for i in range(10)],
+                [msg.id for msg in rendered])
+
+        for (msg, width), result in zip(jobs, rendered):
+            expected = self.renderer.render_element(msg, width)
+            self.assertEqual(expected.meta, result.meta)
+            self.assertEqual(list(expected.lines), list(result.lines))
+
+    def test_leaving_out_huge_messages(self):
+        huge = "\n".join(str(i) for i in range(100))
+        rendered = self.render([(message("a"), 20),
+                (message("b", content=huge), 20)])
+        self.assertEqual(["a"], [msg.id for msg in rendered])
+
+        self.assertEqual([], self.render([]))
+
+    def test_warming_up_tree(self):
+        supply = InMemorySupply()
+        for i in range(30):
+            supply.add(message(f"m{i:02}"))
+            supply.add(message(f"r{i:02}", f"m{i:02}"))
+
+        tree = CursorTreeRenderer(supply, self.renderer)
+        tree.render(40, 8)
+
+        jobs = tree.prerender_jobs(screens=1)
+        self.assertTrue(jobs)
+        self.assertTrue(tree.prerender(0, screens=1))
+
+        for msg, _ in jobs:
+            self.assertIsNone(tree._cache.get(msg.id))
+
+        rendered = self.render(jobs)
+
+        # Rendered for a different width
+        tree.add_rendered(rendered, tree.width + 1)
+        self.assertEqual(len(jobs), len(tree.prerender_jobs(screens=1)))
+
+        tree.add_rendered(rendered, tree.width)
+        self.assertEqual([], tree.prerender_jobs(screens=1))
+        self.assertFalse(tree.prerender(0, screens=1))
+
+    def test_discarding_outdated_messages(self):
+        supply = InMemorySupply()
+        for i in range(10):
+            supply.add(message(f"m{i}"))
+
+        tree = CursorTreeRenderer(supply, self.renderer)
+        tree.render(40, 3)
+
+        # e.g. the own nick changed while the messages were being rendered
+        jobs = tree.prerender_jobs(screens=1)
+        rendered = self.render(jobs)
+        tree.invalidate(jobs[0][0].id)
+        tree.add_rendered(rendered, tree.width)
+        self.assertEqual([jobs[0][0].id],
+                [msg.id for msg, _ in tree.prerender_jobs(screens=1)])
+
+        jobs = tree.prerender_jobs(screens=1)
+        rendered = self.render(jobs)
+        tree.invalidate_all()
+        tree.add_rendered(rendered, tree.width)
+        self.assertTrue(tree.prerender_jobs(screens=1))
@@ -0,0 +1,88 @@
+import unittest
+
+from bowl import ElementSupplyException, SqliteSupply
+
+from .messages import TIMESTAMP, message
+
+__all__ = ["TestSqliteSupply"]
+
+class TestSqliteSupply(unittest.TestCase):
+
+    def setUp(self):
+        self.supply = SqliteSupply(":memory:")
+        self.supply.add_many([
+                message("a"),
+                message("b", "a"),
+                message("c", "a"),
+                message("d", "b"),
+                message("e"),
+        ])
+
+    def tearDown(self):
+        self.supply.close()
+
+    def test_getting_messages(self):
+        msg = self.supply.get("d")
+        self.assertEqual("d", msg.id)
+        self.assertEqual("b", msg.parent_id)
+        self.assertEqual(TIMESTAMP, msg.timestamp)
+        self.assertEqual("content", msg.content)
+
+        with self.assertRaises(ElementSupplyException):
+            self.supply.get("x")
+
+    def test_tree_structure(self):
+        self.assertEqual(["b", "c"], self.supply.child_ids("a"))
+        self.assertEqual(None, self.supply.parent_id("a"))
+        self.assertEqual("e", self.supply.lowest_root_id())
+        self.assertEqual("a", self.supply.oldest_id())
+        self.assertEqual("a", self.supply.root_id("d"))
+
+    def test_siblings(self):
+        self.assertEqual(None, self.supply.previous_id("a"))
+        self.assertEqual("e", self.supply.next_id("a"))
+        self.assertEqual("b", self.supply.previous_id("c"))
+        self.assertEqual(None, self.supply.next_id("c"))
+
+    def test_navigation(self):
+        self.assertEqual(["a", "b", "d", "c", "e"],
+                self.supply.between_ids("a", "e"))
+        self.assertEqual("c", self.supply.above_id("e"))
+
+    def test_iterators(self):
+        self.assertEqual(["b", "d", "c", "e"],
+                list(self.supply.iter_below("b")))
+        self.assertEqual(["e", "c", "d", "b", "a"],
+                list(self.supply.iter_above("e")))
+        self.assertEqual(["d", "b", "a"], list(self.supply.iter_above("d")))
+
+    def test_replacing_messages(self):
+        self.supply.add(message("c", "a", content="edited"))
+        self.assertEqual("edited", self.supply.get("c").content)
+        self.assertEqual(["b", "c"], self.supply.child_ids("a"))
+
+        self.supply.remove("c")
+        self.assertEqual(["b"], self.supply.child_ids("a"))
+
+    def test_newest_messages(self):
+        self.assertEqual(["c", "d", "e"],
+                [msg.id for msg in self.supply.newest(3)])
+        self.assertEqual(["a", "b", "c", "d", "e"],
+                [msg.id for msg in self.supply.newest(10)])
+        self.assertEqual([], self.supply.newest(0))
+
+        self.assertEqual("c", self.supply.oldest_newest_id(3))
+        self.assertEqual("a", self.supply.oldest_newest_id(10))
+        self.assertIsNone(self.supply.oldest_newest_id(0))
+
+    def test_newest_messages_with_ancestors(self):
+        # A reply to a message that isn't in the log
+        self.supply.add(message("f", "x"))
+
+        self.assertEqual(["a", "b", "d", "e"],
+                [msg.id for msg in self.supply.newest_with_ancestors(3)])
+        self.assertEqual(["e"],
+                [msg.id for msg in self.supply.newest_with_ancestors(2)])
+        self.assertEqual(["a", "b", "c", "d", "e"],
+                [msg.id for msg in self.supply.newest_with_ancestors(10)])
+        self.assertEqual([], self.supply.newest_with_ancestors(0))
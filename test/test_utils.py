@@ -0,0 +1,56 @@
+import unittest
+
+from bowl import uindex, ulen, uslice, uwidth, uwrap
+
+__all__ = ["TestUnicodeWidth"]
+
+class TestUnicodeWidth(unittest.TestCase):
+
+    def test_widths(self):
+        self.assertEqual(1, uwidth("a"))
+        self.assertEqual(1, uwidth("é"))
+        self.assertEqual(2, uwidth("漢"))
+        self.assertEqual(0, uwidth("́")) # combining acute accent
+        self.assertEqual(1, uwidth("│"))
+        self.assertEqual(2, uwidth("│", east_asian_context=True))
+
+    def test_ulen(self):
+        self.assertEqual(0, ulen(""))
+        self.assertEqual(5, ulen("hello"))
+        self.assertEqual(6, ulen("漢字ab"))
+        self.assertEqual(1, ulen("é"))
+        self.assertEqual(4, ulen("a│b", east_asian_context=True))
+
+    def test_uindex(self):
+        self.assertEqual(3, uindex("hello", 3))
+        self.assertEqual(5, uindex("hello", 10))
+        self.assertEqual(1, uindex("漢字", 3))
+        self.assertEqual(2, uindex("漢字", 3, round_up=True))
+        self.assertEqual(2, uindex("漢字", 4, round_up=True))
+        self.assertEqual(2, uindex("éx", 1))
+
+    def test_uslice(self):
+        self.assertEqual("ell", uslice("hello", 1, 4))
+        self.assertEqual("字", uslice("漢字漢", 1, 5))
+        self.assertEqual("", uslice("漢", 0, 1))
+
+    def wrapped(self, text, width):
+        return [text[start:end] for start, end in uwrap(text, width)]
+
+    def test_uwrap(self):
+        self.assertEqual(["hello", "world this", "is a test"],
+                self.wrapped("hello world this is a test", 10))
+        self.assertEqual(["one", "", "two"], self.wrapped("one\n\ntwo", 10))
+        self.assertEqual(["abcd", "efgh", "ij"], self.wrapped("abcdefghij", 4))
+        self.assertEqual(["漢字", "漢"], self.wrapped("漢字漢", 5))
+        self.assertEqual(["漢", "字"], self.wrapped("漢字", 1))
+        self.assertEqual([""], self.wrapped("", 10))
+        self.assertEqual(["a", ""], self.wrapped("a\n", 10))
+        self.assertEqual(["ab", "漢字", "c"], self.wrapped("ab\n漢字 c", 4))
+
+    def test_uwrap_long_text(self):
+        text = "lorem ipsum dolor sit amet " * 400
+        lines = self.wrapped(text, 60)
+
+        self.assertTrue(all(len(line) <= 60 for line in lines))
+        self.assertEqual(text.split(), " ".join(lines).split())
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from bowl import SqliteSupply, WriteBehindQueue
+
+from .messages import message
+
+__all__ = ["TestWriteBehindQueue"]
+
+class TestWriteBehindQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "log.sqlite")
+        self.batches = []
+        self.failing = False
+
+        def open_supply():
+            supply = SqliteSupply(self.path)
+            add_many = supply.add_many
+
+            def record_batch(messages):
+                self.batches.append([msg.id for msg in messages])
+                if self.failing:
+                    raise OSError("disk full")
+                add_many(messages)
+
+            supply.add_many = record_batch
+            return supply
+
+        self.queue = WriteBehindQueue(open_supply)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        self.directory.cleanup()
+
+    def test_writing_in_batches(self):
+        async def write():
+            self.queue.put(message("a"))
+            self.queue.put(message("b", "a"))
+            # Only written once, in its newest version
+            self.queue.put(message("b", "a", content="edited"))
+            self.assertEqual("edited", self.queue.get("b").content)
+            self.assertEqual(2, self.queue.pending_count)
+
+            await self.queue.flush()
+            self.assertIsNone(self.queue.get("a"))
+            self.assertEqual(0, self.queue.pending_count)
+
+            self.queue.put(message("c"))
+            await self.queue.close()
+
+        self.loop.run_until_complete(write())
+        self.assertEqual([["a", "b"], ["c"]], self.batches)
+
+        supply = SqliteSupply(self.path)
+        self.assertEqual(["a", "b", "c"], supply.between_ids("a", "c"))
+        self.assertEqual("edited", supply.get("b").content)
+        supply.close()
+
+    def test_closing_without_messages(self):
+        self.loop.run_until_complete(self.queue.close())
+        self.assertEqual([], self.batches)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_running_functions(self):
+        async def run():
+            self.queue.put(message("a"))
+            await self.queue.flush()
+
+            await self.queue.run(SqliteSupply.set_meta, "key", "value")
+            value = await self.queue.run(SqliteSupply.get_meta, "key")
+            newest = await self.queue.run(lambda supply: supply.newest(1))
+            await self.queue.close()
+            return value, newest
+
+        value, newest = self.loop.run_until_complete(run())
+        self.assertEqual("value", value)
+        self.assertEqual(["a"], [msg.id for msg in newest])
+
+    def test_failing_writes(self):
+        async def write():
+            self.failing = True
+            self.queue.put(message("a"))
+            self.queue.put(message("b", "a"))
+            with self.assertRaises(OSError):
+                await self.queue.flush()
+
+            # Nothing was lost
+            self.assertEqual(2, self.queue.pending_count)
+            self.assertEqual("content", self.queue.get("b").content)
+
+            self.failing = False
+            self.queue.put(message("b", "a", content="edited"))
+            self.queue.put(message("c"))
+            await self.queue.flush()
+            self.assertEqual(0, self.queue.pending_count)
+
+            self.failing = True
+            self.queue.put(message("d"))
+            with self.assertRaises(OSError):
+                await self.queue.close()
+
+        self.loop.run_until_complete(write())
+        self.assertEqual([["a", "b"], ["a", "b", "c"], ["d"]],
+                self.batches)
+
+        supply = SqliteSupply(self.path)
+        self.assertEqual(["a", "b", "c"], supply.between_ids("a", "c"))
+        self.assertEqual("edited", supply.get("b").content)
+        supply.close()
+
+    def test_retrying_failed_writes(self):
+        self.queue.RETRY_DELAY = 0.01
+
+        async def write():
+            self.failing = True
+            self.queue.put(message("a"))
+            with self.assertRaises(OSError):
+                await self.queue.flush()
+
+            # Not attempted again before the retry delay is over
+            self.queue.put(message("b"))
+            await asyncio.sleep(0)
+            self.assertEqual([["a"]], self.batches)
+
+            self.failing = False
+            while self.queue.pending_count > 0:
+                await asyncio.sleep(0.001)
+            await self.queue.close()
+
+        self.loop.run_until_complete(write())
+        self.assertEqual([["a"], ["a", "b"]], self.batches)
+
+    def test_giving_up(self):
+        self.queue.RETRY_DELAY = 0.001
+
+        async def write():
+            self.failing = True
+            self.queue.put(message("a"))
+            while not self.queue.failed:
+                await asyncio.sleep(0.001)
+
+            # The queued messages were dropped and new ones are ignored
+            self.assertEqual(0, self.queue.pending_count)
+            self.queue.put(message("b"))
+            self.assertEqual(0, self.queue.pending_count)
+
+            with self.assertRaises(OSError):
+                await self.queue.flush()
+            with self.assertRaises(OSError):
+                await self.queue.close()
+
+        self.loop.run_until_complete(write())
+        self.assertEqual([["a"]] * WriteBehindQueue.MAX_ATTEMPTS, self.batches)